@@ -4,7 +4,7 @@ block_cipher = None
 
 
 a = Analysis(['src/main.py'],
-             pathex=['src', 'Z:\\Users\\shakeel\\Documents\\Windows'],
+             pathex=['src', '../common/src', 'Z:\\Users\\shakeel\\Documents\\Windows'],
              binaries=[],
              datas=[],
              hiddenimports=[],
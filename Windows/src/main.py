@@ -1,14 +1,36 @@
+import argparse
+import os
+import sys
 from multiprocessing import freeze_support
 
-from cinevalmulti import CinEval
+#The modules shared by the Windows and macOS builds live in common/src.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir, os.pardir, 'common', 'src'))
+
+from backends import BACKENDS
+from cineval import CinEval
+from providers import PROVIDERS
 
 def main():
     #Support for frozen executable and prevents multiple instances of
     #GUI opening
     freeze_support()
     
-    app = CinEval()
+    parser = argparse.ArgumentParser(description='Browse movies and their '
+                                                 'ratings.')
+    parser.add_argument('--backend', choices=sorted(BACKENDS),
+                        help='how ratings are looked up, where async '
+                             'currently runs the thread backend\'s '
+                             'blocking lookups through an event loop '
+                             '(default: $CINEVAL_BACKEND or thread)')
+    parser.add_argument('--providers',
+                        help='comma separated rating providers, from: %s '
+                             '(default: $CINEVAL_PROVIDERS or rt)'
+                             % ', '.join(sorted(PROVIDERS)))
+    args, _ = parser.parse_known_args()
+    
+    app = CinEval(args.backend, args.providers)
     app.mainloop()
     
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,307 @@
+''' Copyright © 2019 Shakeel Niazi
+
+This module summarizes movie records: ratings per distributor, box
+office by month and the gaps between critics and audiences. Records
+are stored column by column, so once loaded they can be summarized
+again for any subset of rows without parsing them again. Summaries
+are computed with NumPy when it is installed and in plain Python
+otherwise.
+
+@author: Shakeel Niazi
+'''
+import math
+import statistics
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+import cache
+from enrich import FIELDS as DETAIL_FIELDS, SUMMARIES
+from index import RecordIndex
+from ratings import RATINGS, rating_key
+from schedule import MONTHS, SCHEDULES, Release
+
+NUMBERS = ['tomatometer', 'audience', 'sales', 'worldwide']
+LABELS = ['title', 'year', 'distributor', 'month']
+
+_NAN = float('nan')
+
+
+class Table:
+    '''Table holds records as columns: ratings and box office as
+    floats, with NaN where they aren't known, and labels as strings.
+    Columns are NumPy arrays when NumPy is installed and lists
+    otherwise.
+    '''
+
+    def __init__(self, records=()):
+        '''Constructs a table from records, dicts with the fields of
+        snapshot records.
+
+        '''
+        columns = {name: [] for name in NUMBERS + LABELS}
+        for record in records:
+            columns['tomatometer'].append(parse_percent(
+                record.get('tomatometer')))
+            columns['audience'].append(parse_percent(record.get('audience')))
+            columns['sales'].append(parse_money(record.get('box_office')))
+            columns['worldwide'].append(parse_money(record.get('worldwide')))
+            for name in LABELS:
+                columns[name].append(str(record.get(name) or ''))
+        self._set(columns)
+
+    @staticmethod
+    def concat(tables):
+        '''Returns a table holding the rows of every table in order.'''
+
+        table = Table()
+        columns = {}
+        for name in NUMBERS + LABELS:
+            parts = [getattr(part, name) for part in tables]
+            if numpy is not None:
+                columns[name] = numpy.concatenate(parts) if parts else []
+            else:
+                columns[name] = [value for part in parts for value in part]
+        table._set(columns)
+        return table
+
+    def __len__(self):
+        return len(self.title)
+
+    def _set(self, columns):
+        #Stores the columns as attributes, as arrays if possible.
+
+        for name in NUMBERS:
+            values = columns[name]
+            setattr(self, name, numpy.asarray(values, dtype=float)
+                    if numpy is not None else list(values))
+        for name in LABELS:
+            values = columns[name]
+            setattr(self, name, numpy.asarray(values, dtype=object)
+                    if numpy is not None else list(values))
+
+
+def summarize(table, rows=None, top=15):
+    '''Summarizes the rows of table at the positions in rows, or every
+    row if rows is None.
+
+    Returns a dict with the count of rows, the mean and median of
+    tomatometer, audience and gap (tomatometer minus audience score),
+    'distributors': the top distributors by count as
+    (name, count, tomatometer mean, tomatometer median, audience mean,
+    audience median, mean gap), 'months': (month, count, total sales,
+    mean sales) in calendar order, and 'gaps': the top movies by size
+    of gap as (title, year, tomatometer, audience, gap).
+
+    '''
+    if numpy is not None:
+        return _summarize_arrays(table, rows, top)
+    return _summarize_lists(table, rows, top)
+
+def history_records(store=None, exclude=()):
+    '''Returns snapshot style records for every schedule kept in the
+    disk cache, with their cached ratings and details, leaving out
+    movies whose rating key is in exclude.
+
+    '''
+    store = store or cache.shared()
+    ratings = {key: value for key, value, _ in store.items(RATINGS)}
+    exclude = set(exclude)
+
+    releases = []
+    for _, fields, _ in store.items(SCHEDULES):
+        for release in (Release(*values) for values in fields):
+            key = rating_key(release.title, release.year)
+            if key not in exclude:
+                exclude.add(key)
+                releases.append((key, release))
+    summaries = store.get_many(SUMMARIES, {_summary_path(release.href)
+                                           for _, release in releases
+                                           if release.href})
+
+    records = []
+    for key, release in releases:
+        record = release._asdict()
+        record['tomatometer'], record['audience'], _ = ratings.get(
+            key, (None, None, None))
+        details = (summaries.get(_summary_path(release.href))
+                   if release.href else None) or {}
+        for field in DETAIL_FIELDS:
+            record[field] = details.get(field) or None
+        records.append(record)
+    return records
+
+def index_records(records, table=None):
+    '''Returns a RecordIndex of records, the rows of table (built from
+    records if not given), by the words the results filter matches and
+    every numeric field it can filter on.
+
+    '''
+    table = table if table is not None else Table(records)
+    index = RecordIndex()
+    for i, record in enumerate(records):
+        numbers = {'sales': table.sales[i],
+                   'tomatometer': table.tomatometer[i],
+                   'audience': table.audience[i],
+                   'worldwide': table.worldwide[i],
+                   'budget': parse_money(record.get('budget')),
+                   'runtime': parse_runtime(record.get('runtime'))}
+        index.add(i, ' '.join([record['title_w_dist'],
+                               record['distributor'],
+                               record['release_type']]),
+                  {field: float(value) for field, value in numbers.items()
+                   if not math.isnan(value)})
+    index.prepare()
+    return index
+
+def parse_percent(text):
+    '''Returns a rating such as '85%' as a float, or NaN.'''
+
+    try:
+        return float(str(text).replace('%', ''))
+    except ValueError:
+        return _NAN
+
+def parse_money(text):
+    '''Returns an amount such as '$1,234' as a float, or NaN.'''
+
+    try:
+        return float(str(text).replace('$', '').replace(',', ''))
+    except ValueError:
+        return _NAN
+
+def parse_runtime(text):
+    '''Returns a running time such as '118 minutes' as a float, or
+    NaN.
+
+    '''
+    words = str(text).split()
+    return float(words[0]) if words and words[0].isdigit() else _NAN
+
+def _summary_path(href):
+    #Returns the cache key of the summary page at href.
+
+    return href.split('#')[0]
+
+def _summarize_arrays(table, rows, top):
+    #Summarizes with NumPy.
+
+    select = (lambda column: column) if rows is None else (
+        lambda column: column[numpy.asarray(rows, dtype=int)])
+    tomato = select(table.tomatometer)
+    audience = select(table.audience)
+    sales = select(table.sales)
+    gap = tomato - audience
+
+    summary = {'count': len(tomato),
+               'rated': int(numpy.count_nonzero(~numpy.isnan(tomato)))}
+    for name, values in (('tomatometer', tomato), ('audience', audience),
+                         ('gap', gap)):
+        summary[name] = _array_stats(values)
+
+    #Ratings per distributor.
+    names, codes = numpy.unique(select(table.distributor).astype(str),
+                                return_inverse=True)
+    counts = numpy.bincount(codes, minlength=len(names))
+    order = numpy.argsort(-counts, kind='stable')[:top]
+    distributors = []
+    for i in order:
+        group = codes == i
+        distributors.append((str(names[i]), int(counts[i]))
+                            + _array_stats(tomato[group])
+                            + _array_stats(audience[group])
+                            + _array_stats(gap[group])[:1])
+    summary['distributors'] = distributors
+
+    #Box office by month.
+    month_codes = numpy.array([MONTHS.index(month) if month in MONTHS
+                               else -1 for month in select(table.month)],
+                              dtype=int)
+    known = (month_codes >= 0) & ~numpy.isnan(sales)
+    totals = numpy.bincount(month_codes[known], weights=sales[known],
+                            minlength=len(MONTHS))
+    month_counts = numpy.bincount(month_codes[month_codes >= 0],
+                                  minlength=len(MONTHS))
+    sold = numpy.bincount(month_codes[known], minlength=len(MONTHS))
+    summary['months'] = [(month, int(month_counts[i]), float(totals[i]),
+                          float(totals[i]/sold[i]) if sold[i] else None)
+                         for i, month in enumerate(MONTHS)
+                         if month_counts[i]]
+
+    #Largest gaps between critics and audiences.
+    rated = numpy.flatnonzero(~numpy.isnan(gap))
+    largest = rated[numpy.argsort(-numpy.abs(gap[rated]),
+                                  kind='stable')[:top]]
+    titles = select(table.title)
+    years = select(table.year)
+    summary['gaps'] = [(titles[i], years[i], float(tomato[i]),
+                        float(audience[i]), float(gap[i]))
+                       for i in largest]
+    return summary
+
+def _array_stats(values):
+    #Returns (mean, median) of the values of an array that aren't NaN.
+
+    values = values[~numpy.isnan(values)]
+    if not len(values):
+        return (None, None)
+    return (float(values.mean()), float(numpy.median(values)))
+
+def _summarize_lists(table, rows, top):
+    #Summarizes in plain Python.
+
+    rows = range(len(table)) if rows is None else rows
+    tomato = [table.tomatometer[i] for i in rows]
+    audience = [table.audience[i] for i in rows]
+    gap = [critics - aud for critics, aud in zip(tomato, audience)]
+
+    summary = {'count': len(tomato),
+               'rated': sum(not math.isnan(value) for value in tomato)}
+    for name, values in (('tomatometer', tomato), ('audience', audience),
+                         ('gap', gap)):
+        summary[name] = _list_stats(values)
+
+    groups = {}
+    for position, i in enumerate(rows):
+        groups.setdefault(table.distributor[i], []).append(position)
+    largest = sorted(groups.items(),
+                     key=lambda group: (-len(group[1]), group[0]))[:top]
+    summary['distributors'] = [
+        (name, len(positions))
+        + _list_stats([tomato[p] for p in positions])
+        + _list_stats([audience[p] for p in positions])
+        + _list_stats([gap[p] for p in positions])[:1]
+        for name, positions in largest]
+
+    months = {}
+    for i in rows:
+        if table.month[i] in MONTHS:
+            months.setdefault(table.month[i], []).append(table.sales[i])
+    summary['months'] = []
+    for month in MONTHS:
+        if month in months:
+            sales = [value for value in months[month]
+                     if not math.isnan(value)]
+            summary['months'].append((month, len(months[month]),
+                                      float(sum(sales)),
+                                      sum(sales)/len(sales) if sales
+                                      else None))
+
+    rated = [(abs(gap[p]), p) for p in range(len(gap))
+             if not math.isnan(gap[p])]
+    rated.sort(key=lambda pair: -pair[0])
+    positions = list(rows)
+    summary['gaps'] = [(table.title[positions[p]], table.year[positions[p]],
+                        tomato[p], audience[p], gap[p])
+                       for _, p in rated[:top]]
+    return summary
+
+def _list_stats(values):
+    #Returns (mean, median) of the values of a list that aren't NaN.
+
+    values = [value for value in values if not math.isnan(value)]
+    if not values:
+        return (None, None)
+    return (statistics.fmean(values), statistics.median(values))
@@ -0,0 +1,153 @@
+''' Copyright © 2019 Shakeel Niazi
+
+This module keeps every page CinEval fetches in a compressed,
+content-addressed archive, so pages can be parsed again after the
+sites change their markup without fetching them again (see
+reextract.py).
+
+Pages are stored once per distinct content, as zlib compressed files
+named by the SHA-256 of the page. The disk cache records, for each
+url, what kind of page it is, the cache key its parsed result is
+stored under and every version of the page fetched with its time.
+
+Archiving is off by default, since archiving a movie page means
+reading all of it rather than stopping at its ratings; set
+CINEVAL_ARCHIVE=1 to turn it on.
+
+@author: Shakeel Niazi
+'''
+import hashlib
+import os
+import threading
+import time
+import zlib
+
+import cache
+from instrument import metrics
+
+ARCHIVE_ENV = 'CINEVAL_ARCHIVE' #Set to 1 to archive fetched pages
+FOLDER_NAME = 'archive'
+PAGES = 'pages' #Cache namespace: url -> {'kind', 'key', 'versions'}
+
+MAX_VERSIONS = 10 #Versions of a page remembered per url
+
+#Kinds of pages, named after the cache namespace of their results.
+KINDS = ['schedules', 'ratings', 'summaries']
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+class Archive:
+    '''Archive stores pages on disk by their content and records where
+    each came from in a DiskCache.
+
+    Writes are atomic and the versions of a page are updated in one
+    transaction, so pages can be archived from several threads and
+    processes at once.
+    '''
+
+    def __init__(self, folder=None, store=None):
+        '''Opens the archive in folder, by default the archive folder
+        in cache.data_folder(), recording pages in store, the shared
+        DiskCache by default.
+
+        '''
+        self.folder = folder or os.path.join(cache.data_folder(),
+                                             FOLDER_NAME)
+        self.store = store or cache.shared()
+
+    def save(self, url, text, kind, key=None, fetched=None):
+        '''Archives text, the page at url, of one of KINDS whose parsed
+        result is cached under key, or None if it isn't kept on disk.
+        Returns the digest of the page, or None if it couldn't be
+        written.
+
+        '''
+        data = text.encode('utf-8')
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.path(digest)
+        fetched = time.time() if fetched is None else fetched
+
+        if not os.path.exists(path):
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                temp_path = '%s.%d.%d.tmp' % (path, os.getpid(),
+                                              threading.get_ident())
+                with open(temp_path, 'wb') as file:
+                    file.write(zlib.compress(data, 6))
+                os.replace(temp_path, path)
+            except OSError:
+                metrics.count('archive.errors')
+                return None
+            metrics.observe('archive.bytes', len(data))
+        else:
+            metrics.count('archive.duplicates')
+
+        def add_version(entry):
+            versions = (entry or {'versions': []})['versions']
+            if versions and versions[-1][0] == digest:
+                versions[-1][1] = fetched
+            else:
+                versions.append([digest, fetched])
+            return {'kind': kind, 'key': key,
+                    'versions': versions[-MAX_VERSIONS:]}
+        self.store.update(PAGES, url, add_version)
+        return digest
+
+    def load(self, digest):
+        '''Returns the text of the archived page with the given digest.
+        Raises OSError if there is none.
+
+        '''
+        return read(self.path(digest))
+
+    def path(self, digest):
+        '''Returns the path of the file holding a page.'''
+
+        return os.path.join(self.folder, digest[:2], digest[2:] + '.z')
+
+    def pages(self, kinds=KINDS):
+        '''Returns (url, kind, key, digest, fetched) for the latest
+        version of every archived page of the given kinds.
+
+        '''
+        pages = []
+        for url, entry, _ in self.store.items(PAGES):
+            if entry['kind'] in kinds and entry['versions']:
+                digest, fetched = entry['versions'][-1]
+                pages.append((url, entry['kind'], entry['key'], digest,
+                              fetched))
+        return pages
+
+
+def enabled():
+    '''Returns whether fetched pages are being archived.'''
+
+    return os.environ.get(ARCHIVE_ENV, '0') == '1'
+
+def shared():
+    '''Returns the Archive shared by the process, opening it on first
+    use.
+
+    '''
+    global _shared
+    with _shared_lock:
+        if _shared is None or _shared.store is not cache.shared():
+            _shared = Archive()
+        return _shared
+
+def save(url, text, kind, key=None):
+    '''Archives a fetched page in the shared archive if archiving is
+    on. See Archive.save.
+
+    '''
+    if enabled():
+        return shared().save(url, text, kind, key)
+    return None
+
+def read(path):
+    '''Returns the text of the archived page file at path.'''
+
+    with open(path, 'rb') as file:
+        return zlib.decompress(file.read()).decode('utf-8')
@@ -0,0 +1,221 @@
+''' Copyright © 2019 Shakeel Niazi
+
+This module provides the execution backends that rating lookups run
+on. Every backend runs the same lookup code and differs only in where
+lookups are executed and how many run at once, so the throughput of
+backends can be compared on equal terms through their metrics.
+
+@author: Shakeel Niazi
+'''
+import asyncio
+import concurrent.futures
+import functools
+import multiprocessing
+import os
+import threading
+import time
+
+import network
+from instrument import metrics
+from network import Cancelled
+
+BACKEND_ENV = 'CINEVAL_BACKEND' #Environment variable naming a backend
+DEFAULT = 'thread' #Lookups mostly wait on the network, and only threads
+                   #share the limiter of each host
+
+_POLL = 0.1 #Seconds between checks for cancellation
+
+
+class Backend:
+    '''Backend runs lookups in the thread that asks for them.
+
+    A RatingJob runs as many lookups at a time as the backend has
+    workers, each of them through call(). Subclasses decide where the
+    lookup is actually executed.
+
+    Class Attributes:
+        NAME: name the backend is selected by
+    '''
+    NAME = None
+
+    def __init__(self, workers=1):
+        '''Constructs a backend running up to workers lookups at a
+        time.
+
+        '''
+        self.workers = max(1, workers)
+
+    def call(self, function, *args, cancel=None):
+        '''Returns function(*args, cancel=cancel) as run by the backend.
+
+        Raises Cancelled if the threading.Event cancel is set before
+        the result is available.
+
+        '''
+        start = time.monotonic()
+        try:
+            return self._run(function, args, cancel)
+        finally:
+            metrics.observe('backend.%s.call.time' % self.NAME,
+                            time.monotonic() - start)
+
+    def close(self):
+        '''Releases any threads or processes held by the backend.'''
+
+    def _run(self, function, args, cancel):
+        #Runs function in the calling thread.
+
+        return function(*args, cancel=cancel)
+
+
+class SequentialBackend(Backend):
+    '''SequentialBackend runs one lookup at a time, off the Tk thread.'''
+
+    NAME = 'sequential'
+
+    def __init__(self, workers=None):
+        Backend.__init__(self, 1)
+
+
+class ThreadBackend(Backend):
+    '''ThreadBackend runs lookups on the worker threads of a job.
+
+    The adaptive limiter of each host is shared between the threads,
+    so enough threads are used to saturate it and the limiter decides
+    how many requests are actually in flight.
+    '''
+    NAME = 'thread'
+
+    def __init__(self, workers=None):
+        Backend.__init__(self, workers or network.max_workers())
+
+
+class ProcessBackend(Backend):
+    '''ProcessBackend runs lookups in a pool of worker processes, so
+    page parsing runs in parallel across cores.
+
+    Lookups must be module level functions, and are called without a
+    cancel event since events can't be shared with other processes.
+    Cancelling instead stops waiting and drops calls still queued.
+    Workers are spawned rather than forked, so they never inherit the
+    open disk cache or the locks of the process that starts them. Each
+    process has its own limiters, so limits apply per process.
+    '''
+    NAME = 'process'
+
+    def __init__(self, workers=None):
+        Backend.__init__(self, workers or os.cpu_count() or 1)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def close(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def _run(self, function, args, cancel):
+        #Runs function in a worker process, starting the pool on
+        #first use.
+
+        with self._lock:
+            if self._executor is None:
+                self._executor = concurrent.futures.ProcessPoolExecutor(
+                    self.workers,
+                    mp_context=multiprocessing.get_context('spawn'))
+            future = self._executor.submit(function, *args)
+        return _wait(future, cancel)
+
+
+class AsyncBackend(Backend):
+    '''AsyncBackend runs lookups as tasks of an asyncio event loop on
+    a thread of its own.
+
+    Coroutine functions are awaited on the loop directly. Blocking
+    functions are handed to the loop's thread pool so the loop only
+    schedules them. Every lookup in CinEval is blocking, as requests
+    has no asynchronous interface, so for now this backend behaves as
+    the thread backend with an extra hop through the loop. It is kept
+    as the place asynchronous lookups will run once there are any.
+    '''
+    NAME = 'async'
+
+    def __init__(self, workers=None):
+        Backend.__init__(self, workers or network.max_workers())
+        self._loop = None
+        self._thread = None
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def close(self):
+        with self._lock:
+            loop, thread, executor = self._loop, self._thread, self._executor
+            self._loop = self._thread = self._executor = None
+        if loop is None:
+            return
+
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(1)
+        executor.shutdown(wait=False, cancel_futures=True)
+        if not loop.is_running():
+            loop.close()
+
+    def _run(self, function, args, cancel):
+        #Schedules function on the event loop, starting it on first
+        #use.
+
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._executor = concurrent.futures.ThreadPoolExecutor(
+                    self.workers)
+                self._loop.set_default_executor(self._executor)
+                self._thread = threading.Thread(
+                    target=self._loop.run_forever, daemon=True)
+                self._thread.start()
+            loop = self._loop
+        task = AsyncBackend._task(function, args, cancel)
+        return _wait(asyncio.run_coroutine_threadsafe(task, loop), cancel)
+
+    @staticmethod
+    async def _task(function, args, cancel):
+        #Awaits function, or runs it in the loop's executor if it
+        #isn't a coroutine function.
+
+        if asyncio.iscoroutinefunction(function):
+            return await function(*args, cancel=cancel)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            None, functools.partial(function, *args, cancel=cancel))
+
+
+BACKENDS = {backend.NAME: backend
+            for backend in (SequentialBackend, ThreadBackend,
+                            ProcessBackend, AsyncBackend)}
+
+
+def create(name=None, workers=None):
+    '''Returns a new backend selected by name.
+
+    Without a name, the backend named by the CINEVAL_BACKEND
+    environment variable is used, or DEFAULT if it isn't set. Raises
+    ValueError for unknown names.
+
+    '''
+    name = (name or os.environ.get(BACKEND_ENV) or DEFAULT).strip().lower()
+    if name not in BACKENDS:
+        raise ValueError('Unknown backend %r, expected one of: %s'
+                         % (name, ', '.join(sorted(BACKENDS))))
+    return BACKENDS[name](workers)
+
+def _wait(future, cancel):
+    #Returns the result of a concurrent.futures.Future, cancelling it
+    #and raising Cancelled once the threading.Event cancel is set.
+
+    while True:
+        try:
+            return future.result(_POLL)
+        except concurrent.futures.TimeoutError:
+            if cancel is not None and cancel.is_set():
+                future.cancel()
+                raise Cancelled()
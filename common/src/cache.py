@@ -0,0 +1,217 @@
+''' Copyright © 2019 Shakeel Niazi
+
+This module provides DiskCache, the persistent store CinEval keeps
+fetched schedules and ratings in between runs. Entries are JSON
+values grouped in namespaces and stored in a single SQLite file.
+
+@author: Shakeel Niazi
+'''
+import json
+import os
+import sqlite3
+import threading
+import time
+
+HOME_ENV = 'CINEVAL_HOME' #Environment variable overriding the data folder
+FILE_NAME = 'cache.sqlite3'
+
+_MAX_PARAMS = 500 #Keys looked up per query, below SQLite's limit
+
+_shared = None #DiskCache shared by the process, opened on first use
+_shared_lock = threading.Lock()
+
+
+class DiskCache:
+    '''DiskCache is a thread safe key-value store on disk.
+
+    Every write is committed before it returns, and set_many writes a
+    whole batch in one transaction, so an interrupted program loses at
+    most the batch it was writing.
+    '''
+
+    def __init__(self, path=None):
+        '''Opens the cache at path, or at default_path() if no path is
+        given, creating it if needed.
+
+        '''
+        self.path = path or default_path()
+        folder = os.path.dirname(self.path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        with self._lock, self._db:
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute('CREATE TABLE IF NOT EXISTS entries ('
+                             'namespace TEXT NOT NULL, key TEXT NOT NULL, '
+                             'value TEXT NOT NULL, updated REAL NOT NULL, '
+                             'PRIMARY KEY (namespace, key))')
+
+    def get(self, namespace, key, default=None):
+        '''Returns the value stored for key, or default.'''
+
+        entry = self.get_entry(namespace, key)
+        return entry[0] if entry is not None else default
+
+    def get_entry(self, namespace, key):
+        '''Returns (value, time updated) for key, or None.'''
+
+        with self._lock:
+            row = self._db.execute('SELECT value, updated FROM entries '
+                                   'WHERE namespace = ? AND key = ?',
+                                   (namespace, key)).fetchone()
+        return (json.loads(row[0]), row[1]) if row is not None else None
+
+    def set(self, namespace, key, value):
+        '''Stores value for key.'''
+
+        self.set_many(namespace, [(key, value)])
+
+    def set_many(self, namespace, items):
+        '''Stores each (key, value) of items in a single transaction.'''
+
+        now = time.time()
+        rows = [(namespace, key, json.dumps(value), now)
+                for key, value in items]
+        with self._lock, self._db:
+            self._db.executemany('INSERT OR REPLACE INTO entries '
+                                 'VALUES (?, ?, ?, ?)', rows)
+
+    def update(self, namespace, key, function):
+        '''Stores function(value) for key, where value is the value
+        stored for key or None, and returns it. The value is read and
+        written in one transaction, so concurrent updates from other
+        threads and processes are never lost.
+
+        '''
+        with self._lock:
+            self._db.execute('BEGIN IMMEDIATE')
+            try:
+                row = self._db.execute('SELECT value FROM entries '
+                                       'WHERE namespace = ? AND key = ?',
+                                       (namespace, key)).fetchone()
+                value = function(json.loads(row[0]) if row is not None
+                                 else None)
+                self._db.execute('INSERT OR REPLACE INTO entries '
+                                 'VALUES (?, ?, ?, ?)',
+                                 (namespace, key, json.dumps(value),
+                                  time.time()))
+            except BaseException:
+                self._db.rollback()
+                raise
+            self._db.commit()
+        return value
+
+    def delete(self, namespace, key):
+        '''Removes key if it is stored.'''
+
+        with self._lock, self._db:
+            self._db.execute('DELETE FROM entries '
+                             'WHERE namespace = ? AND key = ?',
+                             (namespace, key))
+
+    def keys(self, namespace):
+        '''Returns the set of keys stored in a namespace.'''
+
+        with self._lock:
+            rows = self._db.execute('SELECT key FROM entries '
+                                    'WHERE namespace = ?',
+                                    (namespace,)).fetchall()
+        return {row[0] for row in rows}
+
+    def items(self, namespace):
+        '''Returns a list of (key, value, time updated) for every entry
+        of a namespace.
+
+        '''
+        with self._lock:
+            rows = self._db.execute('SELECT key, value, updated '
+                                    'FROM entries WHERE namespace = ?',
+                                    (namespace,)).fetchall()
+        return [(key, json.loads(value), updated)
+                for key, value, updated in rows]
+
+    def get_many(self, namespace, keys):
+        '''Returns a dict of key -> value for every key of keys that is
+        stored.
+
+        '''
+        keys = list(keys)
+        values = {}
+        for start in range(0, len(keys), _MAX_PARAMS):
+            chunk = keys[start:start + _MAX_PARAMS]
+            with self._lock:
+                rows = self._db.execute(
+                    'SELECT key, value FROM entries WHERE namespace = ? '
+                    'AND key IN (%s)' % ', '.join('?'*len(chunk)),
+                    [namespace] + chunk).fetchall()
+            values.update((key, json.loads(value)) for key, value in rows)
+        return values
+
+    def updated(self, namespace, keys=None):
+        '''Returns a dict of key -> time updated for every entry of a
+        namespace, or only those of keys, without reading their values.
+
+        '''
+        if keys is None:
+            with self._lock:
+                rows = self._db.execute('SELECT key, updated FROM entries '
+                                        'WHERE namespace = ?',
+                                        (namespace,)).fetchall()
+            return dict(rows)
+
+        keys = list(keys)
+        updated = {}
+        for start in range(0, len(keys), _MAX_PARAMS):
+            chunk = keys[start:start + _MAX_PARAMS]
+            with self._lock:
+                rows = self._db.execute(
+                    'SELECT key, updated FROM entries WHERE namespace = ? '
+                    'AND key IN (%s)' % ', '.join('?'*len(chunk)),
+                    [namespace] + chunk).fetchall()
+            updated.update(rows)
+        return updated
+
+    def close(self):
+        '''Closes the cache file.'''
+
+        with self._lock:
+            self._db.close()
+
+
+def shared():
+    '''Returns the DiskCache at default_path() shared by the whole
+    process, opening it on first use. Falls back to a cache in memory
+    if the file can't be opened.
+
+    '''
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            try:
+                _shared = DiskCache()
+            except (OSError, sqlite3.Error):
+                _shared = DiskCache(':memory:')
+        return _shared
+
+def use(path):
+    '''Makes the DiskCache at path the one shared by the process.'''
+
+    global _shared
+    with _shared_lock:
+        _shared = DiskCache(path)
+        return _shared
+
+def data_folder():
+    '''Returns the folder CinEval keeps its files in: $CINEVAL_HOME,
+    or .cineval in the home folder.
+
+    '''
+    return (os.environ.get(HOME_ENV)
+            or os.path.join(os.path.expanduser('~'), '.cineval'))
+
+def default_path():
+    '''Returns the path of the default cache file.'''
+
+    return os.path.join(data_folder(), FILE_NAME)
@@ -0,0 +1,1443 @@
+''' Copyright © 2019 Shakeel Niazi
+
+This module provides the CinEval class shared by the Windows and
+macOS builds. Ratings are looked up on an execution backend chosen at
+startup (see the backends module), from every enabled rating provider
+(see the providers module).
+
+CinEval lets you browse through movies with their ratings.
+Ratings include critics ratings (Tomatometer) and audience
+ratings.  
+
+@author: Shakeel Niazi
+'''
+import os
+import sys
+import threading
+import webbrowser
+import time
+import datetime as dtime
+from datetime import datetime
+from sys import platform
+
+import tkinter as tk
+from tkinter import ttk, font, filedialog, messagebox
+from PIL import Image, ImageTk
+from ttkthemes import themed_tk as themed
+
+import backends
+import network
+import providers
+import refresh
+import session
+import snapshot
+import titles
+from schedule import (HOME_URL, MONTHS, AMBIG_RELEASES, RELEASE_TYPES,
+                      get_schedule, get_schedules, merge_listings, prefetch)
+from ratings import RT_URL, rating_key
+from enrich import FIELDS as DETAIL_FIELDS, fetch_details
+from index import RecordIndex, parse_query, tokenize
+from jobs import RatingJob, SingleFlight
+from instrument import metrics, capture
+from panels import AnalyticsPanel, DebugPanel
+from uiqueue import UpdateQueue
+
+
+class CinEval(themed.ThemedTk):
+    '''CinEval creates a themed tk GUI that lets users browse movies
+    and their ratings.
+    
+    Class Attributes:
+        WIN_W: window width
+        WIN_H: window height
+    '''
+    WIN_W = 950
+    WIN_H = 500
+    
+    _MONTHS = ['All'] + MONTHS
+    _HEADERS = ['Release Date', 'Title', 'Distributor', 'Domestic Sales',
+               'Tomatometer', 'Audience Score', 'Release Type', 'Budget',
+               'Runtime', 'MPAA Rating', 'Worldwide Gross']
+    _DETAILS_COL = 7 #First of the columns filled in from summary pages
+    _AMBIG_RELEASES = AMBIG_RELEASES
+    _BOTH_OPTION = 2 #Search option combining both release types
+    
+    _FONT = ('Calibri', 13)
+    _WINDOW_SIZE = '%dx%d' % (WIN_W, WIN_H)
+    _CANV_H = WIN_H - 170 
+    _CANV_W = WIN_W - 100
+    _IMAGE_NAME = 'popcorn.jpg'
+    _POLL_MS = 100
+    
+    
+    def __init__(self, backend=None, rating_providers=None):
+        '''Constructs a themed tk GUI for retrieving lists of movies
+        and their ratings, looked up on the named execution backend
+        (see backends.create) from the named rating providers (see
+        providers.enabled).
+        
+        Provides options to browse movies by their theatrical or home
+        media release dates. Also provides the ability to view their
+        summaries on the-numbers.com by double clicking them. Double
+        clicking on their ratings will let you view their summaries on
+        Rotten Tomatoes. Rows that already have ratings are skipped
+        unless Get Ratings is shift-clicked.
+        
+        '''
+        themed.ThemedTk.__init__(self)
+        self.set_theme('black')
+        self.title('CinEval')
+        self.geometry(CinEval._WINDOW_SIZE)
+        self.container = tk.Frame(self, bg='black')
+        
+        #Rotten Tomatoes ratings have fixed columns, other providers
+        #add theirs after the fixed columns.
+        self.providers = providers.enabled(rating_providers)
+        self.provider_names = [provider.NAME for provider in self.providers]
+        self.provider_cols = [column for provider in self.providers
+                              if provider.NAME != providers.RottenTomatoes.NAME
+                              for column in provider.COLUMNS]
+        self.headers = CinEval._HEADERS + self.provider_cols
+        
+        try:
+            #Pyinstaller stores path in temp folder _MEIPASS
+            self.filename = os.path.join(sys._MEIPASS, CinEval._IMAGE_NAME)
+        except AttributeError:
+            self.filename = CinEval._IMAGE_NAME
+            
+        self.image = Image.open(self.filename)
+        self.bg_img = ImageTk.PhotoImage(self.image)
+        self.bg_label = tk.Label(self.container, image=self.bg_img)
+        
+        self.canvas = tk.Canvas(self.container, width=CinEval._CANV_W,
+                                height=CinEval._CANV_H, bg='#262626', 
+                                bd=0, highlightthickness=0, relief='ridge')
+        self.options_frame = tk.Frame(self.canvas, bg='#262626', bd=0)
+        self.results_box = ttk.Treeview(self.options_frame,
+                                        columns=self.headers,
+                                        show='headings')
+        self.no_results = ttk.Label(self.options_frame, text='No results.',
+                                    font=CinEval._FONT)
+        self.no_selection = ttk.Label(self.options_frame,
+                                      text='Please select a movie first.',
+                                      font=CinEval._FONT)
+        
+        #Layout state, so layout is only updated when it changes
+        self.layout_pending = None
+        self.layout_geometry = None
+        self.main_scrolls = (False, False)
+        self.result_scrolls = (False, False)
+        self.canvas_grid = ('we', 0)
+        
+        #Optional columns
+        self.show_types = False
+        self.show_details = tk.BooleanVar(value=False)
+        
+        #Results of the last session are restored on startup and their
+        #ratings optionally looked up again in the background.
+        self.sort_state = None #(column, reverse) of the last sort
+        self.revalidate = tk.BooleanVar(value=True)
+        
+        self._set_up_canvas()
+        self._set_up_options()
+        self._set_up_results_box()
+        self._set_up_menu()
+        self._bind_mousewheel()
+        
+        #Results from background jobs are drawn a frame at a time.
+        self.updates = UpdateQueue(self.results_box)
+        self.updates.start()
+        
+        self.container.pack(fill='both', expand=True)
+        self.container.rowconfigure(index=0, weight=1)
+        self.container.columnconfigure(index=0, weight=1)
+        
+        style = ttk.Style()
+        style.configure('cust.Treeview.Heading', font=CinEval._FONT)
+        style.configure('cust.Treeview', rowheight=30)
+        self.results_box.config(style='cust.Treeview')
+        
+        self.bg_label.grid(row=0, column=0)
+        padx = (CinEval.WIN_W - CinEval._CANV_W)/2.0
+        self.canvas.grid(row=0, column=0, sticky='we', padx=padx)
+        self.filter_frame.grid(row=1, column=0, columnspan=11, sticky='we')
+        self.no_results.grid(row=2, column=0, columnspan=11)
+        self.no_selection.grid(row=2, column=0, columnspan=11)
+        self.progress_label.grid(row=3, column=0, columnspan=11)
+        self.results_box.grid(row=2, column=0, columnspan=11, sticky='nesw',
+                              pady=10)
+        self.results_box.tkraise()
+        
+        self.row_info = {}
+        self.releases = {} #Release record of each row
+        self.rated = set() #Rows some provider has found ratings for
+        self.search_params = {}
+        self.row_order = [] #Every row, including filtered out rows
+        self.blank_row = None
+        self.index = RecordIndex()
+        self.results_version = 0 #Changes whenever any result changes
+        self.job = None #Rating job in progress
+        self.pending = {} #Rows waiting on each movie being rated
+        self.key_ranks = {} #Rating priority of each movie being rated
+        self.rank_pending = None
+        self.flights = SingleFlight()
+        self.details_job = None #Movie details job in progress
+        self.detail_rows = {} #Rows waiting on each summary page
+        self.find_fetch = None #(search, thread) fetching unindexed years
+        self.backend = backends.create(backend)
+        
+        #Cached ratings are refreshed in the background as they expire.
+        self.refresher = refresh.start()
+        
+        #The title index searched by Find is kept up to date in the
+        #background.
+        self.indexer = titles.start()
+        
+        #Performance metrics can be inspected in the debug panel and
+        #the results summarized in the analytics panel.
+        self.debug_panel = None
+        self.analytics_panel = None
+        self.bind('<F12>', self._toggle_debug_panel)
+        if os.environ.get('CINEVAL_DEBUG'):
+            self.after_idle(self._toggle_debug_panel)
+        
+        #Restore the last session, then warm up connections and the
+        #default search once the window has been painted.
+        if session.enabled():
+            self.after_idle(self._restore_session)
+        if not os.environ.get('CINEVAL_NO_WARMUP'):
+            self.after_idle(self._start_warm_up)
+        
+    def _start_warm_up(self):
+        #Starts the warm up on a background thread.
+        
+        threading.Thread(target=CinEval._warm_up, daemon=True).start()
+    
+    @staticmethod
+    def _warm_up():
+        #Opens pooled connections to both sites and prefetches the
+        #default search (current theatrical releases, all months), so
+        #the first Search and Get Ratings don't pay for connection
+        #setup and the first Search is served from memory.
+        
+        rt_thread = threading.Thread(target=network.preconnect,
+                                     args=(RT_URL, 2), daemon=True)
+        rt_thread.start()
+        network.preconnect(HOME_URL)
+        prefetch()
+        rt_thread.join()
+    
+    def _set_up_canvas(self):
+        #Sets up the canvas which will contain the frame containing
+        #the options bar and display area for results
+        
+        #Scrollbars for main window are created
+        self.main_vscroll = tk.Scrollbar(self.container,
+                                         command=self.canvas.yview)
+        self.main_hscroll = tk.Scrollbar(self.container, orient='horizontal',
+                                     command=self.canvas.xview)
+        self.canvas.config(yscrollcommand=self.main_vscroll.set, 
+                      xscrollcommand=self.main_hscroll.set)
+        
+        
+        self.canvas.create_window((0,0), window=self.options_frame,
+                                  anchor='nw', height=CinEval._CANV_H,
+                                  width=CinEval._CANV_W, 
+                                  tag='options_frame')        
+        
+    def _set_up_options(self):
+        #Sets up the options bar containing months option, search
+        #option, year entry, search button and rating buttons.
+        
+        display_values = ['Theatrical releases', 'Home media', 'Both']
+        
+        #Create custom style for the buttons and labels to change
+        #their fonts and colour.
+        style = ttk.Style()
+        style.configure('cust.TButton', anchor='center',
+                        font=CinEval._FONT)
+        style.configure('cust.TLabel', background='#262626')
+        self.option_add('*TCombobox*Listbox.font', CinEval._FONT)
+            
+        self.front_space = tk.Label(self.options_frame, bg='#262626')
+        self.end_space = tk.Label(self.options_frame, bg='#262626')
+        self.search_option = ttk.Combobox(self.options_frame,state='readonly',
+                                           values=display_values, width=16,
+                                           font=CinEval._FONT)
+        self.search_option.current(0)
+        self.months_option = ttk.Combobox(self.options_frame,state='readonly',
+                                          values=CinEval._MONTHS, width=10,
+                                          font=CinEval._FONT)
+        self.months_option.current(0)
+        self.month_label = ttk.Label(self.options_frame, text=' Month: ',
+                                     font=CinEval._FONT,
+                                     style='cust.TLabel')
+        self.year_label = ttk.Label(self.options_frame, text=' Year: ',
+                                    font=CinEval._FONT,
+                                    style='cust.TLabel')
+        self.year_entry = ttk.Entry(self.options_frame,
+                                    font=CinEval._FONT, width=6)
+        self.year_entry.bind('<FocusIn>', 
+                             lambda event: self.year_entry.bind('<Return>', self._get_results))
+        
+        self.search_bttn = ttk.Button(self.options_frame, text='Search',
+                                      style='cust.TButton',
+                                      command=self._get_results) #padx=10
+        self.rating_bttn = ttk.Button(self.options_frame, text='Get Ratings',
+                                      style='cust.TButton',
+                                      command=self._get_ratings)
+        self.rating_bttn.bind('<Shift-Button-1>', self._on_force_ratings)
+        self.rate_all_bttn = ttk.Button(self.options_frame, text='Rate All',
+                                        style='cust.TButton',
+                                        command=self._rate_all)
+        self.stop_bttn = ttk.Button(self.options_frame, text='Stop',
+                                    style='cust.TButton',
+                                    command=self._cancel_job)
+        self.stop_bttn.state(['disabled'])
+        self.progress_label = ttk.Label(self.options_frame, text='',
+                                        font=CinEval._FONT,
+                                        style='cust.TLabel')
+        
+        self.front_space.grid(row=0,column=0)
+        self.end_space.grid(row=0, column=10)
+        self.search_option.grid(row=0, column=1)
+        self.months_option.grid(row=0,column=3)
+        self.month_label.grid(row=0,column=2, sticky='nesw')
+        self.year_label.grid(row=0,column=4, sticky='nesw')
+        self.year_entry.grid(row=0, column=5)
+        self.search_bttn.grid(row=0, column=6, padx=10)
+        self.rating_bttn.grid(row=0, column=7)
+        self.rate_all_bttn.grid(row=0, column=8, padx=(10, 0))
+        self.stop_bttn.grid(row=0, column=9, padx=10)
+        
+        self.bind('<Configure>', self._on_configure)
+        self.options_frame.columnconfigure(index=0, weight=1)
+        self.options_frame.columnconfigure(index=10, weight=1)
+        self.options_frame.rowconfigure(index=2, weight=1)
+        
+        self._set_up_filter()
+        
+    def _set_up_filter(self):
+        #Sets up the filter bar above the results. Filtering narrows
+        #the loaded results as the user types, using words from the
+        #title and distributor and conditions such as sales>10m,
+        #tomato>=80 or audience:60-90. Find searches the titles of
+        #every year instead of the loaded results.
+        
+        self.filter_frame = tk.Frame(self.options_frame, bg='#262626')
+        self.filter_label = ttk.Label(self.filter_frame, text=' Filter: ',
+                                      font=CinEval._FONT,
+                                      style='cust.TLabel')
+        self.filter_text = tk.StringVar()
+        self.filter_entry = ttk.Entry(self.filter_frame,
+                                      textvariable=self.filter_text,
+                                      font=CinEval._FONT, width=40)
+        self.filter_hint = ttk.Label(self.filter_frame,
+                                     text='e.g. pixar sales>100m tomato>=80',
+                                     style='cust.TLabel')
+        self.filter_text.trace_add('write', self._apply_filter)
+        self.find_text = tk.StringVar()
+        self.find_entry = ttk.Entry(self.filter_frame,
+                                    textvariable=self.find_text,
+                                    font=CinEval._FONT, width=20)
+        self.find_entry.bind('<Return>', self._find_titles)
+        self.find_bttn = ttk.Button(self.filter_frame, text='Find',
+                                    style='cust.TButton',
+                                    command=self._find_titles)
+        
+        self.filter_label.pack(side='left')
+        self.filter_entry.pack(side='left')
+        self.filter_hint.pack(side='left', padx=10)
+        self.find_bttn.pack(side='right')
+        self.find_entry.pack(side='right', padx=10)
+        
+    def _set_up_results_box(self):
+        #Sets up the area where results are listed. Uses ttk Treeview
+        #to display results. 
+        
+        for header in self.headers:
+            col_w = font.Font(family=CinEval._FONT[0],
+                              size=CinEval._FONT[1]).measure(header)
+            self.results_box.heading(header, text=header,
+                                     command=lambda col=header:
+                                        self._sort_column(col, True))
+            self.results_box.column(header, width=col_w, minwidth=col_w)
+        
+        self.result_vscroll = ttk.Scrollbar(self.results_box,
+                                            command=self.results_box.yview)
+        self.result_hscroll = ttk.Scrollbar(self.results_box,
+                                            orient='horizontal',
+                                            command=self.results_box.xview)
+        
+        self.results_box.configure(yscrollcommand=self._on_results_scroll,
+                                   xscrollcommand=self.result_hscroll.set)
+        
+        #The release type is only shown when both types are listed and
+        #movie details only when asked for.
+        self._update_columns()
+        
+        self.results_box.bind('<Double-1>', self._on_double)
+        self.results_box.bind('<<TreeviewSelect>>', self._on_select)
+        self.results_box.bind('<Enter>', self._on_enter)
+        
+    def _set_up_menu(self):
+        #Sets up the menu bar.
+        
+        menu_bar = tk.Menu(self)
+        
+        self.file_menu = tk.Menu(menu_bar, tearoff=0)
+        self.file_menu.add_command(label='Import Snapshot...',
+                                   command=self._import_snapshot)
+        self.file_menu.add_command(label='Export Snapshot...',
+                                   command=self._export_snapshot)
+        self.file_menu.add_separator()
+        self.file_menu.add_command(label='Exit', command=self.destroy)
+        menu_bar.add_cascade(label='File', menu=self.file_menu)
+        
+        self.view_menu = tk.Menu(menu_bar, tearoff=0)
+        self.view_menu.add_checkbutton(label='Movie Details',
+                                       variable=self.show_details,
+                                       command=self._toggle_details)
+        self.view_menu.add_checkbutton(label='Revalidate Restored Ratings',
+                                       variable=self.revalidate)
+        self.view_menu.add_command(label='Analytics',
+                                   command=self._toggle_analytics_panel)
+        self.view_menu.add_command(label='Debug Panel', accelerator='F12',
+                                   command=self._toggle_debug_panel)
+        menu_bar.add_cascade(label='View', menu=self.view_menu)
+        
+        self.config(menu=menu_bar)
+    
+    def _bind_mousewheel(self):
+        #Binds mousewheel to scrollable areas. Formatted for different
+        #platforms.
+        
+        if platform == 'linux':
+            self.bg_label.bind('<Button-4>',
+                               lambda event, arg=-1:self._on_mousewheel(event, arg))
+            self.bg_label.bind('<Button-5>',
+                               lambda event, arg=1: self._on_mousewheel(event, arg))
+        else:
+            self.bg_label.bind('<MouseWheel>', self._on_mousewheel)
+    
+    def _toggle_debug_panel(self, event=None):
+        #Opens the debug panel, or closes it if it is already open.
+        
+        if self.debug_panel is not None and self.debug_panel.winfo_exists():
+            self.debug_panel.destroy()
+            self.debug_panel = None
+        else:
+            self.debug_panel = DebugPanel(self)
+    
+    def _toggle_analytics_panel(self):
+        #Opens the analytics panel, or closes it if it is already open.
+        
+        if (self.analytics_panel is not None
+                and self.analytics_panel.winfo_exists()):
+            self.analytics_panel.destroy()
+            self.analytics_panel = None
+        else:
+            self.analytics_panel = AnalyticsPanel(self)
+    
+    def _sort_column(self, col, reverse):
+        #Sorts columns for displayed results in a ttk Treeview.
+        
+        with metrics.timer('ui.sort.time'):
+            self._sort_rows(col, reverse)
+        self.sort_state = (col, reverse)
+        
+        #Switch the sorting order option to sort in opposite direction
+        #next time.
+        self.results_box.heading(col,
+                                 command=lambda col=col:
+                                    self._sort_column(col, not reverse))
+    
+    def _sort_rows(self, col, reverse):
+        #Reorders every row, shown or filtered out, by the given
+        #column.
+        
+        self.updates.flush()
+        values = [(self.results_box.set(row_id, col), row_id)
+                  for row_id in self.row_order]
+        
+        #These columns need additional formatting when being sorted.
+        date_col = CinEval._HEADERS[0]
+        sales_cols = [CinEval._HEADERS[3], CinEval._HEADERS[7],
+                      CinEval._HEADERS[10]]
+        rating_cols = CinEval._HEADERS[4:6] + self.provider_cols
+        runtime_col = CinEval._HEADERS[8]
+        if col == date_col:
+            values.sort(key=lambda date: self._format_dates(date[0]),
+                        reverse=reverse)
+        elif col in sales_cols:
+            values.sort(reverse=reverse,
+                        key=lambda sales: self._format_sales(sales[0]))
+        elif col == runtime_col:
+            values.sort(reverse=reverse,
+                        key=lambda runtime: self._format_runtime(runtime[0]))
+        elif col in rating_cols:
+            values.sort(reverse=reverse,
+                        key=lambda rating: self._format_ratings(rating[0]))
+        else:
+            values.sort(reverse=reverse)
+        
+        self.row_order = [value[1] for value in values]
+        self._show_rows()
+    
+    def _apply_filter(self, *args):
+        #Shows only the rows matching the filter text.
+        
+        with metrics.timer('ui.filter.time'):
+            self._show_rows()
+    
+    def _show_rows(self):
+        #Replaces the displayed rows with the rows matching the filter,
+        #in sorted order. Rows are detached rather than deleted so
+        #they can be shown again without being recreated.
+        
+        words, ranges = parse_query(self.filter_text.get())
+        if words or ranges:
+            matches = self.index.search(words, ranges)
+            rows = [row_id for row_id in self.row_order if row_id in matches]
+        else:
+            rows = list(self.row_order)
+        
+        #Keep the blank row last to keep the last result visible when
+        #the horizontal scrollbar is active.
+        if self.blank_row is not None:
+            rows.append(self.blank_row)
+        self.results_box.set_children('', *rows)
+        self._schedule_rerank()
+        
+    def _format_dates(self, date):
+        #Returns a datetime object created from given date to assist
+        #with sorting
+        
+        if (not (any(release in date 
+                     for release in CinEval._AMBIG_RELEASES))
+            and len(date.split()) == 3):
+            return datetime.strptime(date, '%B %d, %Y')
+        
+        return datetime(year=dtime.MINYEAR, month=1, day=1)
+    
+    def _format_sales(self, sales):
+        #Returns sales as a valid int to assist with sorting.
+        
+        try:
+            return int(sales.replace('$', '').replace(',',''))
+        except ValueError:
+            return 0 #No sales listed
+    
+    def _format_runtime(self, runtime):
+        #Returns a running time such as '118 minutes' as an int to
+        #assist with sorting.
+        
+        words = runtime.split()
+        return int(words[0]) if words and words[0].isdigit() else 0
+    
+    def _format_ratings(self, rating):
+        #Returns rating as a valid int to assist with sorting.
+        
+        if (rating != '' and rating != 'Not rated'
+            and rating != 'N/A' and rating != 'Unavailable'):
+            return int(rating.replace('%',''))
+        elif rating == '':
+            return -3
+        elif rating == 'N/A' or rating == 'Unavailable':
+            return -2
+        else:
+            return -1
+                
+    def _on_configure(self, event):
+        #Schedules a layout update when the window or its main areas
+        #are resized. The update is deferred until the event loop is
+        #idle, so a burst of events, such as those from columns being
+        #resized while results are inserted, costs a single update.
+        
+        if event.widget not in (self, self.container, self.canvas,
+                                self.options_frame):
+            return
+        if self.layout_pending is None:
+            self.layout_pending = self.after_idle(self._update_layout)
+    
+    def _update_layout(self):
+        #Resizes canvas and options frame when window is resized.
+        #Only the parts of the layout whose geometry changed since the
+        #last update are touched.
+        
+        self.layout_pending = None
+        
+        frame_w = self.options_frame.winfo_width()
+        frame_h = self.options_frame.winfo_height()
+        win_w = self.container.winfo_width()
+        win_h = self.container.winfo_height()
+        canv_w = self.canvas.winfo_width()
+        canv_h = self.canvas.winfo_height()
+        
+        geometry = (frame_w, frame_h, win_w, win_h, canv_w, canv_h)
+        if geometry == self.layout_geometry:
+            return
+        self.layout_geometry = geometry
+        
+        min_w = CinEval.WIN_W
+        min_h = CinEval.WIN_H
+        
+        self.canvas.config(scrollregion=(0,0, frame_w, frame_h))
+        
+        #Show scrollbars only when scrollable areas are not visible.
+        scrolls = (self._frame_not_visible(frame_h=frame_h),
+                   self._frame_not_visible(frame_w=frame_w))
+        if scrolls != self.main_scrolls:
+            self.main_scrolls = scrolls
+            self.main_vscroll.grid_forget()
+            self.main_hscroll.grid_forget()
+            if scrolls[0]:
+                self.main_vscroll.grid(row=0, column=1, sticky='ns')
+            if scrolls[1]:
+                self.main_hscroll.grid(row=1, column=0, sticky='we')
+        
+        pady = (CinEval.WIN_H - CinEval._CANV_H)/2.0
+        if (win_w > min_w and win_h > min_h):
+            self._grid_canvas('nesw', pady)
+            self.canvas.itemconfig('options_frame', width=canv_w,
+                                   height=canv_h)
+        elif win_h > min_h:
+            self._grid_canvas('nesw', pady)
+            self.canvas.itemconfig('options_frame', height=canv_h)
+        elif win_w > min_w:
+            self._grid_canvas('we', 0)
+            self.canvas.itemconfig('options_frame', width=canv_w)
+        else:
+            self._grid_canvas('we', 0)
+    
+    def _grid_canvas(self, sticky, pady):
+        #Regrids the canvas only if its grid options changed.
+        
+        if (sticky, pady) != self.canvas_grid:
+            self.canvas_grid = (sticky, pady)
+            self.canvas.grid(sticky=sticky, pady=pady)
+    
+    def _frame_not_visible(self, frame_w=0, frame_h=0):
+        #Checks whether or not area within canvas is visible.
+        
+        canvas_w = self.canvas.winfo_width()
+        canvas_h = self.canvas.winfo_height()
+        
+        return frame_h > canvas_h or frame_w > canvas_w
+    
+    def _on_double(self, event):
+        #Opens link associated with movie or rating.
+        
+        selection = self.results_box.selection()
+        
+        if len(selection) > 0:
+            clicked_row = self.results_box.identify_row(event.y)
+            if clicked_row in self.row_info:
+                col_id = self.results_box.identify_column(event.x)
+                column = self.results_box.column(col_id, 'id')
+                
+                link = (self.row_info[clicked_row][4]
+                        if column in CinEval._HEADERS[4:6]
+                        else self.row_info[clicked_row][2])
+                
+                if link is not None:
+                    webbrowser.open(link)
+                  
+    def _on_select(self, event):
+        #Selected rows are rated before any others still waiting.
+        
+        self._schedule_rerank()
+        
+    def _on_results_scroll(self, first, last):
+        #Updates the scrollbar and rates rows scrolled into view next.
+        
+        self.result_vscroll.set(first, last)
+        self._schedule_rerank()
+    
+    def _on_enter(self, event):
+        #Reveals scrollbars only when results area is not fully
+        #visible. Scrollbars are only repacked when that changes.
+        
+        fully_visible = (0.0, 1.0) #position when fully visible
+        
+        scrolls = (self.results_box.xview() != fully_visible,
+                   self.results_box.yview() != fully_visible)
+        if scrolls == self.result_scrolls:
+            return
+        self.result_scrolls = scrolls
+    
+        self.result_hscroll.pack_forget()
+        self.result_vscroll.pack_forget()
+        
+        if scrolls[0]:
+            self.result_hscroll.pack(side='bottom', fill='x')
+        
+        if scrolls[1]:
+            self.result_vscroll.pack(side='right', fill='y')
+        
+    def _on_mousewheel(self, event, scroll=None):
+        #Scrolls an area when using the mousewheel
+        
+        frame_h = self.options_frame.winfo_height()
+        
+        #Only activate scrolling when options frame not fully visible.
+        if self._frame_not_visible(frame_h=frame_h):
+            if platform == 'darwin':
+                self.canvas.yview_scroll(-1*event.delta, 'units')
+            elif platform == 'linux':
+                self.canvas.yview_scroll(int(scroll), 'units')
+            else:
+                self.canvas.yview_scroll(int(-1*(event.delta/120)), 'units')
+    
+    def _get_results(self, event=None):
+        #Retrieves list of movies for selected options from site
+        
+        #Row ids are about to become stale so stop rating them.
+        self._cancel_job()
+        
+        #Delete old results and raise frame above any other frames
+        self._clear_results()
+        self.results_box.tkraise()
+        
+        input_year = self.year_entry.get()
+        is_space = not input_year.split()
+        
+        if input_year != '':
+            try:
+                input_year = int(input_year)
+            except ValueError:
+                if not is_space:
+                    self.no_results.tkraise()
+                    return
+            
+            if not (is_space or 1901 < input_year < 10000):
+                self.no_results.tkraise()
+                return
+        
+        selected_option = self.search_option.current()
+        year = '' if is_space else str(input_year)
+        release_types = ([0, 1] if selected_option == CinEval._BOTH_OPTION
+                         else [selected_option])
+        
+        if self.months_option.current() == 0:
+            months = CinEval._MONTHS[1:]
+        else:
+            months = [self.months_option.get()]
+        
+        with capture('search'):
+            self._search(release_types, year, months)
+        
+    def _search(self, release_types, year, months):
+        #Fetches the release schedules of the given types concurrently
+        #and displays their movies for the given months.
+        
+        listings = get_schedules(release_types, year, months)
+        if all(listing is None for listing in listings):
+            self.no_results.tkraise()
+            return
+        
+        self.search_params = {'release_types': release_types,
+                              'year': year, 'months': months}
+        self._show_release_types(len(release_types) > 1)
+        releases = merge_listings(listings)
+        self._display_results(releases)
+        refresh.track(releases)
+    
+    def _find_titles(self, event=None):
+        #Shows the movies of every year whose title or distributor
+        #contain the words in the find box, from the title index. The
+        #schedules of the years named in the search, or of the current
+        #year, that have never been indexed are then fetched in the
+        #background and the search repeated once they are.
+        
+        text = self.find_text.get()
+        if not tokenize(text):
+            return
+        
+        with capture('find'):
+            self._show_matches(text)
+        
+        years = (titles.query_years(text)
+                 or [datetime.today().year])
+        release_types = range(len(RELEASE_TYPES))
+        missing = titles.shared().missing_years(years, release_types)
+        if missing:
+            thread = threading.Thread(target=CinEval._fetch_years,
+                                      args=(missing, release_types),
+                                      daemon=True)
+            self.find_fetch = (text, thread)
+            thread.start()
+            self.progress_label.config(text='Searching %s...'
+                                       % ', '.join(map(str, missing)))
+            self.after(CinEval._POLL_MS, self._poll_find, text, thread)
+    
+    def _show_matches(self, text):
+        #Displays the movies of the title index matching a search.
+        
+        records, total = titles.search_records(text)
+        if not records:
+            self._cancel_job()
+            self._clear_results()
+            self.search_params = {'query': text}
+            self.no_results.tkraise()
+            return
+        
+        self._show_records(records, {'query': text})
+        if total > len(records):
+            self.progress_label.config(text='Showing %d of %d matches'
+                                       % (len(records), total))
+    
+    @staticmethod
+    def _fetch_years(years, release_types):
+        #Fetches the schedules of years, which stores them on disk,
+        #and indexes them. Runs on a background thread.
+        
+        for year in years:
+            for release_type in release_types:
+                get_schedule(release_type, str(year))
+        titles.shared().sync()
+    
+    def _poll_find(self, text, thread):
+        #Searches again once the unindexed years of a search have been
+        #fetched, unless another search replaced it.
+        
+        if self.find_fetch != (text, thread):
+            return
+        if thread.is_alive():
+            self.after(CinEval._POLL_MS, self._poll_find, text, thread)
+            return
+        
+        self.find_fetch = None
+        self.progress_label.config(text='')
+        if self.search_params.get('query') == text:
+            self._show_matches(text)
+    
+    def _show_release_types(self, combined):
+        #Shows the release type column only when both release types
+        #are listed.
+        
+        self.show_types = combined
+        self._update_columns()
+    
+    def _update_columns(self):
+        #Displays the ratings columns of the enabled providers followed
+        #by the optional columns that are turned on.
+        
+        columns = CinEval._HEADERS[:4]
+        if providers.RottenTomatoes.NAME in self.provider_names:
+            columns.extend(CinEval._HEADERS[4:6])
+        columns.extend(self.provider_cols)
+        if self.show_types:
+            columns.append(CinEval._HEADERS[6])
+        if self.show_details.get():
+            columns.extend(CinEval._HEADERS[CinEval._DETAILS_COL:])
+        self.results_box.config(displaycolumns=columns)
+    
+    def _export_snapshot(self):
+        #Saves the displayed results and their ratings to a snapshot
+        #file that can be browsed without network access.
+        
+        if not self.row_order:
+            self.no_results.tkraise()
+            return
+        
+        path = filedialog.asksaveasfilename(
+            parent=self, defaultextension=snapshot.EXTENSION,
+            filetypes=[('CinEval snapshots', '*' + snapshot.EXTENSION)])
+        if not path:
+            return
+        
+        try:
+            snapshot.save(path, self.records(),
+                          meta={'search': self.search_params})
+        except OSError as error:
+            messagebox.showerror('CinEval', 'Could not save snapshot: %s'
+                                 % error, parent=self)
+    
+    def _import_snapshot(self):
+        #Replaces the results with those of a snapshot file.
+        
+        path = filedialog.askopenfilename(
+            parent=self,
+            filetypes=[('CinEval snapshots', '*' + snapshot.EXTENSION),
+                       ('All files', '*')])
+        if not path:
+            return
+        
+        try:
+            meta, records = snapshot.load(path)
+        except (OSError, snapshot.SnapshotError) as error:
+            messagebox.showerror('CinEval', 'Could not open snapshot: %s'
+                                 % error, parent=self)
+            return
+        
+        self._show_records(records, meta.get('search', {}))
+    
+    def _show_records(self, records, search_params):
+        #Displays results from a list of snapshot records.
+        
+        self._cancel_job()
+        self._clear_results()
+        self.results_box.tkraise()
+        
+        self.search_params = search_params
+        releases = [snapshot.to_release(record) for record in records]
+        ratings = [(record['tomatometer'] or '', record['audience'] or '',
+                    record['rt_link']) for record in records]
+        details = [{field: record.get(field) or '' for field in DETAIL_FIELDS}
+                   for record in records]
+        scores = [{column: record.get(field) or ''
+                   for column, field in self._provider_fields()}
+                  for record in records]
+        self._show_release_types(len({release.release_type
+                                      for release in releases}) > 1)
+        self._display_results(releases, ratings, details, scores)
+    
+    def records(self):
+        '''Returns every row, in display order, as a snapshot record.'''
+        
+        self.updates.flush()
+        records = []
+        for row_id in self.row_order:
+            values = self.results_box.item(row_id, 'values')
+            record = self.releases[row_id]._asdict()
+            record['tomatometer'] = values[4] or None
+            record['audience'] = values[5] or None
+            record['rt_link'] = self.row_info[row_id][4]
+            for i, field in enumerate(DETAIL_FIELDS):
+                record[field] = values[CinEval._DETAILS_COL + i] or None
+            for column, field in self._provider_fields():
+                record[field] = values[self.headers.index(column)] or None
+            records.append(record)
+        return records
+    
+    def _provider_fields(self):
+        #Returns (column, record field) for the columns of every
+        #enabled provider other than Rotten Tomatoes.
+        
+        return [pair for provider in self.providers
+                if provider.NAME != providers.RottenTomatoes.NAME
+                for pair in zip(provider.COLUMNS, provider.FIELDS)]
+        
+    def _clear_results(self):
+        #Deletes every row, including rows hidden by the filter.
+        
+        self._cancel_details()
+        self.updates.clear()
+        self.results_box.delete(*self.results_box.get_children())
+        self.results_box.delete(*[row_id for row_id in self.row_order
+                                  if self.results_box.exists(row_id)])
+        self.row_order = []
+        self.blank_row = None
+        self.row_info = {}
+        self.releases = {}
+        self.rated = set()
+        self.sort_state = None
+        self.search_params = {}
+        self.index.clear()
+        self.results_version += 1
+    
+    def _display_results(self, releases, ratings=None, details=None,
+                         scores=None):
+        #Displays each movie from a list of Release records, with their
+        #ratings from a parallel list of (critics rating, audience
+        #rating, Rotten Tomatoes link), their details from a parallel
+        #list of dicts and their other providers' ratings from a
+        #parallel list of dicts keyed by column if given.
+        
+        self.row_info = {} #Info for each movie will be stored
+        
+        for i, release in enumerate(releases):
+            self._insert_release(release,
+                                 ratings[i] if ratings is not None else None,
+                                 details[i] if details is not None else None,
+                                 scores[i] if scores is not None else None)
+        
+        #Raise no results frame if no results were found
+        if not self.row_info:
+            self.no_results.tkraise()
+        else:
+            #Insert a blank row at the end to keep the last result
+            #visible when the horizontal scrollbar is active.
+            self.blank_row = self.results_box.insert('', 'end')
+            
+            #Apply any filter that was typed before the search.
+            self.index.prepare()
+            self._apply_filter()
+            
+            if self.show_details.get():
+                self._get_details()
+        
+    def _insert_release(self, release, ratings=None, details=None,
+                        scores=None):
+        #Inserts a movie into the ttk Treeview (results box), with its
+        #ratings, details and other providers' ratings if known.
+        
+        row_tag = release.title_w_dist.replace(' ', '').replace('\n', '')
+        critics_rating, aud_rating, rt_link = ratings or ('', '', None)
+        details = [(details or {}).get(field, '') for field in DETAIL_FIELDS]
+        scores = [(scores or {}).get(column, '')
+                  for column in self.provider_cols]
+        
+        with metrics.timer('ui.insert.time'):
+            row_id = self.results_box.insert('', 'end', 
+                                             values=[release.date,
+                                                     release.title_w_dist,
+                                                     release.distributor,
+                                                     release.box_office,
+                                                     critics_rating,
+                                                     aud_rating,
+                                                     release.release_type]
+                                                    + details + scores,
+                                             tags=row_tag)
+        
+        link = self._hyperlink_row(row_tag, HOME_URL, release.href)
+        
+        #Store important info into dict
+        self.row_info[row_id] = (release.title, release.year, link, row_tag,
+                                 rt_link)
+        self.releases[row_id] = release
+        self.row_order.append(row_id)
+        if rt_link is not None or any(scores):
+            self.rated.add(row_id)
+        self.results_version += 1
+        self.index.add(row_id, ' '.join([release.title_w_dist,
+                                         release.distributor,
+                                         release.release_type]),
+                       {'sales': self._format_sales(release.box_office)})
+        if ratings is not None:
+            self._index_ratings(row_id, critics_rating, aud_rating)
+        if any(details):
+            self._index_details(row_id, details)
+        
+        #Resize the title column
+        self._resize_column(CinEval._HEADERS[1], release.title_w_dist)
+    
+    def _hyperlink_row(self, row_tag, base_url, href):
+        #Change the font of the row to make it appear as a hyperlink.
+        #Gives row a regular appearance if link is not available.
+        #Returns link, which can be None or a url.
+        
+        if href is not None:
+            link = base_url + href
+            _font = font.Font(family=CinEval._FONT[0],
+              size=CinEval._FONT[1], underline=True)
+            fg = '#4dafff'
+        else:
+            link = href
+            _font = font.Font(family=CinEval._FONT[0],
+              size=CinEval._FONT[1])
+            fg = 'white'
+                    
+        self.results_box.tag_configure(row_tag, font=_font,
+                                       foreground=fg)
+        return link
+    
+    def _resize_column(self, col, text):
+        #Resizes a column based on the width of the text given
+        
+        with metrics.timer('ui.resize.time'):
+            _font = font.Font(font=CinEval._FONT)
+            text_w = _font.measure(text)
+            col_w = self.results_box.column(col, width=None)
+            if text_w > col_w:
+                self.results_box.column(col, width=text_w)
+            
+    def _on_force_ratings(self, event):
+        #Gets ratings again even for rows that already have them.
+        
+        self._get_ratings(force=True)
+        return 'break'
+    
+    def _rate_all(self):
+        #Gets ratings for every loaded row, rating the selected rows
+        #and the rows in view first.
+        
+        self._get_ratings(rows=self.row_order)
+        
+    def _get_ratings(self, force=False, rows=None, revalidate=False):
+        #Gets the ratings of every enabled provider for the given rows,
+        #or the selected rows by default. Rows for the same movie share
+        #one lookup and rows that already have ratings are skipped
+        #unless force is set, which looks them up again, or revalidate
+        #is, which looks them up again once their cached ratings have
+        #expired.
+        
+        self.results_box.tkraise()
+        selection = self.results_box.selection() if rows is None else rows
+        no_results = not len(self.results_box.get_children())
+        
+        #Apply the results of a job that has just finished so its
+        #rows count as rated.
+        if self.job is not None and self.job.finished:
+            self._poll_job(self.job)
+        
+        selection_info = [] #Store info (title, year, key, date), then
+                            #(title, year, key, max age)
+        
+        #Proceed if a selection was made
+        if len(selection) > 0:
+            for row_id in selection:
+                if row_id in self.row_info:
+                    row_info = self.row_info[row_id]
+                    if row_id in self.rated and not (force or revalidate):
+                        continue #Already rated
+                    
+                    title, year = row_info[0], row_info[1]
+                    key = rating_key(title, year)
+                    
+                    #Movies already being looked up aren't looked up
+                    #again, their result is shared with this row.
+                    if key not in self.pending:
+                        self.pending[key] = []
+                        selection_info.append((title, year, key,
+                                               self.releases[row_id].date))
+                    if row_id not in self.pending[key]:
+                        self.pending[key].append(row_id)
+        elif no_results:
+            self.no_selection.tkraise()
+            return
+        
+        if not selection_info:
+            return
+        
+        #Cached ratings are used until they expire.
+        if force:
+            ages = [0]*len(selection_info)
+        else:
+            ages = refresh.max_ages([(title, year, date) for title, year, _,
+                                     date in selection_info])
+        selection_info = [info[:3] + (age,)
+                          for info, age in zip(selection_info, ages)]
+        
+        #Add to the job in progress rather than starting over.
+        self._rank_keys()
+        if self.job is not None:
+            if self.job.extend(selection_info):
+                return
+            for result in self.job.results():
+                self._show_ratings(result)
+        
+        #Run as many lookups at a time as the backend has workers.
+        self._start_job(RatingJob(self._lookup, selection_info,
+                                  workers=self.backend.workers,
+                                  is_failure=lambda result:
+                                    all(ratings[-1] is None for ratings
+                                        in result[0].values()),
+                                  label='ratings.' + self.backend.NAME,
+                                  priority=self._priority,
+                                  on_error=self._lookup_failed))
+    
+    def _lookup(self, selection_info, cancel=None):
+        #Searches every enabled provider for the ratings of a movie
+        #given its info (title, year, key, max age), sharing the search
+        #with any other lookup of the same movie in flight. Returns
+        #({provider name: ratings}, key).
+        
+        title, year, key, max_age = selection_info
+        search = lambda: (self.backend.call(providers.lookup_all,
+                                            self.provider_names, title,
+                                            year, max_age, cancel=cancel),
+                          key)
+        return self.flights.do(key, search, cancel)
+    
+    def _lookup_failed(self, selection_info):
+        #Returns the result of a lookup that raised, showing every
+        #provider as unavailable in the rows waiting on it.
+        
+        return ({provider.NAME: provider.unavailable()
+                 for provider in self.providers}, selection_info[2])
+    
+    def _priority(self, selection_info):
+        #Returns the rank of a movie waiting to be rated. Lower ranks
+        #are rated first and unranked movies last.
+        
+        return self.key_ranks.get(selection_info[2], (3, 0))
+    
+    def _schedule_rerank(self):
+        #Re-ranks the rating job shortly, once scrolling, sorting or
+        #selecting has settled.
+        
+        if self.job is not None and self.rank_pending is None:
+            self.rank_pending = self.after(CinEval._POLL_MS, self._rerank)
+    
+    def _rerank(self):
+        #Ranks the movies waiting to be rated by their rows' place on
+        #screen.
+        
+        self.rank_pending = None
+        if self.job is not None:
+            self._rank_keys()
+            self.job.reprioritize()
+    
+    def _rank_keys(self):
+        #Ranks every movie being rated by its best placed row: selected
+        #rows first, then rows in view, then the other shown rows and
+        #finally filtered out rows, each in display order.
+        
+        shown = self.results_box.get_children()
+        first, last = self.results_box.yview()
+        in_view = set(shown[int(first*len(shown)):
+                            int(last*len(shown)) + 1])
+        selected = set(self.results_box.selection())
+        
+        positions = {row_id: i for i, row_id in enumerate(shown)}
+        order = {row_id: i for i, row_id in enumerate(self.row_order)}
+        ranks = {}
+        for key, row_ids in self.pending.items():
+            best = (3, 0)
+            for row_id in row_ids:
+                position = positions.get(row_id, order.get(row_id, 0))
+                if row_id in selected:
+                    rank = (0, position)
+                elif row_id in in_view:
+                    rank = (1, position)
+                elif row_id in positions:
+                    rank = (2, position)
+                else:
+                    rank = (3, position)
+                best = min(best, rank)
+            ranks[key] = best
+        self.key_ranks = ranks
+    
+    def _start_job(self, job):
+        #Starts a rating job and begins reporting its progress.
+        
+        self.job = job.start()
+        self.stop_bttn.state(['!disabled'])
+        self._poll_job(job)
+    
+    def _cancel_job(self):
+        #Cancels the rating job in progress, if any.
+        
+        job = self.job
+        if job is not None and not job.finished:
+            job.cancel()
+            self._show_progress(job, 'Stopped')
+        self.job = None
+        self.pending = {}
+        self.stop_bttn.state(['disabled'])
+    
+    def _poll_job(self, job):
+        #Inserts completed ratings into their rows and updates the
+        #progress until the job finishes or is replaced.
+        
+        if job is not self.job:
+            return
+        
+        for result in job.results():
+            self._show_ratings(result)
+        
+        if job.finished:
+            self._show_progress(job, 'Done')
+            self.job = None
+            self.pending = {}
+            self.stop_bttn.state(['disabled'])
+        else:
+            self._show_progress(job, 'Rating')
+            self.after(CinEval._POLL_MS, self._poll_job, job)
+    
+    def _show_ratings(self, result):
+        #Inserts a movie's ratings from each provider in every row
+        #waiting on it.
+        
+        results, key = result
+        columns = {}
+        for provider in self.providers:
+            columns.update(zip(provider.COLUMNS, results[provider.NAME]))
+        rt_ratings = results.get(providers.RottenTomatoes.NAME)
+        found = any(ratings[-1] is not None for ratings in results.values())
+        
+        for row_id in self.pending.pop(key, []):
+            if row_id not in self.row_info:
+                continue
+            
+            self.updates.set(row_id, columns)
+            if found:
+                self.rated.add(row_id)
+            if rt_ratings is not None:
+                critics_rating, aud_rating, rt_link = rt_ratings
+                self.row_info[row_id] = (self.row_info[row_id][:4]
+                                         + (rt_link,))
+                self._index_ratings(row_id, critics_rating, aud_rating)
+        self.results_version += 1
+    
+    def _index_ratings(self, row_id, critics_rating, aud_rating):
+        #Makes a row's ratings available to the filter.
+        
+        self.results_version += 1
+        for field, rating in (('tomatometer', critics_rating),
+                              ('audience', aud_rating)):
+            value = self._format_ratings(rating)
+            self.index.set_number(row_id, field,
+                                  value if value >= 0 else None)
+    
+    def _toggle_details(self):
+        #Shows or hides the movie details columns, filling them in
+        #when they are shown.
+        
+        self._update_columns()
+        if self.show_details.get():
+            self._get_details()
+        else:
+            self._cancel_details()
+    
+    def _get_details(self):
+        #Fetches the summary pages of every row without details on
+        #the backend and fills in their details as they arrive.
+        
+        if self.details_job is not None and not self.details_job.finished:
+            return
+        
+        self.updates.flush()
+        self.detail_rows = {}
+        for row_id in self.row_order:
+            href = self.releases[row_id].href
+            values = self.results_box.item(row_id, 'values')
+            if href and not any(values[CinEval._DETAILS_COL:]):
+                self.detail_rows.setdefault(href, []).append(row_id)
+        if not self.detail_rows:
+            return
+        
+        job = RatingJob(self._lookup_details, list(self.detail_rows),
+                        workers=self.backend.workers,
+                        is_failure=lambda result: result[1] is None,
+                        label='details.' + self.backend.NAME)
+        self.details_job = job.start()
+        self._poll_details(job)
+    
+    def _lookup_details(self, href, cancel=None):
+        #Returns (href, details) for a summary page.
+        
+        return (href, self.backend.call(fetch_details, href, cancel=cancel))
+    
+    def _cancel_details(self):
+        #Cancels the movie details job in progress, if any.
+        
+        if self.details_job is not None:
+            self.details_job.cancel()
+        self.details_job = None
+        self.detail_rows = {}
+    
+    def _poll_details(self, job):
+        #Fills in completed details until the job finishes or is
+        #replaced.
+        
+        if job is not self.details_job:
+            return
+        
+        for href, details in job.results():
+            if details is None:
+                continue
+            values = [details.get(field, '') for field in DETAIL_FIELDS]
+            columns = dict(zip(CinEval._HEADERS[CinEval._DETAILS_COL:],
+                               values))
+            for row_id in self.detail_rows.pop(href, []):
+                self.updates.set(row_id, columns)
+                self._index_details(row_id, values)
+        
+        if job.finished:
+            self.details_job = None
+        else:
+            self.after(CinEval._POLL_MS, self._poll_details, job)
+    
+    def _index_details(self, row_id, details):
+        #Makes a row's details, given in DETAIL_FIELDS order, available
+        #to the filter.
+        
+        self.results_version += 1
+        budget, runtime, _, worldwide = details
+        for field, value in (('budget', self._format_sales(budget)),
+                             ('runtime', self._format_runtime(runtime)),
+                             ('worldwide', self._format_sales(worldwide))):
+            self.index.set_number(row_id, field, value or None)
+    
+    def _show_progress(self, job, state):
+        #Displays the progress of a rating job under the results.
+        
+        progress = job.progress()
+        text = '%s: %d/%d' % (state, progress['done'], progress['total'])
+        if progress['failures']:
+            text += ', %d failed' % progress['failures']
+        if state == 'Rating' and progress['eta'] is not None:
+            text += ', ETA %s' % dtime.timedelta(seconds=
+                                                 round(progress['eta']))
+        self.progress_label.config(text=text)
+        
+    def _restore_session(self):
+        #Shows the results of the last session as they were left, then
+        #revalidates their ratings in the background if asked to.
+        
+        saved = session.load()
+        if saved is None or self.row_order:
+            return
+        records, search_params, state = saved
+        
+        with metrics.timer('ui.restore.time'):
+            self._show_records(records, search_params)
+            self._show_search_params(search_params)
+            self.revalidate.set(state.get('revalidate', True))
+            self.filter_text.set(state.get('filter', ''))
+            for col, width in state.get('widths', {}).items():
+                if col in self.headers:
+                    self.results_box.column(col, width=width)
+            if state.get('sort') is not None:
+                col, reverse = state['sort']
+                if col in self.headers:
+                    self.sort_state = (col, reverse)
+                    self.results_box.heading(col,
+                                             command=lambda col=col:
+                                                self._sort_column(col,
+                                                                  not reverse))
+        
+        rated = [row_id for row_id in self.row_order if row_id in self.rated]
+        if self.revalidate.get() and rated:
+            self._get_ratings(rows=rated, revalidate=True)
+    
+    def _show_search_params(self, search_params):
+        #Sets the search options to those of a search.
+        
+        release_types = search_params.get('release_types', [0])
+        self.search_option.current(CinEval._BOTH_OPTION
+                                   if len(release_types) > 1
+                                   else release_types[0])
+        months = search_params.get('months', MONTHS)
+        self.months_option.current(0 if len(months) != 1
+                                   else CinEval._MONTHS.index(months[0]))
+        self.year_entry.delete(0, 'end')
+        self.year_entry.insert(0, search_params.get('year', ''))
+        self.find_text.set(search_params.get('query', ''))
+    
+    def _save_session(self):
+        #Saves the results, in display order, with the state of the
+        #window so the next session starts where this one ends.
+        
+        state = {'sort': self.sort_state,
+                 'widths': {col: self.results_box.column(col, 'width')
+                            for col in self.headers},
+                 'filter': self.filter_text.get(),
+                 'revalidate': self.revalidate.get()}
+        session.save(self.records(), self.search_params, state)
+    
+    def destroy(self):
+        '''Saves the session, cancels any rating job and closes the
+        window along with the execution backend.
+        
+        '''
+        if session.enabled():
+            self._save_session()
+        job = self.job
+        if job is not None:
+            job.cancel()
+        self._cancel_details()
+        self.refresher.stop()
+        self.indexer.stop()
+        self.updates.stop()
+        self.backend.close()
+        themed.ThemedTk.destroy(self)
+        
+if __name__ == '__main__':
+    gui = CinEval()
+    
+    gui.mainloop()
+
@@ -0,0 +1,248 @@
+''' Copyright © 2019 Shakeel Niazi
+
+This module crawls the release schedules of a range of years, and the
+ratings of every movie listed in them, into the disk cache. Progress
+is checkpointed after every batch of ratings, so a crawl that was
+interrupted resumes where it stopped when it is run again.
+
+Usage:
+    python crawler.py 2000 2019 [--types theatrical home]
+                      [--backend thread] [--workers N] [--cache PATH]
+                      [--retry-missing] [--pipeline [--parsers N]]
+
+@author: Shakeel Niazi
+'''
+import argparse
+import concurrent.futures
+import datetime
+import os
+import sys
+import time
+
+import backends
+import cache
+import refresh
+from jobs import RatingJob
+from pipeline import Pipeline
+from ratings import (RATINGS, UNAVAILABLE, fetch_ratings, parse_page,
+                     rating_key, search_ratings)
+from schedule import RELEASE_TYPES, get_schedule, merge_listings
+
+CRAWLED = 'crawled' #Cache namespace: '<types>|<year>' -> time finished
+
+BATCH_SIZE = 50 #Ratings checkpointed at a time
+
+_TYPE_NAMES = {'theatrical': 0, 'home': 1}
+_POLL = 0.2 #Seconds between checks for completed ratings
+
+
+class Crawler:
+    '''Crawler fetches schedules and ratings into a DiskCache.
+
+    Schedules of past years are fetched once, as get_schedule keeps
+    them in the disk cache, while the schedules of the current and
+    later years are fetched again on every run since they are still
+    changing. Ratings are looked up once per movie;
+    movies that weren't found are looked up again only if
+    retry_missing is set. Lookups made while Rotten Tomatoes couldn't
+    be reached are not stored, so the next run retries them.
+
+    With parsers set, ratings are looked up in a Pipeline instead: as
+    many threads as the backend has workers fetch pages while that
+    many processes parse them.
+    '''
+
+    def __init__(self, backend, store=None, batch_size=BATCH_SIZE,
+                 retry_missing=False, report=print, parsers=None):
+        '''Constructs a crawler looking ratings up on backend and
+        storing them into store, the shared DiskCache by default.
+        Progress messages are passed to report.
+
+        '''
+        self.store = store or cache.shared()
+        self.backend = backend
+        self.batch_size = batch_size
+        self.retry_missing = retry_missing
+        self.report = report
+        self.fetched = 0
+        self.failures = 0
+        self.unavailable = 0
+        self.parsers = parsers
+        self._pool = None #Parser processes shared by every year
+
+        self._rated = {key for key, value, _ in self.store.items(RATINGS)
+                       if value[2] is not None or not retry_missing}
+
+    def crawl(self, years, release_types=(0, 1)):
+        '''Crawls the given release types (indexes of RELEASE_TYPES)
+        for each of years.
+
+        '''
+        types_key = ','.join(str(release_type)
+                             for release_type in release_types)
+        for year in years:
+            if (self.store.get(CRAWLED, '%s|%s' % (types_key, year))
+                    is not None and not self.retry_missing):
+                self.report('%s: already crawled' % year)
+                continue
+
+            listings = [self.schedule(release_type, year)
+                        for release_type in release_types]
+            releases = merge_listings(listings)
+            refresh.track(releases)
+            unavailable = self.unavailable
+            self.rate(year, releases)
+            if (all(listing is not None for listing in listings)
+                    and self.unavailable == unavailable
+                    and int(year) < datetime.date.today().year):
+                self.store.set(CRAWLED, '%s|%s' % (types_key, year),
+                               time.time())
+
+    def schedule(self, release_type, year):
+        '''Returns the Release records of a schedule, or None if the
+        schedule could not be fetched.
+
+        '''
+        releases = get_schedule(release_type, str(year))
+        if releases is None:
+            self.report('%s %s: schedule could not be fetched'
+                        % (year, RELEASE_TYPES[release_type]))
+        return releases
+
+    def rate(self, year, releases):
+        '''Looks up the ratings of every movie of releases that hasn't
+        been rated yet, checkpointing every batch_size ratings.
+
+        '''
+        items = {}
+        for release in releases:
+            key = rating_key(release.title, release.year)
+            if key not in self._rated and key not in items:
+                items[key] = (release.title, release.year, key)
+        if not items:
+            self.report('%s: nothing left to rate' % year)
+            return
+
+        if self.parsers:
+            if self._pool is None:
+                self._pool = concurrent.futures.ProcessPoolExecutor(
+                    self.parsers)
+            job = Pipeline(self._fetch, parse_page, list(items.values()),
+                           fetchers=self.backend.workers,
+                           parsers=self.parsers, pool=self._pool,
+                           emit=lambda item, result: result + (item[2],),
+                           is_failure=lambda result: result[2] is None,
+                           label='crawl.pipeline').start()
+        else:
+            job = RatingJob(self._lookup, list(items.values()),
+                            workers=self.backend.workers,
+                            is_failure=lambda result: result[2] is None,
+                            label='crawl.' + self.backend.NAME).start()
+        batch = []
+        try:
+            while True:
+                finished = job.finished
+                batch.extend(job.results())
+                if len(batch) >= self.batch_size or (finished and batch):
+                    self._checkpoint(year, job, batch)
+                    batch = []
+                if finished:
+                    return
+                time.sleep(_POLL)
+        except KeyboardInterrupt:
+            job.cancel()
+            self._checkpoint(year, job, batch + job.results())
+            raise
+
+    def _lookup(self, item, cancel):
+        #Looks up the ratings of a movie given its (title, year, key).
+
+        title, year, key = item
+        return (self.backend.call(search_ratings, title, year,
+                                  cancel=cancel)
+                + (key,))
+
+    def close(self):
+        '''Stops the parser processes of the pipeline, if any.'''
+
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+
+    def _fetch(self, item, cancel):
+        #Fetches the page of a movie given its (title, year, key) for
+        #the pipeline.
+
+        title, year, _ = item
+        return fetch_ratings(title, year, cancel)
+
+    def _checkpoint(self, year, job, batch):
+        #Stores a batch of ratings in one transaction.
+
+        if not batch:
+            return
+        found = [result for result in batch if result[:3] != UNAVAILABLE]
+        self.store.set_many(RATINGS, [(result[3], list(result[:3]))
+                                      for result in found])
+        for result in found:
+            if result[2] is not None or not self.retry_missing:
+                self._rated.add(result[3])
+        self.fetched += len(found)
+        self.failures += sum(result[2] is None for result in found)
+        self.unavailable += len(batch) - len(found)
+
+        progress = job.progress()
+        message = ('%s: %d/%d rated, %d not found'
+                   % (year, progress['done'], progress['total'],
+                      progress['failures']))
+        if self.unavailable:
+            message += ' (%d unavailable, left for the next run)' % (
+                self.unavailable)
+        self.report(message)
+
+
+def main(argv=None):
+    '''Runs a crawl from the command line.'''
+
+    parser = argparse.ArgumentParser(description='Crawl schedules and '
+                                                 'ratings into the cache.')
+    parser.add_argument('first_year', type=int)
+    parser.add_argument('last_year', type=int)
+    parser.add_argument('--types', nargs='+', choices=sorted(_TYPE_NAMES),
+                        default=['theatrical', 'home'])
+    parser.add_argument('--backend', choices=sorted(backends.BACKENDS))
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('--cache', help='cache file to crawl into')
+    parser.add_argument('--retry-missing', action='store_true',
+                        help='look up movies that weren\'t found again')
+    parser.add_argument('--pipeline', action='store_true',
+                        help='fetch pages on threads and parse them on '
+                             'separate processes')
+    parser.add_argument('--parsers', type=int,
+                        help='parser processes of the pipeline (default: '
+                             'one per core)')
+    args = parser.parse_args(argv)
+
+    store = cache.use(args.cache) if args.cache else cache.shared()
+    backend = backends.create(args.backend, args.workers)
+    parsers = (args.parsers or os.cpu_count() or 1) if args.pipeline else None
+    crawler = Crawler(backend, store, retry_missing=args.retry_missing,
+                      parsers=parsers)
+    start = time.monotonic()
+    try:
+        crawler.crawl(range(args.first_year, args.last_year + 1),
+                      sorted(_TYPE_NAMES[name] for name in args.types))
+    except KeyboardInterrupt:
+        print('Interrupted, run again to resume.')
+        return 1
+    finally:
+        crawler.close()
+        backend.close()
+        store.close()
+        print('%d ratings fetched in %.0fs, %d not found'
+              % (crawler.fetched, time.monotonic() - start,
+                 crawler.failures))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
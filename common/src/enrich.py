@@ -0,0 +1,90 @@
+''' Copyright © 2019 Shakeel Niazi
+
+This module reads the details of a movie, such as its production
+budget, running time, MPAA rating and worldwide box office, from its
+summary page on the-numbers.com. Details are kept in the disk cache,
+so each summary page is fetched about once a week at most.
+
+@author: Shakeel Niazi
+'''
+import time
+
+import requests
+from bs4 import BeautifulSoup
+
+import archive
+import cache
+import network
+from instrument import metrics
+from schedule import HOME_URL
+
+SUMMARIES = 'summaries' #Cache namespace: page path -> details
+SUMMARY_TTL = 7*24*60*60 #Seconds details are served from the cache
+
+FIELDS = ['budget', 'runtime', 'mpaa', 'worldwide']
+
+#Labels of the summary page cells holding each field.
+_LABELS = {'Production Budget:': 'budget', 'Running Time:': 'runtime',
+           'MPAA Rating:': 'mpaa', 'Worldwide Box Office': 'worldwide'}
+
+
+def fetch_details(href, cancel=None):
+    '''Returns the details of the movie whose summary page is at href,
+    a path on the-numbers.com, as a dict keyed by FIELDS.
+
+    Returns None if the page could not be fetched. Gives up early,
+    raising network.Cancelled, once the threading.Event cancel is set.
+
+    '''
+    path = href.split('#')[0]
+    entry = cache.shared().get_entry(SUMMARIES, path)
+    if entry is not None and time.time() - entry[1] < SUMMARY_TTL:
+        metrics.count('enrich.cache.hits')
+        return entry[0]
+
+    try:
+        response = network.get(HOME_URL + path, cancel=cancel)
+    except network.Cancelled:
+        raise
+    except requests.RequestException:
+        return None
+    if response.status_code != 200:
+        return None
+
+    response.encoding = 'UTF-8'
+    archive.save(HOME_URL + path, response.text, SUMMARIES, path)
+    details = parse_details(response.text)
+    cache.shared().set(SUMMARIES, path, details)
+    return details
+
+def parse_details(text):
+    '''Parses the html of a summary page into a dict keyed by FIELDS.
+    Fields missing from the page are empty strings.
+
+    '''
+    with metrics.timer('parse.summary.time'):
+        html = BeautifulSoup(text, 'html.parser')
+
+        details = dict.fromkeys(FIELDS, '')
+        for tag in html.find_all('b'):
+            label = ' '.join(tag.get_text().replace('\xa0', ' ').split())
+            field = _LABELS.get(label)
+            if field is None or details[field]:
+                continue
+
+            cell = tag.find_parent('td')
+            value = cell.find_next_sibling('td') if cell is not None else None
+            if value is not None:
+                words = value.get_text(' ').replace('\xa0', ' ').split()
+                details[field] = _clean(field, words)
+        return details
+
+def _clean(field, words):
+    #Returns the value of a field from the words of its cell, dropping
+    #remarks such as the reasons for an MPAA rating.
+
+    if not words:
+        return ''
+    if field == 'runtime':
+        return ' '.join(words[:2])
+    return words[0]
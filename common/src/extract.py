@@ -0,0 +1,151 @@
+''' Copyright © 2019 Shakeel Niazi
+
+This module provides a fast path for reading ratings from Rotten
+Tomatoes movie pages. Instead of downloading the whole page and
+building a full DOM, the response is streamed and scanned for the
+ratings markup and reading stops as soon as both ratings are found.
+
+@author: Shakeel Niazi
+'''
+import codecs
+import re
+
+from instrument import metrics
+
+CHUNK_SIZE = 16*1024
+
+_BLOCK_SIZE = 2000 #Characters of a ratings block searched for its value
+_OVERLAP = 2*_BLOCK_SIZE #Characters of the text already read searched
+                         #again with a new chunk, so ratings markup split
+                         #between chunks is still found
+
+#Score attributes of the <score-board> element.
+_BOARD_CRITICS = re.compile(r'tomatometerscore="(\d*)"', re.I)
+_BOARD_AUDIENCE = re.compile(r'audiencescore="(\d*)"', re.I)
+
+#Blocks of the mop-ratings-wrap markup read by ratings.parse_ratings.
+_MOP_CRITICS = re.compile(r'class="mop-ratings-wrap__half"')
+_MOP_AUDIENCE = re.compile(r'class="mop-ratings-wrap__half audience-score"')
+_MOP_PERCENTAGE = re.compile(r'class="mop-ratings-wrap__percentage"[^>]*>'
+                             r'\s*(\d+%)\s*<')
+
+#Tomatometer embedded in the JSON-LD structured data.
+_JSON_LD_CRITICS = re.compile(r'"aggregateRating"\s*:\s*\{[^{}]*?'
+                              r'"ratingValue"\s*:\s*"?(\d+)')
+
+
+def scan_ratings(response, chunk_size=CHUNK_SIZE, read_all=False):
+    '''Streams the body of response until both ratings are found, or
+    to its end if read_all is set.
+
+    Returns ((critics_rating, aud_rating), text) when both were found,
+    formatted like ratings.parse_ratings, where text is the part of
+    the page that was read. Returns (None, text) with the whole page
+    in text otherwise, so the caller can fall back to a full parse
+    without downloading the page again. The response is closed once
+    reading stops.
+
+    '''
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    parts = []
+    found = {}
+    tail = '' #End of the text read before the current chunk
+    read = 0
+    ratings = None
+
+    try:
+        for chunk in response.iter_content(chunk_size=chunk_size):
+            read += len(chunk)
+            parts.append(decoder.decode(chunk))
+            if ratings is None:
+                #Only the new chunk and the end of the text before it
+                #are searched, keeping the ratings found so far.
+                window = tail + parts[-1]
+                tail = window[-_OVERLAP:]
+                for name, value in _find_parts(window).items():
+                    if value is not None:
+                        found.setdefault(name, value)
+                ratings = _combine(found)
+                if ratings is not None and not read_all:
+                    break
+        else:
+            parts.append(decoder.decode(b'', final=True))
+    finally:
+        response.close()
+
+    metrics.observe('extract.bytes', read)
+    metrics.count('extract.hits' if ratings is not None
+                  else 'extract.misses')
+    return ratings, ''.join(parts)
+
+def find_ratings(text):
+    '''Returns (critics_rating, aud_rating) if both ratings can be read
+    from the page text read so far, or None otherwise.
+
+    '''
+    return _combine(_find_parts(text))
+
+def _find_parts(text):
+    #Returns the ratings each kind of markup in text holds, None for
+    #those it doesn't.
+
+    mop_critics, mop_aud = _find_mop(text)
+    match = _JSON_LD_CRITICS.search(text)
+    return {'board_critics': _find_board(_BOARD_CRITICS, text),
+            'board_aud': _find_board(_BOARD_AUDIENCE, text),
+            'mop_critics': mop_critics, 'mop_aud': mop_aud,
+            'json_ld_critics': match and match.group(1) + '%'}
+
+def _combine(found):
+    #Returns (critics_rating, aud_rating) from the ratings found, in
+    #order of preference: the score-board, the mop-ratings-wrap blocks
+    #and, for the tomatometer, the JSON-LD data. Returns None unless
+    #both were found.
+
+    critics = found.get('board_critics')
+    aud = found.get('board_aud')
+
+    if critics is None or aud is None:
+        critics = critics if critics is not None else found.get(
+            'mop_critics')
+        aud = aud if aud is not None else found.get('mop_aud')
+
+    if critics is None:
+        critics = found.get('json_ld_critics')
+
+    if critics is None or aud is None:
+        return None
+    return critics, aud
+
+def _find_board(pattern, text):
+    #Returns the rating held in a score-board attribute, if any.
+
+    match = pattern.search(text)
+    if match is None:
+        return None
+    return match.group(1) + '%' if match.group(1) else 'Not rated'
+
+def _find_mop(text):
+    #Returns the critics and audience percentages shown in the
+    #mop-ratings-wrap blocks, or None for those not read yet. A block
+    #without a percentage is left to the full parse.
+
+    critics_block = _MOP_CRITICS.search(text)
+    aud_block = _MOP_AUDIENCE.search(text)
+    critics = aud = None
+
+    if critics_block is not None:
+        end = critics_block.end() + _BLOCK_SIZE
+        if aud_block is not None:
+            end = min(end, aud_block.start())
+        match = _MOP_PERCENTAGE.search(text, critics_block.end(), end)
+        if match is not None:
+            critics = match.group(1)
+
+    if aud_block is not None:
+        match = _MOP_PERCENTAGE.search(text, aud_block.end(),
+                                       aud_block.end() + _BLOCK_SIZE)
+        if match is not None:
+            aud = match.group(1)
+
+    return critics, aud
@@ -0,0 +1,207 @@
+''' Copyright © 2019 Shakeel Niazi
+
+This module provides the in-memory indexes CinEval uses to filter the
+loaded results as the user types, without searching the site again.
+
+@author: Shakeel Niazi
+'''
+import re
+from bisect import bisect_left, bisect_right
+
+from unidecode import unidecode
+
+
+class RecordIndex:
+    '''RecordIndex indexes rows by the words of their text and by
+    named numeric fields.
+
+    Every prefix of every word maps to the rows containing it, so a
+    partially typed word is a single dictionary lookup. Numeric fields
+    are kept as sorted arrays and range queries are answered by binary
+    search.
+
+    Class Attributes:
+        MAX_PREFIX: longest prefix indexed; longer words in a query
+            are matched on this prefix and then checked in full
+    '''
+    MAX_PREFIX = 12
+
+    def __init__(self):
+        '''Constructs an empty index.'''
+
+        self.clear()
+
+    def clear(self):
+        '''Removes every row from the index.'''
+
+        self._prefixes = {} #Prefix -> set of row ids
+        self._words = {} #Row id -> set of words
+        self._numbers = {} #Field -> {row id: value}
+        self._sorted = {} #Field -> (sorted values, row ids)
+
+    def add(self, row_id, text, numbers=None):
+        '''Indexes a row by the words of text and the dict of numeric
+        field values numbers.
+
+        '''
+        words = set(tokenize(text))
+        self._words[row_id] = words
+        for word in words:
+            for end in range(1, min(len(word), RecordIndex.MAX_PREFIX) + 1):
+                prefix = word[:end]
+                if prefix not in self._prefixes:
+                    self._prefixes[prefix] = set()
+                self._prefixes[prefix].add(row_id)
+
+        for field, value in (numbers or {}).items():
+            self.set_number(row_id, field, value)
+
+    def set_number(self, row_id, field, value):
+        '''Sets, or removes if value is None, a numeric field of a row.'''
+
+        values = self._numbers.setdefault(field, {})
+        old = values.pop(row_id, None)
+        if value is not None:
+            values[row_id] = value
+
+        #Keep an already sorted field sorted rather than sorting it
+        #again on the next search.
+        if field in self._sorted:
+            sorted_values, row_ids = self._sorted[field]
+            if old is not None:
+                i = bisect_left(sorted_values, old)
+                while row_ids[i] != row_id:
+                    i += 1
+                del sorted_values[i]
+                del row_ids[i]
+            if value is not None:
+                i = bisect_right(sorted_values, value)
+                sorted_values.insert(i, value)
+                row_ids.insert(i, row_id)
+
+    def prepare(self):
+        '''Sorts every numeric field so the next search doesn't have
+        to.
+
+        '''
+        for field in self._numbers:
+            self._sort(field)
+
+    def search(self, words=(), ranges=None):
+        '''Returns the set of row ids that contain a word starting with
+        each of words and whose fields lie within ranges, a dict of
+        field -> (low, high) where either bound may be None.
+
+        '''
+        matches = None
+
+        #Narrow by the rarest condition first to keep intersections
+        #small.
+        candidates = [self._match_word(word) for word in words]
+        candidates += [self._match_range(field, low, high)
+                       for field, (low, high) in (ranges or {}).items()]
+        for rows in sorted(candidates, key=len):
+            matches = set(rows) if matches is None else matches & rows
+            if not matches:
+                break
+
+        return set(self._words) if matches is None else matches
+
+    def _match_word(self, word):
+        #Returns the rows with a word starting with word.
+
+        rows = self._prefixes.get(word[:RecordIndex.MAX_PREFIX], set())
+        if len(word) <= RecordIndex.MAX_PREFIX:
+            return rows
+        return {row_id for row_id in rows
+                if any(other.startswith(word)
+                       for other in self._words[row_id])}
+
+    def _match_range(self, field, low, high):
+        #Returns the rows whose field lies between low and high.
+
+        values, row_ids = self._sort(field)
+        start = 0 if low is None else bisect_left(values, low)
+        end = len(values) if high is None else bisect_right(values, high)
+        return set(row_ids[start:end])
+
+    def _sort(self, field):
+        #Returns the sorted values of a field and their row ids.
+
+        if field not in self._sorted:
+            pairs = sorted(((value, row_id) for row_id, value
+                            in self._numbers.get(field, {}).items()),
+                           key=lambda pair: pair[0])
+            self._sorted[field] = ([pair[0] for pair in pairs],
+                                   [pair[1] for pair in pairs])
+        return self._sorted[field]
+
+
+FIELDS = {'sales': 'sales', 'box': 'sales', 'gross': 'sales',
+          'tomato': 'tomatometer', 'tomatometer': 'tomatometer',
+          'critics': 'tomatometer', 'audience': 'audience',
+          'aud': 'audience', 'budget': 'budget', 'runtime': 'runtime',
+          'worldwide': 'worldwide', 'ww': 'worldwide'}
+
+_NUMBER = r'([\d.,$]+(?:e\d+)?[kmb]?%?)' #Such as 80%, $1.5m or 1e6
+_CONDITION = re.compile(r'^([a-z]+)\s*(<=|>=|<|>|=|:)\s*'
+                        + _NUMBER + '(?:-' + _NUMBER + ')?$')
+_MULTIPLIERS = {'k': 10**3, 'm': 10**6, 'b': 10**9}
+
+
+def tokenize(text):
+    '''Returns the lower case, accent free words of text.'''
+
+    text = unidecode(text).lower()
+    return ''.join(char if char.isalnum() else ' ' for char in text).split()
+
+def parse_query(text):
+    '''Parses a filter query into words and numeric ranges.
+
+    Conditions such as 'sales>1m', 'sales>1e6', 'tomato>=80' or
+    'audience:60-90' become ranges for the fields named in FIELDS, and
+    everything else is split into words. Returns (words, ranges) as
+    taken by RecordIndex.search.
+
+    '''
+    words = []
+    ranges = {}
+
+    #Join conditions written with spaces around the operator.
+    text = re.sub(r'\s*(<=|>=|<|>|=)\s*', r'\1', text.lower())
+
+    for part in text.split():
+        match = _CONDITION.match(part)
+        if match is None or match.group(1) not in FIELDS:
+            words.extend(tokenize(part))
+            continue
+
+        name, operator, first, second = match.groups()
+        field = FIELDS[name]
+        value = _parse_number(first)
+        low, high = ranges.get(field, (None, None))
+        if second is not None:
+            low, high = value, _parse_number(second)
+        elif operator == ':' or operator == '=':
+            low, high = value, value
+        elif operator.startswith('>'):
+            low = value + (1 if operator == '>' else 0)
+        else:
+            high = value - (1 if operator == '<' else 0)
+        ranges[field] = (low, high)
+
+    return words, ranges
+
+def _parse_number(text):
+    #Returns the integer value of a number such as '$1.5m', '1e6' or
+    #'80%'.
+
+    text = text.replace('$', '').replace(',', '').replace('%', '')
+    multiplier = 1
+    if text and text[-1] in _MULTIPLIERS:
+        multiplier = _MULTIPLIERS[text[-1]]
+        text = text[:-1]
+    try:
+        return int(float(text)*multiplier)
+    except ValueError:
+        return 0
@@ -0,0 +1,341 @@
+''' Copyright © 2019 Shakeel Niazi
+
+This module provides performance instrumentation for CinEval. Timings,
+sizes and counts from the hot paths are collected into histograms
+which can be viewed in the debug panel or dumped as JSON. A single
+search or rating batch can also be profiled on request.
+
+@author: Shakeel Niazi
+'''
+import io
+import json
+import math
+import os
+import pstats
+import sys
+import threading
+import time
+import cProfile
+from contextlib import contextmanager
+
+try:
+    from pyinstrument import Profiler
+except ImportError:
+    Profiler = None
+
+#From Python 3.12 cProfile follows every thread, and only one profiler
+#can be active at a time.
+_PROCESS_WIDE = sys.version_info >= (3, 12)
+
+
+class Histogram:
+    '''Histogram records samples into base 2 exponential buckets.
+
+    Exact count, sum, min and max are kept alongside the buckets, and
+    percentiles are estimated from the bucket bounds.
+    '''
+
+    def __init__(self):
+        '''Constructs an empty histogram.'''
+
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self.buckets = {} #Bucket exponent -> number of samples
+
+    def add(self, value):
+        '''Adds a sample to the histogram.'''
+
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+        exponent = math.ceil(math.log2(value)) if value > 0 else None
+        self.buckets[exponent] = self.buckets.get(exponent, 0) + 1
+
+    def percentile(self, fraction):
+        '''Returns an estimate of the given percentile of the samples.'''
+
+        if self.count == 0:
+            return None
+
+        rank = fraction*self.count
+        seen = 0
+        for exponent in sorted(self.buckets, key=_bucket_order):
+            seen += self.buckets[exponent]
+            if seen >= rank:
+                bound = 0.0 if exponent is None else 2.0**exponent
+                return min(max(bound, self.min), self.max)
+        return self.max
+
+    def summary(self):
+        '''Returns a dict summarising the histogram.'''
+
+        return {'count': self.count,
+                'sum': self.total,
+                'min': self.min,
+                'max': self.max,
+                'mean': self.total/self.count if self.count else None,
+                'p50': self.percentile(0.5),
+                'p90': self.percentile(0.9),
+                'p99': self.percentile(0.99),
+                'buckets': {('0' if exponent is None
+                             else repr(2.0**exponent)): count
+                            for exponent, count
+                            in sorted(self.buckets.items(),
+                                      key=lambda item:
+                                        _bucket_order(item[0]))}}
+
+
+class Metrics:
+    '''Metrics is a thread safe registry of named histograms and
+    counters.
+
+    Names are dotted paths such as 'network.www.rottentomatoes.com.time'.
+    Histograms of durations are in seconds and sizes are in bytes.
+    '''
+
+    def __init__(self):
+        '''Constructs an empty registry.'''
+
+        self._histograms = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name, value):
+        '''Adds a sample to the named histogram.'''
+
+        with self._lock:
+            if name not in self._histograms:
+                self._histograms[name] = Histogram()
+            self._histograms[name].add(value)
+
+    def count(self, name, amount=1):
+        '''Increments the named counter.'''
+
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    @contextmanager
+    def timer(self, name):
+        '''Records the time spent in the with block in the named
+        histogram.
+
+        '''
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def reset(self):
+        '''Discards every histogram and counter.'''
+
+        with self._lock:
+            self._histograms = {}
+            self._counters = {}
+
+    def snapshot(self):
+        '''Returns a dict of every histogram summary and counter.'''
+
+        with self._lock:
+            return {'histograms': {name: histogram.summary()
+                                   for name, histogram
+                                   in sorted(self._histograms.items())},
+                    'counters': dict(sorted(self._counters.items()))}
+
+    def dump(self, path, extra=None):
+        '''Writes the snapshot, plus any extra sections, to path as
+        JSON.
+
+        '''
+        data = self.snapshot()
+        data['time'] = time.time()
+        if extra:
+            data.update(extra)
+
+        with open(path, 'w') as file:
+            json.dump(data, file, indent=2)
+
+
+class ThreadCapture:
+    '''ThreadCapture profiles work spread over several threads.
+
+    Before Python 3.12 each call made through it is profiled with its
+    own cProfile profile. From 3.12, where a profile follows every
+    thread and only one can be active, a single profile runs while any
+    call is in progress. The profiles are merged into one report when
+    the capture is closed.
+
+    Profiling never changes the result of a call: a call that can't be
+    profiled, because another profiler is active, just runs
+    unprofiled.
+    '''
+
+    def __init__(self, label, directory='.'):
+        '''Constructs a capture whose report is written into directory.'''
+
+        self.label = label
+        self.directory = directory
+        self._profiles = []
+        self._lock = threading.Lock()
+        self._active = 0 #Calls in progress under the process wide profile
+
+    def call(self, function, *args):
+        '''Calls function with args while profiling it.'''
+
+        if _PROCESS_WIDE:
+            return self._call_shared(function, args)
+
+        profile = cProfile.Profile()
+        if not _enable(profile):
+            return function(*args)
+        with self._lock:
+            self._profiles.append(profile)
+        try:
+            return function(*args)
+        finally:
+            profile.disable()
+
+    def _call_shared(self, function, args):
+        #Calls function under the profile shared by every call in
+        #progress, starting it for the first and stopping it after the
+        #last.
+
+        with self._lock:
+            if self._active == 0:
+                profile = cProfile.Profile()
+                if _enable(profile):
+                    self._profiles.append(profile)
+                    self._active = 1
+            else:
+                self._active += 1
+            profiled = self._active > 0
+        try:
+            return function(*args)
+        finally:
+            if profiled:
+                with self._lock:
+                    self._active -= 1
+                    if self._active == 0:
+                        self._profiles[-1].disable()
+
+    def close(self):
+        '''Writes the merged report of every profiled call.'''
+
+        with self._lock:
+            profiles = [profile for profile in self._profiles
+                        if profile.getstats()]
+        if profiles:
+            _write_stats(_report_base(self.label, self.directory), profiles)
+
+
+metrics = Metrics()
+
+_armed = threading.Event()
+
+
+def arm_profiler():
+    '''Requests a profile of the next search or rating batch.'''
+
+    _armed.set()
+
+def profiler_armed():
+    '''Checks whether the next search or rating batch will be profiled.'''
+
+    return _armed.is_set()
+
+@contextmanager
+def capture(label, directory='.'):
+    '''Profiles the with block if a profile has been requested.
+
+    pyinstrument is used when installed and cProfile otherwise. The
+    report is written into directory and the request is cleared, so
+    only one search or batch is captured per request.
+
+    '''
+    if not _take_request():
+        yield
+        return
+
+    base = _report_base(label, directory)
+
+    if Profiler is not None:
+        profiler = Profiler()
+        profiler.start()
+        try:
+            yield
+        finally:
+            profiler.stop()
+            with open(base + '.html', 'w') as file:
+                file.write(profiler.output_html())
+    else:
+        profiler = cProfile.Profile()
+        if not _enable(profiler):
+            yield
+            return
+        try:
+            yield
+        finally:
+            profiler.disable()
+            _write_stats(base, [profiler])
+
+def thread_capture(label, directory='.'):
+    '''Returns a ThreadCapture if a profile has been requested, or
+    None otherwise.
+
+    Used instead of capture for work that runs on worker threads,
+    which a single profiler cannot follow.
+
+    '''
+    if not _take_request():
+        return None
+    return ThreadCapture(label, directory)
+
+def _enable(profile):
+    #Starts a cProfile profile. Returns False if it can't be started
+    #because another profiler is active.
+
+    try:
+        profile.enable()
+    except ValueError:
+        metrics.count('profile.skipped')
+        return False
+    return True
+
+def _take_request():
+    #Checks for and clears a profile request.
+
+    if os.environ.get('CINEVAL_PROFILE'):
+        return True
+    if _armed.is_set():
+        _armed.clear()
+        return True
+    return False
+
+def _report_base(label, directory):
+    #Returns the path, without extension, of a new profile report.
+
+    stamp = time.strftime('%Y%m%d-%H%M%S')
+    return os.path.join(directory, 'cineval-%s-%s' % (label, stamp))
+
+def _write_stats(base, profiles):
+    #Writes the merged cProfile profiles as binary and text reports.
+
+    stats = pstats.Stats(profiles[0])
+    for profile in profiles[1:]:
+        stats.add(profile)
+    stats.dump_stats(base + '.prof')
+
+    text = io.StringIO()
+    stats.stream = text
+    stats.sort_stats('cumulative').print_stats(40)
+    with open(base + '.txt', 'w') as file:
+        file.write(text.getvalue())
+
+def _bucket_order(exponent):
+    #Sorts the bucket for zero values before every other bucket.
+
+    return -math.inf if exponent is None else exponent
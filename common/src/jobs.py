@@ -0,0 +1,308 @@
+''' Copyright © 2019 Shakeel Niazi
+
+This module provides cancellable background jobs for CinEval, so
+rating lookups run off the Tk thread, report their progress and can
+be given up at any time. Concurrent lookups of the same movie are
+coalesced into a single fetch.
+
+@author: Shakeel Niazi
+'''
+import heapq
+import itertools
+import queue
+import threading
+import time
+
+from instrument import metrics, thread_capture
+from network import Cancelled
+
+_POLL = 0.1 #Seconds between checks for cancellation
+
+
+class SingleFlight:
+    '''SingleFlight lets concurrent calls for the same key share the
+    work of a single call.
+
+    The first caller for a key runs the function and every caller
+    that arrives while it is running waits for and receives the same
+    result. If the running call is cancelled, a waiting caller that
+    is still wanted takes over and runs the function itself.
+    '''
+
+    def __init__(self):
+        '''Constructs a SingleFlight with no calls in flight.'''
+
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, function, cancel=None):
+        '''Returns function() or the result of the call already in
+        flight for key.
+
+        Raises Cancelled if the threading.Event cancel is set while
+        waiting for another caller's result.
+
+        '''
+        while True:
+            with self._lock:
+                call = self._calls.get(key)
+                leader = call is None
+                if leader:
+                    call = _Call()
+                    self._calls[key] = call
+
+            if leader:
+                try:
+                    call.result = function()
+                except BaseException as error:
+                    call.error = error
+                    raise
+                finally:
+                    with self._lock:
+                        del self._calls[key]
+                    call.done.set()
+                return call.result
+
+            metrics.count('flights.shared')
+            while not call.done.wait(_POLL):
+                if cancel is not None and cancel.is_set():
+                    raise Cancelled()
+
+            if call.error is None:
+                return call.result
+            if not isinstance(call.error, Cancelled):
+                raise call.error
+
+    def in_flight(self):
+        '''Returns the number of keys currently being fetched.'''
+
+        with self._lock:
+            return len(self._calls)
+
+
+class _Call:
+    #The state of a call in flight for a SingleFlight.
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class RatingJob:
+    '''RatingJob runs a lookup for each item of a batch on a number of
+    worker threads.
+
+    Items are looked up in order of their rank, which can change while
+    the job runs. Completed results are collected in a queue which the
+    GUI drains with results(). Cancelling the job stops queued lookups from
+    starting and is passed on to lookups in flight, which receive the
+    job's cancel event as their second argument.
+    '''
+
+    def __init__(self, lookup, items, workers=1, is_failure=None,
+                 label='ratings', priority=None, on_error=None):
+        '''Constructs a job calling lookup(item, cancel_event) for each
+        item using the given number of worker threads.
+
+        is_failure, if given, is called with each result to decide
+        whether it counts as a failed lookup. on_error, if given, is
+        called with each item whose lookup raised to get the result
+        delivered in its place; such items have no result otherwise.
+        priority, if given, is called with each item to get its rank,
+        and items of lower rank are looked up first. Ranks are taken in
+        the thread adding the items or calling reprioritize, never by
+        the workers.
+
+        '''
+        self.lookup = lookup
+        self.total = len(items)
+        self.done = 0
+        self.failures = 0
+        self.workers = max(1, workers)
+        self.label = label
+
+        self.cancel_event = threading.Event()
+        self._is_failure = is_failure
+        self._on_error = on_error
+        self._priority = priority
+        self._pending = [] #Heap of (rank, order added, item)
+        self._order = itertools.count()
+        self._results = queue.Queue()
+        self._lock = threading.Lock()
+        self._running = 0
+        self._start_time = None
+        self._end_time = None
+        self._capture = None
+
+        for item in items:
+            self._push(item)
+
+    def start(self):
+        '''Starts the worker threads and returns the job.'''
+
+        self._start_time = time.monotonic()
+        self._capture = thread_capture(self.label)
+        if self.total == 0:
+            self._finish()
+        else:
+            with self._lock:
+                self._spawn(min(self.workers, self.total))
+        return self
+
+    def extend(self, items):
+        '''Adds items to the job while it is running.
+
+        Returns False, without adding them, if the job has already
+        finished or been cancelled.
+
+        '''
+        with self._lock:
+            if self._running == 0 or self.cancelled:
+                return False
+
+            for item in items:
+                self._push(item)
+            self.total += len(items)
+            self._spawn(min(self.workers - self._running, len(items)))
+            return True
+
+    def reprioritize(self, priority=None):
+        '''Ranks the items still waiting again, using priority if given
+        or the job's priority otherwise. Items of equal rank keep the
+        order they were added in.
+
+        '''
+        with self._lock:
+            if priority is not None:
+                self._priority = priority
+            self._pending = [(self._rank(item), order, item)
+                             for _, order, item in self._pending]
+            heapq.heapify(self._pending)
+
+    def cancel(self):
+        '''Cancels queued and in-flight lookups. Results that complete
+        afterwards are discarded.
+
+        '''
+        self.cancel_event.set()
+
+    @property
+    def cancelled(self):
+        '''Whether the job has been cancelled.'''
+
+        return self.cancel_event.is_set()
+
+    @property
+    def finished(self):
+        '''Whether every worker has stopped.'''
+
+        with self._lock:
+            return self._end_time is not None
+
+    def results(self):
+        '''Returns the results completed since the last call.'''
+
+        completed = []
+        while True:
+            try:
+                completed.append(self._results.get_nowait())
+            except queue.Empty:
+                return completed
+
+    def progress(self):
+        '''Returns a dict with the done, total, failures, elapsed and
+        eta (seconds, or None if unknown) of the job.
+
+        '''
+        with self._lock:
+            done = self.done
+            end = (self._end_time if self._end_time is not None
+                   else time.monotonic())
+            elapsed = (end - self._start_time
+                       if self._start_time is not None else 0.0)
+
+            eta = None
+            if done and self._end_time is None:
+                eta = elapsed/done*(self.total - done)
+
+            return {'done': done, 'total': self.total,
+                    'failures': self.failures, 'elapsed': elapsed,
+                    'eta': eta}
+
+    def _work(self):
+        #Runs lookups for pending items until none are left or the
+        #job is cancelled.
+
+        while True:
+            with self._lock:
+                found = (bool(self._pending)
+                         and not self.cancel_event.is_set())
+                if found:
+                    item = heapq.heappop(self._pending)[2]
+                else:
+                    self._running -= 1
+                    last = self._running == 0
+                    break
+
+            try:
+                if self._capture is not None:
+                    result = self._capture.call(self.lookup, item,
+                                                self.cancel_event)
+                else:
+                    result = self.lookup(item, self.cancel_event)
+                failed = (self._is_failure is not None
+                          and self._is_failure(result))
+            except Exception:
+                result = (self._on_error(item) if self._on_error is not None
+                          else None)
+                failed = True
+
+            if self.cancel_event.is_set():
+                continue
+
+            with self._lock:
+                self.done += 1
+                self.failures += failed
+            if result is not None:
+                self._results.put(result)
+
+        if last:
+            self._finish()
+
+    def _push(self, item):
+        #Adds an item to the pending heap. Called with the lock held or
+        #before the job starts.
+
+        heapq.heappush(self._pending,
+                       (self._rank(item), next(self._order), item))
+
+    def _rank(self, item):
+        #Returns the rank of an item.
+
+        return self._priority(item) if self._priority is not None else 0
+
+    def _spawn(self, count):
+        #Starts count more worker threads. Called with the lock held.
+
+        self._running += max(0, count)
+        for _ in range(count):
+            thread = threading.Thread(target=self._work, daemon=True)
+            thread.start()
+
+    def _finish(self):
+        #Records the end of the job.
+
+        with self._lock:
+            self._end_time = time.monotonic()
+            elapsed = self._end_time - self._start_time
+
+        if not self.cancelled:
+            metrics.observe(self.label + '.batch.time', elapsed)
+            if elapsed > 0:
+                metrics.observe(self.label + '.batch.rate',
+                                self.done/elapsed)
+        else:
+            metrics.count(self.label + '.cancelled')
+        if self._capture is not None:
+            self._capture.close()
@@ -0,0 +1,429 @@
+''' Copyright © 2019 Shakeel Niazi
+
+This module provides the network layer used by CinEval. Every request
+goes through a shared session and is governed by an adaptive (AIMD)
+concurrency limiter for its host, so bulk lookups speed up while a
+site responds well and back off as soon as it starts to struggle. A
+circuit breaker per host fails requests fast while the host is down.
+
+@author: Shakeel Niazi
+'''
+import threading
+import time
+from collections import deque
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from instrument import metrics
+
+
+class Cancelled(requests.RequestException):
+    '''Raised when a request is abandoned because its job was
+    cancelled.
+    '''
+
+
+class CircuitOpen(requests.RequestException):
+    '''Raised instead of sending a request to a host whose circuit
+    breaker is open.
+    '''
+
+
+class CircuitBreaker:
+    '''CircuitBreaker stops requests to a single host after repeated
+    failures, so an outage costs one timeout instead of one per
+    request.
+
+    The breaker opens after FAILURE_THRESHOLD consecutive failures
+    (timeouts, connection errors, 429s and 5xxs). While open, requests
+    fail at once. Once RESET_TIMEOUT seconds have passed it lets a
+    single trial request through (half-open): success closes it again,
+    failure reopens it for twice as long, up to MAX_RESET_TIMEOUT.
+
+    Class Attributes:
+        FAILURE_THRESHOLD: consecutive failures that open the breaker
+        RESET_TIMEOUT: seconds the breaker first stays open
+        MAX_RESET_TIMEOUT: longest the breaker stays open
+    '''
+    FAILURE_THRESHOLD = 5
+    RESET_TIMEOUT = 15.0
+    MAX_RESET_TIMEOUT = 300.0
+
+    def __init__(self, host):
+        '''Constructs a closed breaker for the given host.'''
+
+        self.host = host
+        self.state = 'closed' #'closed', 'open' or 'half-open'
+        self.failures = 0 #Consecutive failures
+        self.opened = 0 #Times the breaker has opened
+
+        self._reset_timeout = CircuitBreaker.RESET_TIMEOUT
+        self._open_until = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        '''Checks whether a request to the host may be sent, raising
+        CircuitOpen if not. A request allowed while half-open is the
+        trial request and must be followed by record or abandon.
+
+        '''
+        with self._lock:
+            if self.state == 'closed':
+                return
+            if (self.state == 'open'
+                    and time.monotonic() >= self._open_until):
+                self.state = 'half-open'
+                metrics.count('network.%s.circuit.probes' % self.host)
+                return
+        metrics.count('network.%s.circuit.rejected' % self.host)
+        raise CircuitOpen('Circuit open for ' + self.host)
+
+    def available(self):
+        '''Returns whether a request to the host would be allowed now.'''
+
+        with self._lock:
+            return (self.state == 'closed' or self.state == 'open'
+                    and time.monotonic() >= self._open_until)
+
+    def record(self, success):
+        '''Records whether a request to the host succeeded.'''
+
+        with self._lock:
+            if success:
+                self.state = 'closed'
+                self.failures = 0
+                self._reset_timeout = CircuitBreaker.RESET_TIMEOUT
+                return
+
+            self.failures += 1
+            if self.state == 'half-open':
+                self._reset_timeout = min(CircuitBreaker.MAX_RESET_TIMEOUT,
+                                          self._reset_timeout*2)
+                self._open()
+            elif (self.state == 'closed' and self.failures
+                    >= CircuitBreaker.FAILURE_THRESHOLD):
+                self._open()
+
+    def abandon(self):
+        '''Gives up an allowed request without sending it, so another
+        request can be the trial if this one was.
+
+        '''
+        with self._lock:
+            if self.state == 'half-open':
+                self.state = 'open'
+
+    def snapshot(self):
+        '''Returns a dict describing the current state of the breaker.'''
+
+        with self._lock:
+            return {'circuit': self.state,
+                    'consecutive_failures': self.failures,
+                    'opened': self.opened,
+                    'retry_in': max(0.0, self._open_until - time.monotonic())
+                                if self.state == 'open' else 0.0}
+
+    def _open(self):
+        #Opens the breaker for the current reset timeout. Called with
+        #the lock held.
+
+        self.state = 'open'
+        self.opened += 1
+        self._open_until = time.monotonic() + self._reset_timeout
+        metrics.count('network.%s.circuit.opened' % self.host)
+
+
+class AdaptiveLimiter:
+    '''AdaptiveLimiter caps the number of requests in flight to a
+    single host and adjusts that cap from the responses it observes.
+
+    The limit grows additively (by about one request per round trip)
+    while every allowed request is in use and responses succeed with a
+    healthy latency, and is halved on a 429, a 5xx or a timeout.
+    Throttling responses also pause new requests to the host for a
+    cool-down period.
+
+    Class Attributes:
+        MIN_LIMIT: lowest concurrency the limit can fall to
+        MAX_LIMIT: highest concurrency the limit can grow to
+        LATENCY_TOLERANCE: multiple of the best observed latency
+            above which responses no longer count as healthy
+        BACKOFF: cool-down in seconds after a throttling response
+            without a Retry-After header
+    '''
+    MIN_LIMIT = 1
+    MAX_LIMIT = 16
+    LATENCY_TOLERANCE = 2.5
+    BACKOFF = 2.0
+
+    _SAMPLE_SIZE = 100
+    _EWMA_WEIGHT = 0.2
+    _POLL = 0.1 #Seconds between checks for cancellation
+
+    def __init__(self, host, initial_limit=4):
+        '''Constructs a limiter for the given host starting at
+        initial_limit concurrent requests.
+
+        '''
+        self.host = host
+        self.limit = float(initial_limit)
+        self.in_flight = 0
+        self.successes = 0
+        self.failures = 0
+        self.latency = None #Exponentially weighted moving average
+        self.best_latency = None
+
+        self._latencies = deque(maxlen=AdaptiveLimiter._SAMPLE_SIZE)
+        self._cooldown_until = 0.0
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self, cancel=None):
+        '''Blocks until a request to the host may be sent.
+
+        Raises Cancelled if the threading.Event cancel is set while
+        waiting.
+
+        '''
+        with self._cond:
+            while True:
+                if cancel is not None and cancel.is_set():
+                    raise Cancelled()
+                wait = self._cooldown_until - time.monotonic()
+                if wait <= 0 and self.in_flight < int(self.limit):
+                    self.in_flight += 1
+                    return
+
+                timeout = wait if wait > 0 else None
+                if cancel is not None:
+                    timeout = min(timeout or AdaptiveLimiter._POLL,
+                                  AdaptiveLimiter._POLL)
+                self._cond.wait(timeout=timeout)
+
+    def release(self, latency, outcome, retry_after=None):
+        '''Records the result of a request and adjusts the limit.
+
+        outcome is one of 'ok', 'throttled', 'error' or 'timeout'.
+        retry_after is the delay in seconds requested by the server,
+        if any.
+
+        '''
+        with self._cond:
+            #The limit only grows while it is what holds requests back.
+            saturated = self.in_flight >= int(self.limit)
+            self.in_flight -= 1
+            now = time.monotonic()
+
+            if outcome == 'ok':
+                self.successes += 1
+                self._observe(latency)
+                if saturated and self._is_healthy(latency):
+                    self.limit = min(AdaptiveLimiter.MAX_LIMIT,
+                                     self.limit + 1.0/self.limit)
+            else:
+                self.failures += 1
+                if outcome != 'timeout':
+                    self._observe(latency)
+
+                #Only decrease once per round trip so a burst of
+                #failures from requests already in flight doesn't
+                #collapse the limit.
+                window = self.latency if self.latency is not None else 1.0
+                if now - self._last_decrease > window:
+                    self.limit = max(AdaptiveLimiter.MIN_LIMIT,
+                                     self.limit/2.0)
+                    self._last_decrease = now
+
+                if outcome == 'throttled' or outcome == 'error':
+                    pause = (retry_after if retry_after is not None
+                             else AdaptiveLimiter.BACKOFF)
+                    self._cooldown_until = max(self._cooldown_until,
+                                               now + pause)
+
+            self._cond.notify_all()
+
+    def snapshot(self):
+        '''Returns a dict describing the current state of the limiter.'''
+
+        with self._cond:
+            latencies = sorted(self._latencies)
+            cooldown = max(0.0, self._cooldown_until - time.monotonic())
+
+            return {'host': self.host,
+                    'limit': int(self.limit),
+                    'in_flight': self.in_flight,
+                    'successes': self.successes,
+                    'failures': self.failures,
+                    'latency_avg': self.latency,
+                    'latency_p50': _percentile(latencies, 0.5),
+                    'latency_p95': _percentile(latencies, 0.95),
+                    'cooldown': cooldown}
+
+    def _observe(self, latency):
+        #Updates the latency statistics with a new sample.
+
+        self._latencies.append(latency)
+        if self.latency is None:
+            self.latency = latency
+        else:
+            weight = AdaptiveLimiter._EWMA_WEIGHT
+            self.latency = weight*latency + (1 - weight)*self.latency
+        if self.best_latency is None or latency < self.best_latency:
+            self.best_latency = latency
+
+    def _is_healthy(self, latency):
+        #Checks whether a latency is close enough to the best seen.
+
+        return latency <= AdaptiveLimiter.LATENCY_TOLERANCE*self.best_latency
+
+
+TIMEOUT = (5, 15) #Connect and read timeouts in seconds
+RETRIES = 2
+
+_limiters = {}
+_breakers = {}
+_limiters_lock = threading.Lock()
+
+_session = requests.Session()
+_adapter = HTTPAdapter(pool_connections=4,
+                       pool_maxsize=AdaptiveLimiter.MAX_LIMIT)
+_session.mount('https://', _adapter)
+_session.mount('http://', _adapter)
+
+
+def limiter_for(host):
+    '''Returns the limiter for the given host, creating it if needed.'''
+
+    with _limiters_lock:
+        if host not in _limiters:
+            _limiters[host] = AdaptiveLimiter(host)
+        return _limiters[host]
+
+def breaker_for(host):
+    '''Returns the circuit breaker for the given host, creating it if
+    needed.
+
+    '''
+    with _limiters_lock:
+        if host not in _breakers:
+            _breakers[host] = CircuitBreaker(host)
+        return _breakers[host]
+
+def available(url):
+    '''Returns whether requests to the host of url would be sent now,
+    that is whether its circuit breaker isn't open.
+
+    '''
+    return breaker_for(urlparse(url).netloc).available()
+
+def max_workers():
+    '''Returns the number of workers needed to saturate a limiter.'''
+
+    return AdaptiveLimiter.MAX_LIMIT
+
+def stats():
+    '''Returns a snapshot of every host's limiter and circuit breaker
+    keyed by host.
+
+    '''
+    with _limiters_lock:
+        limiters = list(_limiters.values())
+    hosts = {limiter.host: limiter.snapshot() for limiter in limiters}
+    for host, state in hosts.items():
+        state.update(breaker_for(host).snapshot())
+    return hosts
+
+def preconnect(url, connections=1):
+    '''Opens pooled connections to the host of url so later requests
+    skip DNS, TCP and TLS setup. Failures are ignored.
+
+    '''
+    host = urlparse(url).netloc
+
+    def connect():
+        try:
+            _session.head(url, timeout=TIMEOUT, allow_redirects=False)
+        except requests.RequestException:
+            metrics.count('network.%s.preconnect_errors' % host)
+
+    threads = [threading.Thread(target=connect, daemon=True)
+               for _ in range(connections)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+def get(url, timeout=TIMEOUT, retries=RETRIES, cancel=None, **kwargs):
+    '''Sends a GET request for url through the limiter of its host.
+
+    Throttled (429), server error (5xx) and timed out requests are
+    retried up to retries times once the limiter allows it. Returns
+    the response, or raises requests.RequestException if the request
+    could not be completed. Cancelled is raised instead if the
+    threading.Event cancel is set before the request is sent, and
+    CircuitOpen, without sending it, while the host is failing.
+
+    '''
+    host = urlparse(url).netloc
+    limiter = limiter_for(host)
+    breaker = breaker_for(host)
+    prefix = 'network.' + host
+
+    attempt = 0
+    while True:
+        breaker.allow()
+        try:
+            limiter.acquire(cancel)
+        except Cancelled:
+            breaker.abandon()
+            raise
+        start = time.monotonic()
+        try:
+            response = _session.get(url, timeout=timeout, **kwargs)
+        except requests.RequestException:
+            limiter.release(time.monotonic() - start, 'timeout')
+            breaker.record(False)
+            metrics.count(prefix + '.errors')
+            if attempt >= retries:
+                raise
+        else:
+            latency = time.monotonic() - start
+            status = response.status_code
+            metrics.observe(prefix + '.time', latency)
+            metrics.count('%s.status.%d' % (prefix, status))
+            if not kwargs.get('stream'):
+                metrics.observe(prefix + '.bytes', len(response.content))
+            breaker.record(status != 429 and status < 500)
+            if status == 429:
+                limiter.release(latency, 'throttled',
+                                _retry_after(response))
+            elif status >= 500:
+                limiter.release(latency, 'error', _retry_after(response))
+            else:
+                limiter.release(latency, 'ok')
+                return response
+
+            if attempt >= retries:
+                return response
+            response.close() #Returns a streamed connection to the pool
+
+        attempt += 1
+        metrics.count(prefix + '.retries')
+
+def _retry_after(response):
+    #Returns the Retry-After delay of a response in seconds, if any.
+
+    value = response.headers.get('Retry-After')
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+def _percentile(values, fraction):
+    #Returns the given percentile of an already sorted list.
+
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(fraction*len(values)))]
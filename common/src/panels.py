@@ -0,0 +1,344 @@
+''' Copyright © 2019 Shakeel Niazi
+
+This module provides the optional secondary windows of CinEval.
+
+@author: Shakeel Niazi
+'''
+import threading
+import time
+import tkinter as tk
+from tkinter import ttk, filedialog
+
+import analytics
+import network
+from index import parse_query
+from instrument import metrics, arm_profiler, profiler_armed
+from ratings import rating_key
+
+
+class DebugPanel(tk.Toplevel):
+    '''DebugPanel shows the collected performance metrics and the
+    state of each host's concurrency limiter, refreshed every second.
+
+    Class Attributes:
+        REFRESH_MS: time between refreshes in milliseconds
+    '''
+    REFRESH_MS = 1000
+
+    _METRIC_HEADERS = ['Metric', 'Count', 'Mean', 'p50', 'p90', 'Max']
+    _HOST_HEADERS = ['Host', 'Limit', 'In Flight', 'Avg Latency',
+                     'p95 Latency', 'Failures', 'Circuit']
+
+    def __init__(self, master):
+        '''Constructs the panel as a child window of master.'''
+
+        tk.Toplevel.__init__(self, master)
+        self.title('CinEval - Debug')
+        self.geometry('760x480')
+
+        self.hosts_box = self._make_table(DebugPanel._HOST_HEADERS, 4)
+        self.metrics_box = self._make_table(DebugPanel._METRIC_HEADERS, 12)
+        self.metrics_box.column('Metric', width=260)
+
+        buttons = ttk.Frame(self)
+        ttk.Button(buttons, text='Dump JSON',
+                   command=self._dump).pack(side='left', padx=5)
+        self.profile_bttn = ttk.Button(buttons, text='Profile Next',
+                                       command=self._arm)
+        self.profile_bttn.pack(side='left', padx=5)
+        ttk.Button(buttons, text='Reset',
+                   command=self._reset).pack(side='left', padx=5)
+
+        self.hosts_box.pack(fill='x', padx=5, pady=5)
+        self.metrics_box.pack(fill='both', expand=True, padx=5)
+        buttons.pack(pady=5)
+
+        self._after = None #Id of the next refresh
+        self._refresh()
+
+    def destroy(self):
+        '''Stops refreshing and closes the panel.'''
+
+        if self._after is not None:
+            self.after_cancel(self._after)
+            self._after = None
+        tk.Toplevel.destroy(self)
+
+    def _make_table(self, headers, height):
+        #Creates a Treeview with the given headers.
+
+        table = ttk.Treeview(self, columns=headers, show='headings',
+                             height=height)
+        for header in headers:
+            table.heading(header, text=header)
+            table.column(header, width=90, anchor='e')
+        table.column(headers[0], anchor='w')
+        return table
+
+    def _refresh(self):
+        #Repopulates both tables and schedules the next refresh.
+
+        self.hosts_box.delete(*self.hosts_box.get_children())
+        for host, state in sorted(network.stats().items()):
+            self.hosts_box.insert('', 'end',
+                                  values=[host, state['limit'],
+                                          state['in_flight'],
+                                          _format_time(state['latency_avg']),
+                                          _format_time(state['latency_p95']),
+                                          state['failures'],
+                                          state['circuit']])
+
+        snapshot = metrics.snapshot()
+        self.metrics_box.delete(*self.metrics_box.get_children())
+        for name, summary in snapshot['histograms'].items():
+            _format = (_format_bytes if name.endswith('.bytes')
+                       else _format_time)
+            self.metrics_box.insert('', 'end',
+                                    values=[name, summary['count'],
+                                            _format(summary['mean']),
+                                            _format(summary['p50']),
+                                            _format(summary['p90']),
+                                            _format(summary['max'])])
+        for name, count in snapshot['counters'].items():
+            self.metrics_box.insert('', 'end', values=[name, count])
+
+        self.profile_bttn.state(['disabled'] if profiler_armed()
+                                else ['!disabled'])
+        self._after = self.after(DebugPanel.REFRESH_MS, self._refresh)
+
+    def _dump(self):
+        #Writes the metrics and limiter states to a JSON file.
+
+        default = 'cineval-metrics-%s.json' % time.strftime('%Y%m%d-%H%M%S')
+        path = filedialog.asksaveasfilename(parent=self,
+                                            initialfile=default,
+                                            defaultextension='.json')
+        if path:
+            metrics.dump(path, extra={'hosts': network.stats()})
+
+    def _arm(self):
+        #Profiles the next search or rating batch.
+
+        arm_profiler()
+        self.profile_bttn.state(['disabled'])
+
+    def _reset(self):
+        #Clears the collected metrics.
+
+        metrics.reset()
+
+
+class AnalyticsPanel(tk.Toplevel):
+    '''AnalyticsPanel summarizes the results loaded in CinEval, and
+    optionally every schedule kept in the disk cache, by distributor
+    and by month and lists the movies critics and audiences disagree
+    on most. It follows the filter typed in the main window.
+
+    Results are copied into an analytics.Table only when they change,
+    and not while a rating job is still changing them; a change of
+    filter just summarizes another set of rows.
+
+    Class Attributes:
+        REFRESH_MS: time between checks for changes in milliseconds
+    '''
+    REFRESH_MS = 1000
+
+    _DIST_HEADERS = ['Distributor', 'Movies', 'Critics Mean',
+                     'Critics Median', 'Audience Mean', 'Audience Median',
+                     'Mean Gap']
+    _MONTH_HEADERS = ['Month', 'Movies', 'Total Sales', 'Mean Sales']
+    _GAP_HEADERS = ['Title', 'Year', 'Tomatometer', 'Audience', 'Gap']
+
+    def __init__(self, master):
+        '''Constructs the panel as a child window of master, a CinEval
+        window.
+
+        '''
+        tk.Toplevel.__init__(self, master)
+        self.title('CinEval - Analytics')
+        self.geometry('760x640')
+
+        self.include_history = tk.BooleanVar(value=False)
+        self.loaded = analytics.Table()
+        self.loaded_rows = [] #Row id of each row of loaded
+        self.history = None #(Table, RecordIndex) of cached schedules
+        self._loaded_version = None #Results version copied into loaded
+        self._seen = None #Results version and filter last summarized
+        self._loading = False
+        self._load_failed = False #Whether history couldn't be read
+        self._after = None #Id of the next check
+
+        options = ttk.Frame(self)
+        ttk.Checkbutton(options, text='Include crawled history',
+                        variable=self.include_history,
+                        command=self._toggle_history).pack(side='left')
+        self.summary_label = ttk.Label(options)
+        self.summary_label.pack(side='left', padx=10)
+
+        self.dist_box = self._make_table(AnalyticsPanel._DIST_HEADERS, 8)
+        self.month_box = self._make_table(AnalyticsPanel._MONTH_HEADERS, 6)
+        self.gap_box = self._make_table(AnalyticsPanel._GAP_HEADERS, 8)
+        self.dist_box.column('Distributor', width=160)
+        self.gap_box.column('Title', width=260)
+
+        options.pack(fill='x', padx=5, pady=5)
+        for table in (self.dist_box, self.month_box, self.gap_box):
+            table.pack(fill='both', expand=True, padx=5, pady=5)
+
+        self._refresh()
+
+    def destroy(self):
+        '''Stops checking for changes and closes the panel.'''
+
+        if self._after is not None:
+            self.after_cancel(self._after)
+            self._after = None
+        tk.Toplevel.destroy(self)
+
+    def _make_table(self, headers, height):
+        #Creates a Treeview with the given headers.
+
+        table = ttk.Treeview(self, columns=headers, show='headings',
+                             height=height)
+        for header in headers:
+            table.heading(header, text=header)
+            table.column(header, width=90, anchor='e')
+        table.column(headers[0], anchor='w')
+        return table
+
+    def _toggle_history(self):
+        #Loads the cached schedules the first time they are included.
+
+        if self.include_history.get() and self.history is None:
+            if not self._loading:
+                self._loading = True
+                self.summary_label.config(text='Loading history...')
+                loaded = {rating_key(release.title, release.year)
+                          for release in self.master.releases.values()}
+                threading.Thread(target=self._load_history, args=(loaded,),
+                                 daemon=True).start()
+        else:
+            self._seen = None
+
+    def _load_history(self, loaded):
+        #Reads every cached schedule, except the movies whose rating
+        #keys are in loaded, into a table and index on a background
+        #thread. A failure is reported by the next check on the Tk
+        #thread.
+
+        try:
+            with metrics.timer('analytics.history.time'):
+                records = analytics.history_records(exclude=loaded)
+                table = analytics.Table(records)
+                index = analytics.index_records(records, table)
+            self.history = (table, index)
+        except Exception:
+            metrics.count('analytics.history.errors')
+            self._load_failed = True
+        finally:
+            self._loading = False
+
+    def _refresh(self):
+        #Summarizes again if the results or the filter changed and
+        #schedules the next check. The results are only read again
+        #once no rating job is changing them, or when none were read
+        #yet, since reading them waits for every pending row update.
+
+        version = self.master.results_version
+        if version != self._loaded_version and (
+                self.master.job is None or self._loaded_version is None):
+            self.loaded = analytics.Table(self.master.records())
+            self.loaded_rows = list(self.master.row_order)
+            self._loaded_version = version
+
+        failed = self._load_failed
+        if failed:
+            self._load_failed = False
+            self.include_history.set(False)
+            self._seen = None
+        state = (self._loaded_version, self.master.filter_text.get(),
+                 self.include_history.get() and self.history is not None)
+        if state != self._seen:
+            self._seen = state
+            with metrics.timer('analytics.summary.time'):
+                self._show(self._summarize(state[1], state[2]))
+        if failed:
+            self.summary_label.config(text='Could not read the crawled '
+                                           'history. '
+                                      + self.summary_label.cget('text'))
+        self._after = self.after(AnalyticsPanel.REFRESH_MS, self._refresh)
+
+    def _summarize(self, text, history):
+        #Summarizes the loaded rows, and the cached schedules if
+        #history, that match the filter text.
+
+        words, ranges = parse_query(text)
+        table = self.loaded
+        if words or ranges:
+            matches = self.master.index.search(words, ranges)
+            rows = [i for i, row_id in enumerate(self.loaded_rows)
+                    if row_id in matches]
+        else:
+            rows = None
+
+        if history:
+            history_table, index = self.history
+            table = analytics.Table.concat([self.loaded, history_table])
+            if rows is not None:
+                offset = len(self.loaded)
+                rows += sorted(offset + i
+                               for i in index.search(words, ranges))
+        return analytics.summarize(table, rows)
+
+    def _show(self, summary):
+        #Repopulates the summary label and the tables.
+
+        tomato_mean, _ = summary['tomatometer']
+        aud_mean, _ = summary['audience']
+        gap_mean, _ = summary['gap']
+        self.summary_label.config(text='%d movies, %d rated; critics %s, '
+                                       'audience %s, gap %s'
+                                  % (summary['count'], summary['rated'],
+                                     _format_score(tomato_mean),
+                                     _format_score(aud_mean),
+                                     _format_score(gap_mean)))
+
+        self.dist_box.delete(*self.dist_box.get_children())
+        for name, count, *scores in summary['distributors']:
+            self.dist_box.insert('', 'end', values=[name or '(unknown)', count]
+                                 + [_format_score(score)
+                                    for score in scores])
+
+        self.month_box.delete(*self.month_box.get_children())
+        for month, count, total, mean in summary['months']:
+            self.month_box.insert('', 'end',
+                                  values=[month, count, _format_money(total),
+                                          _format_money(mean)])
+
+        self.gap_box.delete(*self.gap_box.get_children())
+        for title, year, critics, audience, gap in summary['gaps']:
+            self.gap_box.insert('', 'end',
+                                values=[title, year, _format_score(critics),
+                                        _format_score(audience),
+                                        '%+.0f' % gap])
+
+
+def _format_time(seconds):
+    #Formats a duration in milliseconds.
+
+    return '' if seconds is None else '%.1f ms' % (seconds*1000)
+
+def _format_bytes(size):
+    #Formats a size in kilobytes.
+
+    return '' if size is None else '%.1f kB' % (size/1024.0)
+
+def _format_score(score):
+    #Formats a rating or a gap between ratings.
+
+    return '' if score is None else '%.1f' % score
+
+def _format_money(amount):
+    #Formats an amount in dollars.
+
+    return '' if amount is None else '${:,.0f}'.format(amount)
@@ -0,0 +1,267 @@
+''' Copyright © 2019 Shakeel Niazi
+
+This module provides Pipeline, which splits large batches of lookups
+into stages so network and CPU are both kept busy: threads fetch
+pages, worker processes parse them and the caller collects the
+records, the stages connected by bounded queues.
+
+@author: Shakeel Niazi
+'''
+import concurrent.futures
+import os
+import queue
+import threading
+import time
+from collections import deque
+
+from instrument import metrics
+from network import max_workers
+
+QUEUE_SIZE = 32 #Fetched pages waiting to be parsed
+BUFFER_SIZE = 512 #Records waiting to be collected
+
+_POLL = 0.1 #Seconds between checks for cancellation
+_DONE = object() #Marks the end of the fetched pages
+
+
+class Pipeline:
+    '''Pipeline looks up each item of a batch in three stages.
+
+    Fetch: fetcher threads call fetch(item, cancel_event), which
+    returns (value, None) when the item needs no parsing, or
+    (None, args) to have parse(*args) run on the parse stage.
+
+    Parse: parse calls run on a process pool, a few more at a time than
+    there are processes so none of them waits for work.
+
+    Collect: records, emit(item, value), are queued for the caller to
+    drain with results(), as with a RatingJob.
+
+    Each stage blocks once the queue to the next is full. A slow parse
+    stage therefore holds the fetchers back, and a caller that stops
+    collecting holds the parse stage back, so memory stays bounded
+    however large the batch. The time each stage spends working and
+    blocked is recorded under '<label>.<stage>.*'.
+    '''
+
+    def __init__(self, fetch, parse, items, fetchers=None, parsers=None,
+                 pool=None, emit=None, is_failure=None, label='pipeline',
+                 queue_size=QUEUE_SIZE, buffer_size=BUFFER_SIZE):
+        '''Constructs a pipeline for items with the given number of
+        fetcher threads (enough to saturate a host by default) and
+        parser processes (one per core by default). Pages are parsed on
+        pool, a ProcessPoolExecutor with that many processes shared
+        with other pipelines, or on a pool of the pipeline's own.
+
+        is_failure, if given, is called with each value to decide
+        whether it counts as a failed lookup.
+
+        '''
+        self.fetch = fetch
+        self.parse = parse
+        self.emit = emit or (lambda item, value: value)
+        self.total = len(items)
+        self.done = 0
+        self.failures = 0
+        self.fetchers = max(1, fetchers or max_workers())
+        self.parsers = max(1, parsers or os.cpu_count() or 1)
+        self.label = label
+
+        self.cancel_event = threading.Event()
+        self._is_failure = is_failure
+        self._items = deque(items)
+        self._pages = queue.Queue(maxsize=queue_size)
+        self._results = queue.Queue(maxsize=buffer_size)
+        self._pool = pool
+        self._own_pool = pool is None
+        self._lock = threading.Lock()
+        self._fetching = 0
+        self._start_time = None
+        self._end_time = None
+
+    def start(self):
+        '''Starts every stage and returns the pipeline.'''
+
+        self._start_time = time.monotonic()
+        if self._own_pool:
+            self._pool = concurrent.futures.ProcessPoolExecutor(self.parsers)
+        self._fetching = self.fetchers
+        for _ in range(self.fetchers):
+            threading.Thread(target=self._fetch_stage, daemon=True).start()
+        threading.Thread(target=self._parse_stage, daemon=True).start()
+        return self
+
+    def cancel(self):
+        '''Stops every stage. Records that complete afterwards are
+        discarded.
+
+        '''
+        self.cancel_event.set()
+
+    @property
+    def cancelled(self):
+        '''Whether the pipeline has been cancelled.'''
+
+        return self.cancel_event.is_set()
+
+    @property
+    def finished(self):
+        '''Whether every stage has stopped.'''
+
+        with self._lock:
+            return self._end_time is not None
+
+    def results(self):
+        '''Returns the records completed since the last call.'''
+
+        completed = []
+        while True:
+            try:
+                completed.append(self._results.get_nowait())
+            except queue.Empty:
+                return completed
+
+    def progress(self):
+        '''Returns a dict with the done, total, failures, elapsed and
+        eta (seconds, or None if unknown) of the pipeline.
+
+        '''
+        with self._lock:
+            done = self.done
+            end = (self._end_time if self._end_time is not None
+                   else time.monotonic())
+            elapsed = (end - self._start_time
+                       if self._start_time is not None else 0.0)
+
+            eta = None
+            if done and self._end_time is None:
+                eta = elapsed/done*(self.total - done)
+
+            return {'done': done, 'total': self.total,
+                    'failures': self.failures, 'elapsed': elapsed,
+                    'eta': eta}
+
+    def _fetch_stage(self):
+        #Fetches items until none are left, passing pages on to the
+        #parse stage. The last fetcher to stop marks the end of the
+        #pages.
+
+        while not self.cancel_event.is_set():
+            try:
+                item = self._items.popleft()
+            except IndexError:
+                break
+
+            start = time.monotonic()
+            try:
+                value, args = self.fetch(item, self.cancel_event)
+            except Exception:
+                value, args = None, None
+            metrics.observe(self.label + '.fetch.time',
+                            time.monotonic() - start)
+
+            if args is None:
+                metrics.count(self.label + '.parse.skipped')
+                self._collect(item, value)
+            else:
+                self._put(self._pages, (item, args), 'fetch')
+
+        with self._lock:
+            self._fetching -= 1
+            last = self._fetching == 0
+        if last:
+            self._put(self._pages, _DONE, 'fetch')
+
+    def _parse_stage(self):
+        #Sends fetched pages to the process pool, keeping it a little
+        #ahead of its processes, and collects the parsed values.
+
+        limit = 2*self.parsers
+        in_flight = {} #Future -> (item, time submitted)
+        fetching = True
+        try:
+            while (fetching or in_flight) and not self.cancel_event.is_set():
+                while fetching and len(in_flight) < limit:
+                    try:
+                        page = (self._pages.get_nowait() if in_flight
+                                else self._pages.get(timeout=_POLL))
+                    except queue.Empty:
+                        break
+                    if page is _DONE:
+                        fetching = False
+                        break
+                    metrics.observe(self.label + '.parse.queue',
+                                    self._pages.qsize())
+                    item, args = page
+                    future = self._pool.submit(self.parse, *args)
+                    in_flight[future] = (item, time.monotonic())
+
+                if not in_flight:
+                    continue
+                done, _ = concurrent.futures.wait(
+                    in_flight, timeout=_POLL,
+                    return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    item, start = in_flight.pop(future)
+                    metrics.observe(self.label + '.parse.time',
+                                    time.monotonic() - start)
+                    try:
+                        value = future.result()
+                    except Exception:
+                        value = None
+                    self._collect(item, value)
+        finally:
+            for future in in_flight:
+                future.cancel()
+            if self._own_pool:
+                self._pool.shutdown(wait=False)
+            self._finish()
+
+    def _collect(self, item, value):
+        #Counts a finished item and queues its record for the caller.
+
+        if self.cancel_event.is_set():
+            return
+        failed = (value is None or self._is_failure is not None
+                  and self._is_failure(value))
+        with self._lock:
+            self.done += 1
+            self.failures += failed
+        if value is not None:
+            self._put(self._results, self.emit(item, value), 'collect')
+
+    def _put(self, stage_queue, entry, stage):
+        #Puts entry on a bounded queue, blocking while it is full and
+        #recording how long the stage was held back. Gives up if the
+        #pipeline is cancelled.
+
+        try:
+            stage_queue.put_nowait(entry)
+            return
+        except queue.Full:
+            pass
+
+        start = time.monotonic()
+        while not self.cancel_event.is_set():
+            try:
+                stage_queue.put(entry, timeout=_POLL)
+                break
+            except queue.Full:
+                pass
+        metrics.observe('%s.%s.blocked' % (self.label, stage),
+                        time.monotonic() - start)
+
+    def _finish(self):
+        #Records the end of the pipeline.
+
+        with self._lock:
+            self._end_time = time.monotonic()
+            elapsed = self._end_time - self._start_time
+
+        if not self.cancelled:
+            metrics.observe(self.label + '.batch.time', elapsed)
+            if elapsed > 0:
+                metrics.observe(self.label + '.batch.rate',
+                                self.done/elapsed)
+        else:
+            metrics.count(self.label + '.cancelled')
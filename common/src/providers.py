@@ -0,0 +1,192 @@
+''' Copyright © 2019 Shakeel Niazi
+
+This module provides the rating providers CinEval can show ratings
+from. Each provider looks a movie up on its own source, with its own
+cache and its own cap on concurrent lookups, and lookup_all asks
+every enabled provider at once, so adding a source doesn't make
+lookups slower.
+
+Providers are enabled by name with --providers or the
+CINEVAL_PROVIDERS environment variable, e.g. CINEVAL_PROVIDERS=rt.
+
+@author: Shakeel Niazi
+'''
+import concurrent.futures
+import os
+import threading
+
+import network
+from instrument import metrics
+from ratings import RATING_TTL, UNAVAILABLE, cached_ratings
+
+PROVIDERS_ENV = 'CINEVAL_PROVIDERS' #Comma separated provider names
+DEFAULT = 'rt'
+
+_POLL = 0.1 #Seconds between checks for cancellation
+
+
+class Provider:
+    '''Provider is the interface of a source of ratings.
+
+    A lookup returns the values of the provider's FIELDS followed by
+    the url of the movie's page, or None if the movie wasn't found.
+    Providers implement fetch, reading and parsing their source as
+    suits it.
+
+    Class Attributes:
+        NAME: name used to enable the provider
+        COLUMNS: headers of the result columns, one per field
+        FIELDS: names of the fields in snapshot records
+        CONCURRENCY: cap on the provider's lookups in progress at
+            once. It doesn't limit the rate of requests, which the
+            network module limits for each host.
+    '''
+    NAME = ''
+    COLUMNS = []
+    FIELDS = []
+    CONCURRENCY = 4
+
+    def __init__(self):
+        '''Constructs a provider with no lookups in progress.'''
+
+        self._slots = threading.BoundedSemaphore(self.CONCURRENCY)
+
+    def lookup(self, title, year, max_age=None, cancel=None):
+        '''Returns the ratings of a movie, from the provider's cache if
+        they were looked up within max_age seconds, or the provider's
+        own time to live if max_age is None.
+
+        Waits while CONCURRENCY lookups are already in progress.
+        Gives up, raising network.Cancelled, once the threading.Event
+        cancel is set.
+
+        '''
+        while not self._slots.acquire(timeout=_POLL):
+            if cancel is not None and cancel.is_set():
+                raise network.Cancelled()
+        try:
+            with metrics.timer('providers.%s.time' % self.NAME):
+                return self.fetch(title, year, max_age, cancel)
+        finally:
+            self._slots.release()
+
+    def fetch(self, title, year, max_age, cancel):
+        '''Looks a movie up. Implemented by each provider.'''
+
+        raise NotImplementedError
+
+    def unavailable(self):
+        '''Returns the result of a lookup that couldn't be made.'''
+
+        return ('Unavailable',)*len(self.FIELDS) + (None,)
+
+
+class RottenTomatoes(Provider):
+    '''RottenTomatoes provides the Tomatometer and audience score,
+    looked up as described in the ratings module.
+    '''
+    NAME = 'rt'
+    COLUMNS = ['Tomatometer', 'Audience Score']
+    FIELDS = ['tomatometer', 'audience']
+    CONCURRENCY = network.max_workers()
+
+    def fetch(self, title, year, max_age, cancel):
+        return cached_ratings(title, year,
+                              RATING_TTL if max_age is None else max_age,
+                              cancel)
+
+    def unavailable(self):
+        return UNAVAILABLE
+
+
+PROVIDERS = {provider.NAME: provider
+             for provider in (RottenTomatoes,)}
+
+#Fields of every provider other than Rotten Tomatoes, whose fields
+#have always been part of records.
+EXTRA_FIELDS = [field for name, provider in PROVIDERS.items()
+                if name != RottenTomatoes.NAME for field in provider.FIELDS]
+
+_instances = {}
+_instances_lock = threading.Lock()
+_pool = None
+
+
+def get(name):
+    '''Returns the provider with the given name, raising ValueError if
+    there is none.
+
+    '''
+    if name not in PROVIDERS:
+        raise ValueError('Unknown provider %r, choose from: %s'
+                         % (name, ', '.join(sorted(PROVIDERS))))
+    with _instances_lock:
+        if name not in _instances:
+            _instances[name] = PROVIDERS[name]()
+        return _instances[name]
+
+def enabled(names=None):
+    '''Returns the named providers, given as a list or a comma
+    separated string, or those named in CINEVAL_PROVIDERS if names is
+    None.
+
+    '''
+    if names is None:
+        names = os.environ.get(PROVIDERS_ENV) or DEFAULT
+    if isinstance(names, str):
+        names = [name.strip().lower() for name in names.split(',')]
+    return [get(name) for name in dict.fromkeys(names) if name]
+
+def lookup_all(names, title, year, max_age=None, cancel=None):
+    '''Looks a movie up with every provider in names at once.
+
+    Returns a dict of provider name -> result as returned by
+    Provider.lookup. A provider that fails gives its unavailable
+    result. Raises network.Cancelled once the threading.Event cancel
+    is set.
+
+    '''
+    providers = [get(name) for name in names]
+    if not providers:
+        return {}
+
+    #The first provider runs on the calling thread, the others on the
+    #shared pool.
+    pool = _shared_pool()
+    futures = {provider.NAME: pool.submit(_lookup, provider, title, year,
+                                          max_age, cancel)
+               for provider in providers[1:]}
+    results = {providers[0].NAME: _lookup(providers[0], title, year,
+                                          max_age, cancel)}
+    for name, future in futures.items():
+        while True:
+            try:
+                results[name] = future.result(_POLL)
+                break
+            except concurrent.futures.TimeoutError:
+                if cancel is not None and cancel.is_set():
+                    raise network.Cancelled()
+    return results
+
+def _lookup(provider, title, year, max_age, cancel):
+    #Looks a movie up with a provider, turning its errors into its
+    #unavailable result.
+
+    try:
+        return provider.lookup(title, year, max_age, cancel)
+    except network.Cancelled:
+        raise
+    except Exception:
+        metrics.count('providers.%s.errors' % provider.NAME)
+        return provider.unavailable()
+
+def _shared_pool():
+    #Returns the thread pool running providers, creating it if needed.
+
+    global _pool
+    with _instances_lock:
+        if _pool is None:
+            _pool = concurrent.futures.ThreadPoolExecutor(
+                max_workers=network.max_workers()*len(PROVIDERS),
+                thread_name_prefix='provider')
+        return _pool
@@ -0,0 +1,353 @@
+''' Copyright © 2019 Shakeel Niazi
+
+This module looks up the ratings of a movie on Rotten Tomatoes,
+independently of the GUI, so lookups can run on any execution
+backend, including worker processes.
+
+Movie pages are found by guessing their url from the title. Titles
+the guesses miss are looked up with the site's search and matched by
+title similarity and release year. Every page found other than by the
+first guess is remembered in the disk cache, so later lookups go
+straight to it.
+
+@author: Shakeel Niazi
+'''
+import difflib
+import time
+
+import requests
+from bs4 import BeautifulSoup
+from unidecode import unidecode
+
+import archive
+import network
+import cache
+from extract import find_ratings, scan_ratings
+from instrument import metrics
+from jobs import SingleFlight
+from schedule import normalize_title
+
+RT_URL = 'https://www.rottentomatoes.com/'
+MOVIE_URL = RT_URL + 'm/'
+SEARCH_URL = RT_URL + 'api/private/v2.0/search'
+
+#Namespaces of the disk cache
+RATINGS = 'ratings' #Rating key -> [critics rating, aud rating, url]
+MATCHES = 'matches' #Rating key -> movie url or None
+HISTORY = 'history' #Rating key -> {'checks', 'changes', 'checked',
+                    #                'failures', 'failed'}
+
+RATING_TTL = 24*60*60 #Seconds cached ratings are served by default
+MIN_SCORE = 0.75 #Lowest similarity score accepted as a match
+MISS_TTL = 7*24*60*60 #Seconds a failed search is remembered
+
+#Ratings of a movie when Rotten Tomatoes can't be reached.
+UNAVAILABLE = ('Unavailable', 'Unavailable', None)
+
+_REPLACE_CHARS = [':', "'", '.', ',', '!', '?', '%', '$']
+
+_flights = SingleFlight()
+
+
+def search_ratings(title, year, cancel=None):
+    '''Searches Rotten Tomatoes for the ratings of a movie.
+
+    Returns (critics_rating, aud_rating, url), ('N/A', 'N/A', None) if
+    the movie couldn't be found, or UNAVAILABLE if the site couldn't
+    be reached or failed to answer. Gives up early, raising
+    network.Cancelled, once the threading.Event cancel is set.
+
+    '''
+    result, page = fetch_ratings(title, year, cancel)
+    return result if page is None else parse_page(*page)
+
+def fetch_ratings(title, year, cancel=None):
+    '''Fetches the page of a movie, reading its ratings as it is
+    streamed if it can.
+
+    Returns (result, None) with the result of search_ratings when no
+    parsing is left to do, or (None, (url, text)) for a page that needs
+    to go through parse_page, so fetching and parsing can be done by
+    different workers. Raises network.Cancelled as search_ratings does.
+
+    '''
+    #Pages are streamed so only as much of them as is needed gets
+    #downloaded. Bodies of pages that weren't found are never read.
+    try:
+        response, url = _find_page(title, year, cancel)
+        if response is None:
+            return ('N/A', 'N/A', None), None #Not found
+
+        #Read just enough of the page to find both ratings, or all of
+        #it to archive it.
+        keep = archive.enabled()
+        with metrics.timer('parse.ratings.scan.time'):
+            ratings, text = scan_ratings(response, read_all=keep)
+    except network.Cancelled:
+        raise
+    except requests.RequestException:
+        return UNAVAILABLE, None #Site unreachable or failing, or its
+                                 #circuit is open
+
+    if keep:
+        archive.save(url, text, RATINGS, rating_key(title, year))
+    if ratings is not None:
+        return ratings + (url,), None
+    return None, (url, text)
+
+def parse_page(url, text):
+    '''Returns (critics_rating, aud_rating, url) parsed from text, the
+    whole page of a movie at url.
+
+    '''
+    return read_ratings(text) + (url,)
+
+def read_ratings(text):
+    '''Returns (critics_rating, aud_rating) read from the html of a
+    whole movie page, as parse_ratings does.
+
+    '''
+    ratings = find_ratings(text)
+    if ratings is not None:
+        return ratings
+
+    #Fall back to parsing the whole page.
+    with metrics.timer('parse.ratings.soup.time'):
+        html = BeautifulSoup(text, 'html.parser')
+    with metrics.timer('parse.ratings.time'):
+        return parse_ratings(html)
+
+def cached_ratings(title, year, max_age=RATING_TTL, cancel=None):
+    '''Returns the ratings of a movie as search_ratings does, from the
+    disk cache if they were looked up within max_age seconds (or at
+    any time if max_age is None).
+
+    Otherwise the ratings are searched for, and cached if the movie
+    was found. Every search is recorded in the movie's history, which
+    counts how often its ratings were found to have changed.
+    Concurrent calls for the same movie share one search. While Rotten
+    Tomatoes can't be reached, expired ratings are served rather than
+    UNAVAILABLE.
+
+    '''
+    key = rating_key(title, year)
+    entry = cache.shared().get_entry(RATINGS, key)
+    if entry is not None and (max_age is None
+                              or time.time() - entry[1] < max_age):
+        metrics.count('ratings.cache.hits')
+        return tuple(entry[0])
+    if entry is not None and not network.available(RT_URL):
+        metrics.count('ratings.cache.stale')
+        return tuple(entry[0])
+
+    def search():
+        result = search_ratings(title, year, cancel)
+        if result == UNAVAILABLE:
+            _record_failure(key)
+            if entry is not None:
+                metrics.count('ratings.cache.stale')
+                return tuple(entry[0])
+            return result
+        if result[2] is not None:
+            cache.shared().set(RATINGS, key, list(result))
+        _record_check(key, entry[0] if entry is not None else None, result)
+        return result
+    return _flights.do(key, search, cancel)
+
+def _record_check(key, old, result):
+    #Records a search for a movie's ratings in its history.
+
+    def update(history):
+        history = history or {'checks': 0, 'changes': 0}
+        if old is not None and result[2] is not None:
+            history['checks'] += 1
+            history['changes'] += list(result[:2]) != list(old[:2])
+        history['checked'] = time.time()
+        history['failures'] = 0
+        return history
+    cache.shared().update(HISTORY, key, update)
+
+def _record_failure(key):
+    #Records a search for a movie's ratings that couldn't reach Rotten
+    #Tomatoes in its history, so it isn't retried straight away.
+
+    def update(history):
+        history = history or {'checks': 0, 'changes': 0}
+        history['failures'] = history.get('failures', 0) + 1
+        history['failed'] = time.time()
+        return history
+    cache.shared().update(HISTORY, key, update)
+
+def _find_page(title, year, cancel):
+    #Returns the streamed response and url of a movie's page, or
+    #(None, None) if it couldn't be found.
+
+    key = rating_key(title, year)
+    entry = cache.shared().get_entry(MATCHES, key)
+    if entry is not None:
+        url, updated = entry
+        if url is None and time.time() - updated < MISS_TTL:
+            metrics.count('ratings.match.cached')
+            return None, None
+        if url is not None:
+            response = network.get(url, cancel=cancel, stream=True)
+            if _found(response):
+                metrics.count('ratings.match.cached')
+                return response, url
+            #The page moved, look for it again
+
+    #Try the title only, then with the year and the previous year.
+    formatted_title = format_title(title)
+    guesses = [formatted_title, formatted_title + '_' + year]
+    if year.isdigit():
+        guesses.append(formatted_title + '_' + str(int(year)-1))
+    for i, guess in enumerate(guesses):
+        url = MOVIE_URL + guess
+        response = network.get(url, cancel=cancel, stream=True)
+        if _found(response):
+            if i > 0 or entry is not None:
+                cache.shared().set(MATCHES, key, url)
+            return response, url
+
+    #Fall back to the site's search. Nothing is remembered when it
+    #can't be completed.
+    candidates = search_candidates(title, cancel)
+    if candidates is None:
+        raise requests.RequestException('The search is unavailable.')
+    url = best_match(title, year, candidates)
+    cache.shared().set(MATCHES, key, url)
+    metrics.count('ratings.match.found' if url is not None
+                  else 'ratings.match.missed')
+    if url is None:
+        return None, None
+
+    response = network.get(url, cancel=cancel, stream=True)
+    if not _found(response):
+        return None, None
+    return response, url
+
+def _found(response):
+    #Returns whether a streamed response holds the page asked for,
+    #closing it if not. Only a 404 means the page doesn't exist; any
+    #other error, such as a throttled or server error response left
+    #once retries ran out, raises requests.HTTPError so the movie
+    #isn't taken for missing.
+
+    if response.status_code == 200:
+        return True
+    response.close()
+    if response.status_code != 404:
+        raise requests.HTTPError('HTTP %d' % response.status_code,
+                                 response=response)
+    return False
+
+def search_candidates(title, cancel=None):
+    '''Searches Rotten Tomatoes for movies matching title.
+
+    Returns a list of (name, year, url) for the movies found, or None
+    if the search couldn't be completed or its answer wasn't
+    understood.
+
+    '''
+    metrics.count('ratings.match.searched')
+    response = network.get(SEARCH_URL, cancel=cancel,
+                           params={'q': unidecode(title), 'limit': 10})
+    if response.status_code != 200:
+        return None
+    try:
+        movies = response.json().get('movies')
+    except (ValueError, AttributeError):
+        return None
+    if not isinstance(movies, list):
+        return None
+
+    candidates = []
+    for movie in movies:
+        if not isinstance(movie, dict) or not movie.get('url'):
+            continue
+        url = movie['url']
+        if url.startswith('/'):
+            url = RT_URL + url[1:]
+        candidates.append((str(movie.get('name', '')),
+                           str(movie.get('year') or ''), url))
+    return candidates
+
+def best_match(title, year, candidates):
+    '''Returns the url of the candidate, a (name, year, url), that best
+    matches title and year, or None if none scores at least MIN_SCORE.
+
+    Names are scored by their similarity to title, a name containing
+    every word of the other, in order, counting as a close match when
+    its year is the same or the previous one. Names scoring at least
+    MIN_SCORE get a bonus for the same or the previous year and a
+    penalty for other years.
+
+    '''
+    wanted = normalize_title(title)
+    best_url = None
+    best_score = MIN_SCORE
+    for name, candidate_year, url in candidates:
+        name = normalize_title(name)
+        if not name or not wanted:
+            continue
+        score = difflib.SequenceMatcher(None, wanted, name).ratio()
+        if candidate_year.isdigit() and year.isdigit():
+            gap = int(year) - int(candidate_year)
+            if gap in (0, 1) and (_contains(name, wanted)
+                                  or _contains(wanted, name)):
+                score = max(score, 0.85)
+            if score >= MIN_SCORE:
+                score += 0.1 if gap == 0 else 0.05 if gap == 1 else -0.2
+
+        if score >= best_score:
+            best_url = url
+            best_score = score
+    return best_url
+
+def _contains(title, words):
+    #Returns whether the normalized title contains the normalized
+    #words as whole words.
+
+    return ' %s ' % words in ' %s ' % title
+
+def rating_key(title, year):
+    '''Returns the key identifying a movie for rating lookups: its
+    normalized title and its year.
+
+    '''
+    return normalize_title(title) + '|' + year
+
+def format_title(title):
+    '''Returns title formatted as in Rotten Tomatoes movie urls.'''
+
+    formatted_title = unidecode(title)
+    formatted_title = '_'.join(formatted_title.split())
+
+    for char in _REPLACE_CHARS:
+        formatted_title = formatted_title.replace(char, '')
+    return formatted_title.replace('&', 'and')
+
+def parse_ratings(html):
+    '''Parses the html of a movie page for its critics and audience
+    ratings.
+
+    '''
+    critics = html.find(class_='mop-ratings-wrap__half')
+    aud = html.find(class_='mop-ratings-wrap__half audience-score')
+
+    if critics is not None:
+        critics_rating = critics.find(class_=
+                                      'mop-ratings-wrap__percentage')
+        critics_rating = (str(critics_rating.string).strip()
+                          if critics_rating is not None else 'Not rated')
+    else:
+        critics_rating = 'N/A'
+
+    if aud is not None:
+        aud_rating = aud.find(class_='mop-ratings-wrap__percentage')
+        aud_rating = (str(aud_rating.string).strip()
+                      if aud_rating is not None else 'Not rated')
+    else:
+        aud_rating = 'N/A'
+
+    return (critics_rating, aud_rating)
@@ -0,0 +1,127 @@
+''' Copyright © 2019 Shakeel Niazi
+
+This module parses the pages kept in the archive again with the
+current parsers and stores the results in the disk cache, as if every
+page had just been fetched. After a site changes its markup and a
+parser is fixed, this brings the cache up to date without any network
+traffic. Pages are parsed in parallel on every core.
+
+Usage:
+    python reextract.py [--kinds schedules ratings summaries]
+                        [--workers N] [--cache PATH] [--dry-run]
+
+@author: Shakeel Niazi
+'''
+import argparse
+import concurrent.futures
+import os
+import sys
+import time
+
+import archive
+import cache
+from enrich import parse_details
+from instrument import metrics
+from ratings import RATINGS, read_ratings
+from schedule import MONTHS, SCHEDULES, parse_schedule
+
+BATCH_SIZE = 200 #Results stored at a time
+
+
+def reextract(kinds=archive.KINDS, workers=None, store=None, dry_run=False,
+              report=print):
+    '''Parses every archived page of the given kinds again on workers
+    processes (one per core by default) and stores the results in
+    store, the shared DiskCache by default, unless dry_run is set.
+
+    Returns a dict counting the pages 'parsed', the results 'changed'
+    and the pages that 'failed' to parse.
+
+    '''
+    store = store or cache.shared()
+    pages = archive.Archive(store=store)
+    tasks = [(kind, key, url, pages.path(digest))
+             for url, kind, key, digest, _ in pages.pages(kinds)]
+    counts = {'parsed': 0, 'changed': 0, 'failed': 0}
+    if not tasks:
+        report('No archived pages to re-extract.')
+        return counts
+
+    workers = workers or os.cpu_count() or 1
+    batches = {kind: [] for kind in kinds}
+    with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+        #Send pages in chunks so workers aren't idle waiting for them.
+        chunk_size = max(1, len(tasks)//(4*workers))
+        results = pool.map(_extract, tasks, chunksize=chunk_size)
+        for (kind, key, url, _), value in zip(tasks, results):
+            if value is None:
+                counts['failed'] += 1
+                continue
+            counts['parsed'] += 1
+            if key is None or store.get(kind, key) == value:
+                continue
+            counts['changed'] += 1
+            batches[kind].append((key, value))
+            if len(batches[kind]) >= BATCH_SIZE:
+                if not dry_run:
+                    store.set_many(kind, batches[kind])
+                batches[kind] = []
+
+    for kind, batch in batches.items():
+        if batch and not dry_run:
+            store.set_many(kind, batch)
+    metrics.count('reextract.pages', counts['parsed'])
+    return counts
+
+def _extract(task):
+    #Parses an archived page into the value cached for it. Returns
+    #None if the page can't be read or parsed. Runs in a worker
+    #process.
+
+    kind, key, url, path = task
+    try:
+        text = archive.read(path)
+    except (OSError, ValueError):
+        return None
+
+    #Parsers may fail on markup they weren't written for, which only
+    #fails this page.
+    try:
+        if kind == RATINGS:
+            return list(read_ratings(text)) + [url]
+        if kind == SCHEDULES:
+            release_type = int(key.split('|')[0]) if key else 0
+            return [list(release) for release
+                    in parse_schedule(text, MONTHS, release_type)]
+        return parse_details(text)
+    except Exception:
+        return None
+
+def main(argv=None):
+    '''Runs a re-extraction from the command line.'''
+
+    parser = argparse.ArgumentParser(description='Parse archived pages '
+                                                 'again into the cache.')
+    parser.add_argument('--kinds', nargs='+', choices=archive.KINDS,
+                        default=archive.KINDS)
+    parser.add_argument('--workers', type=int,
+                        help='parsing processes (default: one per core)')
+    parser.add_argument('--cache', help='cache file to update')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='count the changes without storing them')
+    args = parser.parse_args(argv)
+
+    store = cache.use(args.cache) if args.cache else cache.shared()
+    start = time.monotonic()
+    try:
+        counts = reextract(args.kinds, args.workers, store, args.dry_run)
+    finally:
+        store.close()
+    print('%d pages re-extracted in %.1fs, %d results %s, %d failed'
+          % (counts['parsed'], time.monotonic() - start, counts['changed'],
+             'would change' if args.dry_run else 'changed',
+             counts['failed']))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
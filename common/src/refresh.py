@@ -0,0 +1,240 @@
+''' Copyright © 2019 Shakeel Niazi
+
+This module decides how long cached ratings stay fresh and refreshes
+them in the background. Ratings move a lot in the weeks around a
+movie's release and hardly at all years later, so each movie is given
+a time to live from its age, shortened for movies whose ratings have
+kept changing and lengthened for those that never do.
+
+@author: Shakeel Niazi
+'''
+import datetime
+import os
+import threading
+import time
+
+import cache
+import network
+from instrument import metrics
+from ratings import HISTORY, RATINGS, RT_URL, cached_ratings, rating_key
+
+TRACKED = 'tracked' #Cache namespace: rating key -> [title, year, released]
+BUDGET_ENV = 'CINEVAL_REFRESH_BUDGET' #Lookups per hour, 0 turns it off
+
+BUDGET = 120 #Refresh lookups per hour
+INTERVAL = 60 #Seconds between refresh rounds
+MIN_TTL = 6*60*60
+MAX_TTL = 180*24*60*60
+RETRY_DELAY = 15*60 #Seconds before a failed lookup is retried, doubled
+                    #for every failure in a row up to MIN_TTL
+
+_DAY = 24*60*60
+
+#Time to live of ratings by the age of the movie, in days.
+_AGE_TTLS = [(14, 0.25), (60, 1), (365, 7), (3*365, 30)]
+_OLD_TTL = 90
+
+
+class Refresher:
+    '''Refresher looks up tracked movies again as their ratings expire,
+    spending at most budget lookups an hour.
+
+    Each round refreshes the most overdue movies first, with whatever
+    budget has built up since the last round. Rounds are skipped while
+    Rotten Tomatoes can't be reached, and movies whose last lookup
+    failed wait longer after each failure, so an outage doesn't spend
+    the budget on the same movies over and over.
+    '''
+
+    def __init__(self, budget=BUDGET, store=None, interval=INTERVAL):
+        '''Constructs a refresher spending budget lookups an hour on the
+        movies tracked in store, the shared DiskCache by default.
+
+        '''
+        self.budget = budget
+        self.interval = interval
+        self.store = store or cache.shared()
+        self.refreshed = 0
+
+        self._tokens = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def due(self, now=None):
+        '''Returns (title, year) for every tracked movie whose cached
+        ratings have expired, most overdue first. Movies that were
+        never looked up are left to the user.
+
+        '''
+        now = time.time() if now is None else now
+        tracked = self.store.items(TRACKED)
+        keys = [key for key, _, _ in tracked]
+        histories = self.store.get_many(HISTORY, keys)
+        rated = self.store.updated(RATINGS, keys)
+
+        overdue = []
+        for key, (title, year, released), _ in tracked:
+            if key not in histories and key not in rated:
+                continue
+            history = histories.get(key, {})
+            failures = history.get('failures', 0)
+            if failures and now - history['failed'] < retry_delay(failures):
+                continue
+            checked = max(history.get('checked', 0), rated.get(key, 0))
+            age = now - checked
+            expires = ttl(_parse_date(released), history.get('checks', 0),
+                          history.get('changes', 0))
+            if age >= expires:
+                overdue.append((age/expires, title, year))
+        overdue.sort(reverse=True)
+        return [(title, year) for _, title, year in overdue]
+
+    def refresh(self, limit):
+        '''Refreshes up to limit overdue movies. Returns the number
+        refreshed.
+
+        '''
+        if not network.available(RT_URL):
+            metrics.count('refresh.skipped')
+            return 0
+
+        done = 0
+        for title, year in self.due()[:limit]:
+            if self._stop.is_set():
+                break
+            cached_ratings(title, year, max_age=0, cancel=self._stop)
+            done += 1
+        self.refreshed += done
+        metrics.count('refresh.lookups', done)
+        return done
+
+    def start(self):
+        '''Starts refreshing on a background thread and returns the
+        refresher.
+
+        '''
+        if self.budget > 0 and self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        '''Stops refreshing after the lookup in progress.'''
+
+        self._stop.set()
+
+    def _run(self):
+        #Refreshes a round at a time, saving up to an hour's budget.
+
+        while not self._stop.wait(self.interval):
+            self._tokens = min(self.budget, self._tokens
+                               + self.budget*self.interval/3600.0)
+            if self._tokens >= 1:
+                try:
+                    self._tokens -= self.refresh(int(self._tokens))
+                except network.Cancelled:
+                    break #Stopped during a lookup
+                except Exception:
+                    metrics.count('refresh.errors')
+
+
+def ttl(released, checks=0, changes=0, today=None):
+    '''Returns the seconds ratings of a movie released on the date
+    released (or None if unknown) stay fresh, given how many times
+    they were checked and how many of those found them changed.
+
+    '''
+    today = today or datetime.date.today()
+    if released is None:
+        days = _OLD_TTL
+    else:
+        age = (today - released).days
+        days = next((days for limit, days in _AGE_TTLS if age < limit),
+                    _OLD_TTL)
+    seconds = days*_DAY
+
+    #Adjust for how often the ratings actually changed.
+    if checks >= 2:
+        rate = changes/checks
+        if rate >= 0.5:
+            seconds /= 2
+        elif rate == 0 and checks >= 3:
+            seconds *= 2
+    return max(MIN_TTL, min(MAX_TTL, seconds))
+
+def retry_delay(failures):
+    '''Returns the seconds to wait before looking up a movie again
+    after failures lookups in a row couldn't reach Rotten Tomatoes.
+
+    '''
+    return min(MIN_TTL, RETRY_DELAY*2**min(failures - 1, 16))
+
+def max_age(title, year, date=''):
+    '''Returns the seconds cached ratings of a movie stay fresh, for
+    a movie listed with the schedule date and year.
+
+    '''
+    return max_ages([(title, year, date)])[0]
+
+def max_ages(movies):
+    '''Returns max_age for each (title, year, date) of movies, reading
+    their histories from the cache at once.
+
+    '''
+    keys = [rating_key(title, year) for title, year, _ in movies]
+    histories = cache.shared().get_many(HISTORY, set(keys))
+    ages = []
+    for key, (_, year, date) in zip(keys, movies):
+        history = histories.get(key, {})
+        ages.append(ttl(release_date(date, year), history.get('checks', 0),
+                        history.get('changes', 0)))
+    return ages
+
+def track(releases):
+    '''Records the release dates of Release records so their ratings
+    are refreshed as they expire.
+
+    '''
+    cache.shared().set_many(TRACKED, [
+        (rating_key(release.title, release.year),
+         [release.title, release.year,
+          _format_date(release_date(release.date, release.year))])
+        for release in releases])
+
+def start(budget=None):
+    '''Starts a Refresher spending budget lookups an hour, or the
+    budget in CINEVAL_REFRESH_BUDGET if none is given. Returns the
+    refresher, which isn't started if the budget is 0.
+
+    '''
+    if budget is None:
+        try:
+            budget = int(os.environ.get(BUDGET_ENV, BUDGET))
+        except ValueError:
+            budget = BUDGET
+    return Refresher(budget).start()
+
+def release_date(date, year):
+    '''Returns the datetime.date of a schedule date such as
+    'May 3, 2019'. Dates that are only a season or a month fall in
+    the middle of the year. Returns None if year isn't known either.
+
+    '''
+    try:
+        return datetime.datetime.strptime(date, '%B %d, %Y').date()
+    except (TypeError, ValueError):
+        pass
+    return datetime.date(int(year), 7, 1) if str(year).isdigit() else None
+
+def _format_date(date):
+    #Returns date as an ISO string, or None.
+
+    return date.isoformat() if date is not None else None
+
+def _parse_date(text):
+    #Returns the datetime.date of an ISO string, or None.
+
+    try:
+        return datetime.date.fromisoformat(text)
+    except (TypeError, ValueError):
+        return None
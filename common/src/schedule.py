@@ -0,0 +1,224 @@
+''' Copyright © 2019 Shakeel Niazi
+
+This module scrapes the theatrical and home media release schedules
+of the-numbers.com into Release records, independently of the GUI.
+Parsed schedules are kept in memory for a while, so a schedule that
+was prefetched, or searched for moments ago, is served without
+another round trip. Every schedule fetched is also kept in the disk
+cache, where the titles module indexes it; schedules of past years no
+longer change and are served from there.
+
+@author: Shakeel Niazi
+'''
+import datetime
+import threading
+import time
+from collections import namedtuple
+from multiprocessing.pool import ThreadPool
+
+import requests
+from bs4 import BeautifulSoup
+from unidecode import unidecode
+
+import archive
+import cache
+import network
+from instrument import metrics
+from jobs import SingleFlight
+
+HOME_URL = 'https://www.the-numbers.com'
+SCHEDULE_URLS = [HOME_URL + '/movies/release-schedule',
+                 HOME_URL + '/home-market/release-schedule']
+RELEASE_TYPES = ['Theatrical', 'Home media']
+
+MONTHS = ['January', 'February', 'March', 'April', 'May', 'June', 'July',
+          'August', 'September', 'October', 'November', 'December']
+AMBIG_RELEASES = ['Spring', 'Summer', 'Fall', 'Winter', 'During', 'TBD']
+
+CACHE_TTL = 10*60 #Seconds a parsed schedule is served from memory
+SCHEDULES = 'schedules' #Cache namespace: '<type>|<year>' -> Release fields
+
+Release = namedtuple('Release', ['date', 'title', 'title_w_dist',
+                                 'distributor', 'box_office', 'year',
+                                 'href', 'release_type', 'month'])
+
+_cache = {} #(release type, year) -> (time fetched, releases)
+_cache_lock = threading.Lock()
+_flights = SingleFlight()
+
+
+def schedule_url(release_type, year=''):
+    '''Returns the url of the schedule for a release type (an index of
+    RELEASE_TYPES) and year, or the current schedule if year is empty.
+
+    '''
+    url = SCHEDULE_URLS[release_type]
+    return url + '/' + str(year) if str(year).strip() else url
+
+def get_schedule(release_type, year='', months=MONTHS, cancel=None):
+    '''Fetches and parses the schedule for a release type and year.
+
+    Returns the list of Release records for the given months, or None
+    if the schedule could not be fetched. Schedules fetched within
+    CACHE_TTL seconds are served from memory, and concurrent calls
+    for the same schedule share a single fetch.
+
+    '''
+    key = (release_type, str(year).strip())
+    with _cache_lock:
+        cached = _cache.get(key)
+    if cached is not None and time.monotonic() - cached[0] < CACHE_TTL:
+        metrics.count('schedule.cache.hits')
+        releases = cached[1]
+    else:
+        releases = _flights.do(key, lambda: _fetch_schedule(*key), cancel)
+
+    if releases is None:
+        return None
+    return [release for release in releases if release.month in months]
+
+def prefetch(release_type=0, year=''):
+    '''Fetches and caches a schedule so the next search for it is
+    served from memory. Meant to be called from a background thread.
+
+    '''
+    get_schedule(release_type, year)
+
+def _fetch_schedule(release_type, year):
+    #Fetches and parses every month of a schedule, caching the result
+    #in memory and on disk, where only past years are read back from.
+    #Returns None if the schedule could not be fetched.
+
+    disk_key = '%d|%s' % (release_type, year)
+    final = year.isdigit() and int(year) < datetime.date.today().year
+    stored = cache.shared().get(SCHEDULES, disk_key) if final else None
+    if stored is not None:
+        metrics.count('schedule.disk.hits')
+        releases = [Release(*fields) for fields in stored]
+    else:
+        url = schedule_url(release_type, year)
+        try:
+            response = network.get(url)
+        except requests.RequestException:
+            return None
+
+        if response.status_code != 200:
+            return None
+
+        response.encoding = 'UTF-8'
+        archive.save(url, response.text, SCHEDULES, disk_key)
+        releases = parse_schedule(response.text, MONTHS, release_type)
+        cache.shared().set(SCHEDULES, disk_key,
+                           [list(release) for release in releases])
+
+    with _cache_lock:
+        _cache[(release_type, year)] = (time.monotonic(), releases)
+    return releases
+
+def get_schedules(release_types, year='', months=MONTHS, cancel=None):
+    '''Fetches and parses the schedules for several release types
+    concurrently, costing about one round trip.
+
+    Returns a list holding the result of get_schedule for each release
+    type.
+
+    '''
+    if len(release_types) == 1:
+        return [get_schedule(release_types[0], year, months, cancel)]
+
+    pool = ThreadPool(len(release_types))
+    try:
+        return pool.map(lambda release_type:
+                            get_schedule(release_type, year, months, cancel),
+                        release_types)
+    finally:
+        pool.terminate()
+
+def parse_schedule(text, months=MONTHS, release_type=0):
+    '''Parses the html of a schedule page and returns the list of
+    Release records listed under the given months.
+
+    '''
+    with metrics.timer('parse.schedule.time'):
+        html = BeautifulSoup(text, 'html.parser')
+        headers = html.find_all(contains_header)
+
+        releases = []
+        for header in headers:
+            if any(month in header.string for month in months):
+                releases.extend(_releases_by_month(header, release_type))
+        return releases
+
+def merge_listings(listings):
+    '''Merges the Release records of several schedules into one list.
+
+    Home media releases of films that are also in the theatrical
+    listing take the theatrical year, so both listings of a film are
+    identified as the same movie when rated.
+
+    '''
+    theatrical_years = {}
+    for listing in listings:
+        for release in listing or []:
+            if release.release_type == RELEASE_TYPES[0]:
+                theatrical_years[normalize_title(release.title)] = release.year
+
+    merged = []
+    for listing in listings:
+        for release in listing or []:
+            year = theatrical_years.get(normalize_title(release.title))
+            if (release.release_type != RELEASE_TYPES[0] and year is not None
+                and release.year.isdigit() and year.isdigit()
+                and 0 <= int(release.year) - int(year) <= 1):
+                release = release._replace(year=year)
+            merged.append(release)
+    return merged
+
+def normalize_title(title):
+    '''Returns title in lower case without accents or punctuation.'''
+
+    return ' '.join(''.join(char if char.isalnum() else ' '
+                            for char in unidecode(title).lower()).split())
+
+def contains_header(tag):
+    '''Checks if tag contains a heading element.'''
+
+    return tag.name == 'tr' and tag.find('h3') is not None
+
+def _releases_by_month(month_header, release_type):
+    #Returns the releases listed under a month heading.
+
+    releases = []
+    row = month_header.find_next('tr')
+    date = ''
+    year = ''
+    while row is not None and not contains_header(row):
+        if not 'colspan' in row.find_next('td').attrs:
+            if 'id' in row.attrs:
+                date = str(row.find_next('td').string)
+                if not (any(release in date
+                            for release in AMBIG_RELEASES)):
+                    year = row['id'].split('-')[0]
+                    date = date + ', ' + year
+                else:
+                    year = str(month_header.string).split()[1]
+
+            title_tag = row.find_next('td').find_next('td')
+            title = title_tag.string
+            href = (title_tag.find('a').get('href')
+                    if title_tag.find('a') is not None else None)
+            distribution = title.next_element
+            distributor = title.find_next('td').string
+            distributor = (str(distributor.string)
+                           if distributor is not None else '')
+            box_office = title.find_next('td').find_next('td').string
+            title = str(title)
+            title_w_dist = title + str(distribution)
+
+            month = str(month_header.string).split()[0]
+            releases.append(Release(date, title, title_w_dist, distributor,
+                                    str(box_office), year, href,
+                                    RELEASE_TYPES[release_type], month))
+
+        row = row.find_next('tr')
+    return releases
@@ -0,0 +1,226 @@
+''' Copyright © 2019 Shakeel Niazi
+
+This module runs CinEval headless as a local HTTP service, so other
+tools can share one scraper and its warm caches instead of each
+scraping the sites themselves. Every response is JSON.
+
+Endpoints:
+    /schedule?year=&month=&type=   movies of a schedule, where type is
+                                   theatrical (default), home or both
+                                   and month is a month name or empty
+                                   for the whole year
+    /ratings?title=&year=&date=    ratings of a movie, where date is
+                                   its optional schedule date
+    /details?href=                 details from a summary page
+    /stats                         request metrics and host limiters
+
+Usage:
+    python service.py [--host 127.0.0.1] [--port 8642] [--no-warmup]
+                      [--refresh-budget LOOKUPS_PER_HOUR]
+
+@author: Shakeel Niazi
+'''
+import argparse
+import json
+import sys
+import threading
+import time
+import traceback
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import cache
+import network
+import refresh
+from enrich import fetch_details
+from instrument import metrics
+from ratings import RATINGS, RT_URL, cached_ratings, rating_key
+from schedule import (HOME_URL, MONTHS, RELEASE_TYPES, get_schedules,
+                      merge_listings, prefetch)
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8642
+
+_TYPES = {'theatrical': [0], 'home': [1], 'both': [0, 1]}
+
+
+class BadRequest(Exception):
+    '''Raised for a request with missing or invalid parameters.'''
+
+
+class UpstreamError(Exception):
+    '''Raised when a site the request needs couldn't be reached.'''
+
+
+class _Handler(BaseHTTPRequestHandler):
+    #Answers each request on a thread of its own.
+
+    server_version = 'CinEval'
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        route = url.path.strip('/') or 'stats'
+        handler = _ROUTES.get(route)
+        if handler is None:
+            self._send(404, {'error': 'Unknown endpoint /%s' % route})
+            return
+
+        params = {name: values[0]
+                  for name, values in parse_qs(url.query).items()}
+        start = time.monotonic()
+        try:
+            status, body = 200, handler(params)
+        except BadRequest as error:
+            status, body = 400, {'error': str(error)}
+        except UpstreamError as error:
+            status, body = 502, {'error': str(error)}
+        except Exception:
+            traceback.print_exc()
+            status, body = 500, {'error': 'Internal error'}
+        metrics.observe('service.%s.time' % route, time.monotonic() - start)
+        metrics.count('service.%s.status.%d' % (route, status))
+        self._send(status, body)
+
+    def log_message(self, format, *args):
+        #Requests are counted in the metrics instead of logged.
+        pass
+
+    def _send(self, status, body):
+        #Sends body as a JSON response.
+
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def schedule(params):
+    '''Returns the movies of the schedule named by the year, month and
+    type parameters, with their ratings where they are cached.
+
+    '''
+    year = params.get('year', '').strip()
+    if year and not year.isdigit():
+        raise BadRequest('year must be a number')
+
+    release_types = _TYPES.get(params.get('type', 'theatrical').lower())
+    if release_types is None:
+        raise BadRequest('type must be one of: ' + ', '.join(_TYPES))
+
+    month = params.get('month', '').strip().capitalize()
+    if month and month not in MONTHS:
+        raise BadRequest('month must be a month name')
+
+    listings = get_schedules(release_types, year,
+                             [month] if month else MONTHS)
+    if all(listing is None for listing in listings):
+        raise UpstreamError('The schedule could not be fetched.')
+
+    releases = merge_listings(listings)
+    refresh.track(releases)
+
+    store = cache.shared()
+    movies = []
+    for release in releases:
+        movie = release._asdict()
+        rated = store.get(RATINGS, rating_key(release.title, release.year))
+        movie['tomatometer'], movie['audience'], movie['rt_link'] = (
+            rated if rated is not None else (None, None, None))
+        movies.append(movie)
+    return {'count': len(movies), 'movies': movies}
+
+def ratings(params):
+    '''Returns the ratings of the movie named by the title and year
+    parameters. Cached ratings are served for as long as the GUI
+    would, which depends on the movie's age, taken from the date
+    parameter if given.
+
+    '''
+    title = params.get('title', '').strip()
+    year = params.get('year', '').strip()
+    if not title or not year.isdigit():
+        raise BadRequest('title and year are required')
+
+    max_age = refresh.max_age(title, year, params.get('date', ''))
+    critics_rating, aud_rating, url = cached_ratings(title, year, max_age)
+    return {'title': title, 'year': year, 'tomatometer': critics_rating,
+            'audience': aud_rating, 'rt_link': url}
+
+def details(params):
+    '''Returns the details of the movie whose summary page path is the
+    href parameter.
+
+    '''
+    href = params.get('href', '').strip()
+    if not href.startswith('/'):
+        raise BadRequest('href must be a path on ' + HOME_URL)
+
+    movie_details = fetch_details(href)
+    if movie_details is None:
+        raise UpstreamError('The summary page could not be fetched.')
+    return movie_details
+
+def stats(params):
+    '''Returns the metrics of the service and its host limiters.'''
+
+    body = metrics.snapshot()
+    body['hosts'] = network.stats()
+    return body
+
+_ROUTES = {'schedule': schedule, 'ratings': ratings, 'details': details,
+           'stats': stats}
+
+
+def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, warm_up=True,
+          refresh_budget=None):
+    '''Serves requests until interrupted, refreshing cached ratings in
+    the background with refresh_budget lookups an hour.
+
+    '''
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    if warm_up:
+        threading.Thread(target=_warm_up, daemon=True).start()
+    refresher = refresh.start(refresh_budget)
+
+    print('CinEval service on http://%s:%d/ (%s)'
+          % (host, port, ', '.join('/' + route for route in _ROUTES)))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        refresher.stop()
+        server.server_close()
+
+def _warm_up():
+    #Opens pooled connections to both sites and fetches the current
+    #schedules, as the GUI does when it starts.
+
+    network.preconnect(RT_URL, 2)
+    network.preconnect(HOME_URL)
+    for release_type in range(len(RELEASE_TYPES)):
+        prefetch(release_type)
+
+def main(argv=None):
+    '''Runs the service from the command line.'''
+
+    parser = argparse.ArgumentParser(description='Serve CinEval data as '
+                                                 'JSON over HTTP.')
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--cache', help='cache file to use')
+    parser.add_argument('--no-warmup', action='store_true')
+    parser.add_argument('--refresh-budget', type=int,
+                        help='rating refreshes per hour, 0 for none')
+    args = parser.parse_args(argv)
+
+    if args.cache:
+        cache.use(args.cache)
+    serve(args.host, args.port, not args.no_warmup, args.refresh_budget)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
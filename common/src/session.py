@@ -0,0 +1,61 @@
+''' Copyright © 2019 Shakeel Niazi
+
+This module saves the results CinEval shows when it closes and reads
+them back when it opens, so a session picks up where the last one
+left off without searching again. Sessions are snapshot files (see
+the snapshot module) with the state of the window added to their
+header.
+
+Set CINEVAL_NO_SESSION=1 to start with empty results.
+
+@author: Shakeel Niazi
+'''
+import os
+
+import cache
+import snapshot
+
+SESSION_ENV = 'CINEVAL_NO_SESSION' #Set to 1 to neither save nor restore
+FILE_NAME = 'session' + snapshot.EXTENSION
+
+
+def enabled():
+    '''Returns whether sessions are saved and restored.'''
+
+    return not os.environ.get(SESSION_ENV)
+
+def default_path():
+    '''Returns the path of the session file.'''
+
+    return os.path.join(cache.data_folder(), FILE_NAME)
+
+def save(records, search_params, state, path=None):
+    '''Saves records, a list of snapshot records in display order, with
+    the search_params that found them and state, a dict describing the
+    window such as its sort order and column widths. Saving no records
+    removes the session. Returns whether the session could be saved.
+
+    '''
+    path = path or default_path()
+    try:
+        if not records:
+            if os.path.exists(path):
+                os.remove(path)
+            return True
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        snapshot.save(path, records, meta={'search': search_params,
+                                           'session': state})
+    except OSError:
+        return False
+    return True
+
+def load(path=None):
+    '''Returns (records, search_params, state) of the saved session, or
+    None if there is none or it can't be read.
+
+    '''
+    try:
+        meta, records = snapshot.load(path or default_path())
+    except (OSError, snapshot.SnapshotError):
+        return None
+    return records, meta.get('search', {}), meta.get('session', {})
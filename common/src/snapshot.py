@@ -0,0 +1,135 @@
+''' Copyright © 2019 Shakeel Niazi
+
+This module reads and writes snapshot files: compact, versioned
+bundles of schedule records and their ratings. A snapshot scraped on
+one machine can be browsed on another without any network access.
+
+A snapshot file starts with a magic line and a JSON header holding
+its metadata, followed by the records stored column by column and
+compressed with zlib. Columns are packed with msgpack when it is
+installed and with JSON otherwise.
+
+@author: Shakeel Niazi
+'''
+import json
+import os
+import struct
+import time
+import zlib
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+from enrich import FIELDS as DETAIL_FIELDS
+from providers import EXTRA_FIELDS as PROVIDER_FIELDS
+from schedule import Release
+
+MAGIC = b'CINEVAL-SNAPSHOT\n'
+VERSION = 4 #Changed, with a new VERSION_FIELDS entry, whenever FIELDS
+            #changes
+FIELDS = (list(Release._fields) + ['tomatometer', 'audience', 'rt_link']
+          + DETAIL_FIELDS + PROVIDER_FIELDS)
+
+#Fields of the records of every version, in the order they were saved.
+#These never change; a new version is added instead.
+_V1_FIELDS = ['date', 'title', 'title_w_dist', 'distributor', 'box_office',
+              'year', 'href', 'release_type', 'month', 'tomatometer',
+              'audience', 'rt_link']
+VERSION_FIELDS = {
+    1: _V1_FIELDS,
+    2: _V1_FIELDS + ['budget', 'runtime', 'mpaa', 'worldwide'],
+    3: _V1_FIELDS + ['budget', 'runtime', 'mpaa', 'worldwide', 'local'],
+    4: _V1_FIELDS + ['budget', 'runtime', 'mpaa', 'worldwide'],
+}
+EXTENSION = '.cinsnap'
+
+
+class SnapshotError(Exception):
+    '''Raised when a file is not a snapshot CinEval can read.'''
+
+
+def save(path, records, meta=None):
+    '''Writes records, a list of dicts keyed by FIELDS, to a snapshot
+    file at path with the dict meta added to its header.
+
+    The file is written to a temporary file first and then moved into
+    place, so an interrupted save never leaves a truncated snapshot.
+
+    '''
+    fields = VERSION_FIELDS[VERSION]
+    columns = {field: [record.get(field) for record in records]
+               for field in fields}
+
+    if msgpack is not None:
+        encoding = 'msgpack'
+        payload = msgpack.packb(columns, use_bin_type=True)
+    else:
+        encoding = 'json'
+        payload = json.dumps(columns, separators=(',', ':')).encode('utf-8')
+
+    header = dict(meta or {})
+    header.update({'version': VERSION, 'created': time.time(),
+                   'count': len(records), 'fields': fields,
+                   'encoding': encoding})
+    header = json.dumps(header).encode('utf-8')
+
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wb') as file:
+        file.write(MAGIC)
+        file.write(struct.pack('>I', len(header)))
+        file.write(header)
+        file.write(zlib.compress(payload, 9))
+    os.replace(temp_path, path)
+
+def load(path):
+    '''Reads the snapshot file at path.
+
+    Returns (meta, records) where meta is the header dict and records
+    is a list of dicts keyed by FIELDS. Fields added after the version
+    the snapshot was written by are None. Raises SnapshotError if the
+    file isn't a snapshot or was written by a newer version.
+
+    '''
+    with open(path, 'rb') as file:
+        data = file.read()
+
+    if not data.startswith(MAGIC):
+        raise SnapshotError('Not a CinEval snapshot.')
+
+    try:
+        start = len(MAGIC)
+        (length,) = struct.unpack('>I', data[start:start + 4])
+        start += 4
+        meta = json.loads(data[start:start + length].decode('utf-8'))
+        payload = zlib.decompress(data[start + length:])
+    except (struct.error, ValueError, zlib.error):
+        raise SnapshotError('The snapshot is damaged.')
+
+    version = meta.get('version')
+    if isinstance(version, int) and version > VERSION:
+        raise SnapshotError('The snapshot was made by a newer CinEval.')
+    if version not in VERSION_FIELDS:
+        raise SnapshotError('The snapshot is damaged.')
+
+    if meta.get('encoding') == 'msgpack':
+        if msgpack is None:
+            raise SnapshotError('msgpack is needed to read the snapshot.')
+        columns = msgpack.unpackb(payload, raw=False)
+    else:
+        columns = json.loads(payload.decode('utf-8'))
+
+    fields = VERSION_FIELDS[version]
+    count = meta.get('count', 0)
+    if any(len(columns.get(field, ())) != count for field in fields):
+        raise SnapshotError('The snapshot is damaged.')
+    missing = [None]*count
+    columns = [columns[field] if field in fields else missing
+               for field in FIELDS]
+    return meta, [dict(zip(FIELDS, values)) for values in zip(*columns)]
+
+def to_release(record):
+    '''Returns the Release held in a snapshot record.'''
+
+    return Release(*[record.get(field) for field in Release._fields])
@@ -0,0 +1,402 @@
+''' Copyright © 2019 Shakeel Niazi
+
+This module provides TitleIndex, an inverted index of every schedule
+kept in the disk cache, so a movie can be found by words of its title
+or distributor across all years at once, without knowing when it was
+released and without searching the site.
+
+The index is kept in a compressed file next to the cache. An Indexer
+thread brings it up to date with the schedules fetched or crawled
+since, indexing only those, and saves it now and then, so searches
+run entirely in memory and never wait on the disk.
+
+@author: Shakeel Niazi
+'''
+import datetime
+import heapq
+import json
+import os
+import threading
+import time
+import zlib
+from bisect import bisect_left, insort
+
+import cache
+from index import tokenize
+from instrument import metrics
+from ratings import RATINGS, rating_key
+from schedule import SCHEDULES, Release
+
+FILE_NAME = 'titles.index'
+VERSION = 1 #Format of the index file, changed when it is incompatible
+
+MAX_RESULTS = 500
+LIVE_TTL = 24*60*60 #Seconds a schedule of the current or a later year
+                    #counts as indexed
+SYNC_INTERVAL = 5 #Seconds between checks for new schedules
+SAVE_INTERVAL = 60 #Seconds at least between saves of the index file
+
+#Positions of the fields of a Release
+_DATE, _TITLE, _DISTRIBUTOR, _YEAR, _TYPE = (
+    Release._fields.index(field) for field
+    in ('date', 'title', 'distributor', 'year', 'release_type'))
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+class TitleIndex:
+    '''TitleIndex maps the words of the titles, distributors and years
+    of every cached schedule to the releases they appear in.
+
+    The vocabulary is kept sorted, so every word in a search matches
+    as a prefix with a binary search. The index is safe to search from
+    several threads while it is brought up to date.
+    '''
+
+    def __init__(self, path=None, store=None):
+        '''Opens the index saved at path, by default in
+        cache.data_folder(), of the schedules in store, the shared
+        DiskCache by default. A missing or unreadable file gives an
+        empty index.
+
+        '''
+        self.path = path or os.path.join(cache.data_folder(), FILE_NAME)
+        self.store = store or cache.shared()
+        self.dirty = False #Whether the index changed since it was saved
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock() #Held by the sync in progress
+        self._clear()
+        self._load()
+
+    def sync(self):
+        '''Indexes the schedules stored or updated since the index was
+        last brought up to date and drops those that were removed.
+        Returns the number of schedules indexed.
+
+        A schedule stored again with the same releases, as the current
+        schedule is every time it is fetched, only has its time
+        updated.
+
+        '''
+        with self._sync_lock:
+            return self._sync()
+
+    def _sync(self):
+        #Brings the index up to date. Searches only wait while the
+        #index itself is changed, not while schedules are read.
+
+        updated = self.store.updated(SCHEDULES)
+        with self._lock:
+            changed = [key for key, (time_updated, _)
+                       in self._schedules.items()
+                       if time_updated != updated.get(key)]
+            new = [key for key in updated if key not in self._schedules]
+        if not changed and not new:
+            return 0
+
+        with metrics.timer('titles.sync.time'):
+            stored = self.store.get_many(SCHEDULES, changed + new)
+            indexed = 0
+            with self._lock:
+                words = set(self._words)
+                for key in changed:
+                    fields = stored.get(key)
+                    if fields is not None and fields == self._fields(key):
+                        self._schedules[key] = (updated[key],
+                                                self._schedules[key][1])
+                        continue
+                    self._remove(key)
+                    if fields is not None:
+                        self._add(key, updated[key], fields)
+                        indexed += 1
+                for key in new:
+                    if key in stored:
+                        self._add(key, updated[key], stored[key])
+                        indexed += 1
+                self._update_vocabulary(words)
+                self.dirty = True
+        metrics.count('titles.sync.schedules', indexed)
+        return indexed
+
+    def search(self, text, limit=MAX_RESULTS):
+        '''Returns the releases, newest first, with a word starting
+        with each word of text in their title, distributor or year,
+        along with the number of releases that matched before limit was
+        applied.
+
+        '''
+        words = tokenize(text)
+        if not words:
+            return [], 0
+
+        with metrics.timer('titles.search.time'), self._lock:
+            matches = None
+            for ids in sorted((self._match(word) for word in words),
+                              key=len):
+                matches = ids if matches is None else matches & ids
+                if not matches:
+                    return [], 0
+
+            #A movie listed by several schedules, such as the current
+            #schedule and that of its year, is only returned once.
+            movies = {}
+            for movie_id in matches:
+                fields = self._movies[movie_id]
+                movies[(fields[_TYPE], fields[_TITLE], fields[_YEAR],
+                        fields[_DATE])] = fields
+        newest = heapq.nlargest(limit, movies.values(),
+                                key=lambda fields: (fields[_YEAR],
+                                                    fields[_TITLE]))
+        return [Release(*fields) for fields in newest], len(movies)
+
+    def missing_years(self, years, release_types):
+        '''Returns the years of years (ints) whose schedule for some
+        release type (indexes of RELEASE_TYPES) has never been indexed.
+        Schedules of the current and later years, which still change,
+        count as indexed for LIVE_TTL seconds.
+
+        '''
+        this_year = datetime.date.today().year
+        now = time.time()
+        with self._lock:
+            missing = []
+            for year in years:
+                for release_type in release_types:
+                    key = '%d|%d' % (release_type, year)
+                    entry = self._schedules.get(key)
+                    if (entry is None or year >= this_year
+                            and now - entry[0] >= LIVE_TTL):
+                        missing.append(year)
+                        break
+            return missing
+
+    def save(self):
+        '''Writes the index file atomically if the index changed since
+        it was last saved. The index stays usable in memory if it
+        can't be written.
+
+        '''
+        #Copy the index so searches only wait for the copy, not for
+        #the file to be written.
+        with self._lock:
+            if not self.dirty:
+                return
+            data = {'version': VERSION, 'next_id': self._next_id,
+                    'schedules': dict(self._schedules),
+                    'movies': dict(self._movies),
+                    'words': {word: list(ids)
+                              for word, ids in self._words.items()}}
+            self.dirty = False
+
+        with metrics.timer('titles.save.time'):
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                temp_path = '%s.%d.tmp' % (self.path, os.getpid())
+                with open(temp_path, 'wb') as file:
+                    file.write(zlib.compress(
+                        json.dumps(data).encode('utf-8'), 6))
+                os.replace(temp_path, self.path)
+            except OSError:
+                metrics.count('titles.errors')
+                self.dirty = True
+
+    def __len__(self):
+        with self._lock:
+            return len(self._movies)
+
+    def _match(self, word):
+        #Returns the ids of the movies with a word starting with word.
+
+        ids = set()
+        i = bisect_left(self._vocabulary, word)
+        while (i < len(self._vocabulary)
+               and self._vocabulary[i].startswith(word)):
+            ids.update(self._words[self._vocabulary[i]])
+            i += 1
+        return ids
+
+    def _fields(self, key):
+        #Returns the Release fields of every release of a schedule.
+
+        return [self._movies[movie_id]
+                for movie_id in self._schedules[key][1]]
+
+    def _add(self, key, updated, releases):
+        #Indexes the releases, as lists of Release fields, of a
+        #schedule.
+
+        ids = []
+        for fields in releases:
+            movie_id = self._next_id
+            self._next_id += 1
+            self._movies[movie_id] = list(fields)
+            ids.append(movie_id)
+            for word in _words(fields):
+                self._words.setdefault(word, set()).add(movie_id)
+        self._schedules[key] = (updated, ids)
+
+    def _remove(self, key):
+        #Removes the releases of a schedule from the index.
+
+        _, ids = self._schedules.pop(key)
+        for movie_id in ids:
+            for word in _words(self._movies.pop(movie_id)):
+                movies = self._words[word]
+                movies.discard(movie_id)
+                if not movies:
+                    del self._words[word]
+
+    def _update_vocabulary(self, old_words):
+        #Brings the sorted vocabulary up to date with the words added
+        #and removed since it held old_words, sorting it again only
+        #when many words changed.
+
+        added = self._words.keys() - old_words
+        removed = old_words - self._words.keys()
+        if len(added) + len(removed) > len(self._vocabulary)//10:
+            self._vocabulary = sorted(self._words)
+            return
+        for word in removed:
+            del self._vocabulary[bisect_left(self._vocabulary, word)]
+        for word in added:
+            insort(self._vocabulary, word)
+
+    def _clear(self):
+        #Empties the index.
+
+        self._schedules = {} #Schedule key -> (time updated, movie ids)
+        self._movies = {} #Movie id -> Release fields
+        self._words = {} #Word -> set of movie ids
+        self._vocabulary = [] #Sorted words
+        self._next_id = 0
+
+    def _load(self):
+        #Reads the index file, leaving the index empty if it can't be
+        #read.
+
+        try:
+            with open(self.path, 'rb') as file:
+                data = json.loads(zlib.decompress(file.read()))
+        except (OSError, ValueError, zlib.error):
+            return
+        if data.get('version') != VERSION:
+            return
+
+        self._schedules = {key: tuple(entry)
+                           for key, entry in data['schedules'].items()}
+        self._movies = {int(movie_id): fields
+                        for movie_id, fields in data['movies'].items()}
+        self._words = {word: set(ids) for word, ids in data['words'].items()}
+        self._vocabulary = sorted(self._words)
+        self._next_id = data['next_id']
+
+
+class Indexer:
+    '''Indexer keeps a TitleIndex up to date on a background thread,
+    checking for new schedules every SYNC_INTERVAL seconds and saving
+    the index at most every SAVE_INTERVAL seconds, and once more when
+    it stops.
+    '''
+
+    def __init__(self, index=None, interval=SYNC_INTERVAL,
+                 save_interval=SAVE_INTERVAL):
+        '''Constructs an indexer of index, the shared TitleIndex by
+        default, opened once the indexer starts.
+
+        '''
+        self.index = index
+        self.interval = interval
+        self.save_interval = save_interval
+
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        '''Starts indexing on a background thread and returns the
+        indexer.
+
+        '''
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=5):
+        '''Stops indexing, waiting up to timeout seconds for the index
+        to be saved.
+
+        '''
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        #Syncs the index every interval and saves it when it changed,
+        #at most every save interval.
+
+        self.index = self.index or shared()
+        saved = time.monotonic()
+        while True:
+            try:
+                self.index.sync()
+                if (self.index.dirty
+                        and time.monotonic() - saved >= self.save_interval):
+                    self.index.save()
+                    saved = time.monotonic()
+            except Exception:
+                metrics.count('titles.errors')
+            if self._stop.wait(self.interval):
+                break
+        self.index.save()
+
+
+def _words(fields):
+    #Returns the set of words a release, as Release fields, is found
+    #by.
+
+    return set(tokenize(' '.join([fields[_TITLE], fields[_DISTRIBUTOR],
+                                  fields[_YEAR]])))
+
+def shared():
+    '''Returns the TitleIndex of the shared DiskCache, opening it on
+    first use.
+
+    '''
+    global _shared
+    with _shared_lock:
+        if _shared is None or _shared.store is not cache.shared():
+            _shared = TitleIndex()
+        return _shared
+
+def start():
+    '''Starts an Indexer of the shared TitleIndex and returns it.'''
+
+    return Indexer().start()
+
+def query_years(text):
+    '''Returns the years named in a search, as ints.'''
+
+    return sorted({int(word) for word in tokenize(text)
+                   if len(word) == 4 and word.isdigit()
+                   and 1901 < int(word) < 10000})
+
+def search_records(text, limit=MAX_RESULTS, index=None):
+    '''Searches index, the shared TitleIndex by default, and returns
+    the matches as snapshot records with their cached Rotten Tomatoes
+    ratings, along with the number of releases that matched. The index
+    isn't brought up to date first; an Indexer does that.
+
+    '''
+    index = index or shared()
+    releases, total = index.search(text, limit)
+    keys = [rating_key(release.title, release.year) for release in releases]
+    ratings = index.store.get_many(RATINGS, set(keys))
+
+    records = []
+    for release, key in zip(releases, keys):
+        record = release._asdict()
+        (record['tomatometer'], record['audience'],
+         record['rt_link']) = ratings.get(key, (None, None, None))
+        records.append(record)
+    return records, total
@@ -0,0 +1,125 @@
+''' Copyright © 2019 Shakeel Niazi
+
+This module provides UpdateQueue, which batches changes to the rows
+of a ttk Treeview so results streaming in from background work are
+drawn a frame at a time instead of with one Tk call per result.
+
+@author: Shakeel Niazi
+'''
+import threading
+import time
+import tkinter as tk
+from collections import OrderedDict
+
+from instrument import metrics
+
+FRAME_MS = 33 #Milliseconds between frames
+BUDGET_MS = 8 #Milliseconds of each frame spent applying changes
+
+
+class UpdateQueue:
+    '''UpdateQueue collects new cell values for the rows of a Treeview
+    and applies them on the Tk thread, a frame at a time.
+
+    Values can be queued from any thread. A value queued for a cell
+    that already has one waiting replaces it, so superseded values
+    never reach Tk, and all the values waiting for a row are applied
+    together. Each frame applies rows, oldest first, until its time
+    budget is spent and leaves the rest for the next frame.
+    '''
+
+    def __init__(self, tree, frame_ms=FRAME_MS, budget_ms=BUDGET_MS):
+        '''Constructs a queue for the rows of the Treeview tree.'''
+
+        self.tree = tree
+        self.frame_ms = frame_ms
+        self.budget = budget_ms/1000.0
+
+        self._columns = {column: i
+                         for i, column in enumerate(tree['columns'])}
+        self._pending = OrderedDict() #Row id -> {column: value}
+        self._lock = threading.Lock()
+        self._after = None
+
+    def set(self, row_id, values):
+        '''Queues values, a dict of column -> value, for a row.'''
+
+        with self._lock:
+            changes = self._pending.get(row_id)
+            if changes is None:
+                self._pending[row_id] = dict(values)
+                return
+            superseded = len(changes.keys() & values.keys())
+            changes.update(values)
+        if superseded:
+            metrics.count('ui.queue.superseded', superseded)
+
+    def clear(self):
+        '''Drops every change still waiting, for rows about to be
+        deleted.
+
+        '''
+        with self._lock:
+            self._pending.clear()
+
+    def flush(self):
+        '''Applies every change still waiting, before rows are read.'''
+
+        self._apply(None)
+
+    def start(self):
+        '''Starts applying changes every frame.'''
+
+        if self._after is None:
+            self._after = self.tree.after(self.frame_ms, self._frame)
+
+    def stop(self):
+        '''Stops applying changes.'''
+
+        if self._after is not None:
+            self.tree.after_cancel(self._after)
+            self._after = None
+
+    def _frame(self):
+        #Applies a frame's worth of changes and schedules the next
+        #frame.
+
+        self._apply(self.budget)
+        self._after = self.tree.after(self.frame_ms, self._frame)
+
+    def _apply(self, budget):
+        #Applies waiting changes, oldest row first, until budget
+        #seconds have passed or none are left.
+
+        if not self._pending:
+            return
+
+        start = time.monotonic()
+        applied = 0
+        while budget is None or time.monotonic() - start < budget:
+            with self._lock:
+                if not self._pending:
+                    break
+                row_id, changes = self._pending.popitem(last=False)
+            try:
+                self._write(row_id, changes)
+            except tk.TclError:
+                continue #The row was deleted
+            applied += 1
+
+        metrics.observe('ui.queue.rows', applied)
+        metrics.observe('ui.queue.frame.time', time.monotonic() - start)
+
+    def _write(self, row_id, changes):
+        #Writes the changes of a row with as few Tk calls as possible.
+
+        if len(changes) == 1:
+            (column, value), = changes.items()
+            self.tree.set(row_id, column, value)
+            return
+
+        values = list(self.tree.item(row_id, 'values'))
+        values += [''] * (len(self._columns) - len(values))
+        for column, value in changes.items():
+            values[self._columns[column]] = value
+        self.tree.item(row_id, values=values)
@@ -0,0 +1,28 @@
+''' Copyright © 2019 Shakeel Niazi
+
+Shared fixtures of the CinEval tests, which run against the modules in
+common/src without network access.
+
+@author: Shakeel Niazi
+'''
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import cache
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    '''Makes a fresh DiskCache in a temporary data folder the one shared
+    by the process.
+
+    '''
+    monkeypatch.setenv(cache.HOME_ENV, str(tmp_path))
+    monkeypatch.setattr(cache, '_shared', None)
+    shared = cache.use(os.path.join(str(tmp_path), cache.FILE_NAME))
+    yield shared
+    shared.close()
@@ -0,0 +1,49 @@
+''' Copyright © 2019 Shakeel Niazi
+
+@author: Shakeel Niazi
+'''
+import analytics
+from enrich import SUMMARIES
+from index import parse_query
+from ratings import RATINGS, rating_key
+from schedule import SCHEDULES, Release
+
+
+def release(title, year, href):
+    return list(Release('May 1, %s' % year, title, title + ' (Fox)', 'Fox',
+                        '$1,000', str(year), href, 'Theatrical', 'May'))
+
+
+def test_history_is_filtered_on_every_numeric_field(store):
+    store.set(SCHEDULES, '0|1979', [release('Alien', 1979, '/alien#tab'),
+                                    release('Other', 1979, '/other'),
+                                    release('Unknown', 1979, None)])
+    store.set(RATINGS, rating_key('Alien', '1979'), ['98%', '94%', 'link'])
+    store.set(SUMMARIES, '/alien', {'budget': '$11,000,000',
+                                    'runtime': '117 minutes', 'mpaa': 'R',
+                                    'worldwide': '$184,000,000'})
+
+    records = analytics.history_records(store)
+    index = analytics.index_records(records)
+    titles = lambda query: sorted(records[i]['title']
+                                  for i in index.search(*parse_query(query)))
+
+    assert records[0]['budget'] == '$11,000,000'
+    assert records[1]['budget'] is None
+    assert titles('budget>10m') == ['Alien']
+    assert titles('runtime>=117') == ['Alien']
+    assert titles('ww>100m tomato>90') == ['Alien']
+    assert titles('sales:1000') == ['Alien', 'Other', 'Unknown']
+    assert titles('fox') == ['Alien', 'Other', 'Unknown']
+
+def test_summary_of_loaded_and_history_rows():
+    records = [dict(zip(Release._fields, release('A', 2019, None)),
+                    tomatometer='80%', audience='60%'),
+               dict(zip(Release._fields, release('B', 2019, None)),
+                    tomatometer='90%', audience=None)]
+
+    summary = analytics.summarize(analytics.Table(records))
+
+    assert summary['count'] == 2 and summary['rated'] == 2
+    assert summary['tomatometer'] == (85.0, 85.0)
+    assert summary['gap'] == (20.0, 20.0)
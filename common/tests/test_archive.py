@@ -0,0 +1,40 @@
+''' Copyright © 2019 Shakeel Niazi
+
+@author: Shakeel Niazi
+'''
+import threading
+
+import archive
+import cache
+
+
+def test_concurrent_saves_keep_every_version(store, tmp_path):
+    url = 'https://example.com/page'
+    start = threading.Barrier(archive.MAX_VERSIONS)
+
+    def save(i):
+        #Each thread has its own connection, as a worker process would.
+        pages = archive.Archive(str(tmp_path / 'archive'),
+                                cache.DiskCache(store.path))
+        start.wait()
+        pages.save(url, 'version %d' % i, 'ratings', 'key', fetched=i)
+        pages.store.close()
+
+    threads = [threading.Thread(target=save, args=(i,))
+               for i in range(archive.MAX_VERSIONS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    versions = store.get(archive.PAGES, url)['versions']
+    assert sorted(fetched for _, fetched in versions) == list(
+        range(archive.MAX_VERSIONS))
+
+def test_saving_a_page_again_updates_its_time(store, tmp_path):
+    pages = archive.Archive(str(tmp_path / 'archive'), store)
+    first = pages.save('u', 'text', 'ratings', fetched=1)
+    pages.save('u', 'text', 'ratings', fetched=2)
+
+    assert store.get(archive.PAGES, 'u')['versions'] == [[first, 2]]
+    assert pages.load(first) == 'text'
@@ -0,0 +1,59 @@
+''' Copyright © 2019 Shakeel Niazi
+
+@author: Shakeel Niazi
+'''
+import threading
+import time
+
+import os
+
+import pytest
+
+import backends
+import cache
+
+
+def double(value, cancel=None):
+    return 2*value
+
+async def triple(value, cancel=None):
+    return 3*value
+
+def cached(key, cancel=None):
+    return os.getpid(), cache.shared().get('test', key)
+
+
+@pytest.mark.parametrize('name', sorted(backends.BACKENDS))
+def test_backends_run_lookups(name):
+    backend = backends.create(name, 2)
+    try:
+        assert backend.call(double, 21) == 42
+    finally:
+        backend.close()
+
+def test_async_backend_awaits_coroutines_and_closes():
+    before = threading.active_count()
+    backend = backends.AsyncBackend(2)
+    assert backend.call(triple, 2) == 6
+    assert backend.call(double, 2) == 4
+    loop = backend._loop
+
+    backend.close()
+
+    assert loop.is_closed()
+    deadline = time.monotonic() + 2
+    while threading.active_count() > before and time.monotonic() < deadline:
+        time.sleep(0.01) #Idle pool threads exit once they see the shutdown
+    assert threading.active_count() <= before
+    backend.close() #Closing twice is harmless
+
+def test_process_backend_workers_open_their_own_cache(store):
+    store.set('test', 'alien|1979', ['98%', '94%', 'link'])
+    backend = backends.ProcessBackend(1)
+    try:
+        pid, result = backend.call(cached, 'alien|1979')
+    finally:
+        backend.close()
+
+    assert pid != os.getpid()
+    assert result == ['98%', '94%', 'link']
@@ -0,0 +1,80 @@
+''' Copyright © 2019 Shakeel Niazi
+
+@author: Shakeel Niazi
+'''
+import extract
+from extract import find_ratings, scan_ratings
+
+FILLER = '<p>%s</p>' % ('x'*10000)
+BOARD = '<score-board tomatometerscore="%s" audiencescore="%s">'
+MOP = ('<div class="mop-ratings-wrap__half">'
+       '<span class="mop-ratings-wrap__percentage">\n%s\n</span></div>')
+MOP_AUDIENCE = ('<div class="mop-ratings-wrap__half audience-score">'
+                '<span class="mop-ratings-wrap__percentage">%s</span></div>')
+
+
+class Response:
+    #Streams a page in chunks of bytes, remembering how many were read.
+
+    def __init__(self, text):
+        self.data = text.encode('utf-8')
+        self.chunks = 0
+        self.closed = False
+
+    def iter_content(self, chunk_size):
+        for i in range(0, len(self.data), chunk_size):
+            self.chunks += 1
+            yield self.data[i:i + chunk_size]
+
+    def close(self):
+        self.closed = True
+
+
+def test_ratings_split_between_chunks():
+    page = FILLER + BOARD % ('93', '') + FILLER
+    for chunk_size in (7, 100, 1024):
+        response = Response(page)
+        ratings, _ = scan_ratings(response, chunk_size=chunk_size)
+
+        assert ratings == ('93%', 'Not rated')
+        assert response.closed
+
+def test_ratings_far_apart():
+    page = (FILLER + MOP % '91%' + FILLER*3 + MOP_AUDIENCE % '85%'
+            + FILLER)
+    ratings, _ = scan_ratings(Response(page), chunk_size=1000)
+
+    assert ratings == find_ratings(page) == ('91%', '85%')
+
+def test_score_board_is_preferred():
+    page = MOP % '91%' + FILLER*2 + BOARD % ('90', '80') + FILLER
+    ratings, _ = scan_ratings(Response(page), chunk_size=1000)
+
+    assert ratings == find_ratings(page) == ('90%', '80%')
+
+def test_reading_stops_once_both_are_found():
+    page = FILLER + BOARD % ('93', '88') + FILLER*5
+    response = Response(page)
+    ratings, text = scan_ratings(response, chunk_size=1024)
+
+    assert ratings == ('93%', '88%')
+    assert response.chunks == len(FILLER)//1024 + 1
+    assert page.startswith(text) and len(text) < len(page)
+
+    ratings, text = scan_ratings(Response(page), read_all=True)
+    assert ratings == ('93%', '88%') and text == page
+
+def test_only_new_text_is_searched(monkeypatch):
+    windows = []
+    find_parts = extract._find_parts
+    def recording(text):
+        windows.append(len(text))
+        return find_parts(text)
+    monkeypatch.setattr(extract, '_find_parts', recording)
+
+    page = FILLER*20
+    ratings, text = scan_ratings(Response(page), chunk_size=1000)
+
+    assert ratings is None and text == page
+    assert len(windows) == len(page)//1000 + 1
+    assert max(windows) <= 1000 + extract._OVERLAP
@@ -0,0 +1,75 @@
+''' Copyright © 2019 Shakeel Niazi
+
+@author: Shakeel Niazi
+'''
+import pytest
+
+from index import RecordIndex, parse_query, tokenize
+
+
+@pytest.fixture
+def index():
+    index = RecordIndex()
+    index.add('alien', 'Alien (Fox) 1979',
+              {'sales': 78900000, 'tomatometer': 98})
+    index.add('aliens', 'Aliens (Fox) 1986',
+              {'sales': 85160248, 'tomatometer': 97})
+    index.add('amelie', 'Amélie (Miramax) 2001',
+              {'sales': 33225499, 'tomatometer': 89})
+    index.add('unrated', 'An Unrated Documentary Extraordinaire 2001')
+    return index
+
+
+@pytest.mark.parametrize('text, words, ranges', [
+    ('alien', ['alien'], {}),
+    ('Amélie fox', ['amelie', 'fox'], {}),
+    ('sales>1e6', [], {'sales': (1000001, None)}),
+    ('sales > 1.5m', [], {'sales': (1500001, None)}),
+    ('box<=$2,000,000', [], {'sales': (None, 2000000)}),
+    ('tomatometer:60-80', [], {'tomatometer': (60, 80)}),
+    ('critics=90%', [], {'tomatometer': (90, 90)}),
+    ('tomato>=60 tomato<80', [], {'tomatometer': (60, 79)}),
+    ('fox aud>70', ['fox'], {'audience': (71, None)}),
+    ('budget>1b runtime<120', [], {'budget': (1000000001, None),
+                                   'runtime': (None, 119)}),
+    ('year>2000', ['year', '2000'], {}), #Not a numeric field
+])
+def test_parse_query(text, words, ranges):
+    assert parse_query(text) == (words, ranges)
+
+def test_words_match_as_prefixes_and_all_must_match(index):
+    assert index.search(['ali']) == {'alien', 'aliens'}
+    assert index.search(['alien', '1986']) == {'aliens'}
+    assert index.search(['amelie']) == {'amelie'}
+    assert index.search(['fox', 'miramax']) == set()
+    assert index.search() == {'alien', 'aliens', 'amelie', 'unrated'}
+
+def test_words_longer_than_the_indexed_prefixes(index):
+    assert len('extraordinaire') > RecordIndex.MAX_PREFIX
+    assert index.search(['extraordinaire']) == {'unrated'}
+    assert index.search(['extraordinairez']) == set()
+
+def test_ranges_and_words_together(index):
+    assert index.search(*parse_query('sales>80m')) == {'aliens'}
+    assert index.search(*parse_query('tomatometer:90-98')) == {'alien',
+                                                               'aliens'}
+    assert index.search(*parse_query('fox tomato<98')) == {'aliens'}
+    assert index.search(*parse_query('2001 sales<1e9')) == {'amelie'}
+
+def test_numbers_change_after_sorting(index):
+    index.prepare()
+    index.set_number('amelie', 'tomatometer', 99)
+    index.set_number('alien', 'tomatometer', None)
+    index.set_number('unrated', 'tomatometer', 50)
+
+    assert index.search(ranges={'tomatometer': (90, None)}) == {'aliens',
+                                                                'amelie'}
+    assert index.search(ranges={'tomatometer': (None, 60)}) == {'unrated'}
+
+def test_clear(index):
+    index.clear()
+    assert index.search() == set()
+
+def test_tokenize():
+    assert tokenize("Amélie: Le Fabuleux Destin d'Amélie") == [
+        'amelie', 'le', 'fabuleux', 'destin', 'd', 'amelie']
@@ -0,0 +1,54 @@
+''' Copyright © 2019 Shakeel Niazi
+
+@author: Shakeel Niazi
+'''
+import threading
+
+import pytest
+
+import instrument
+
+
+class BusyProfile:
+    #A profile that can't start because another profiler is active,
+    #as cProfile raises from Python 3.12.
+
+    def enable(self):
+        raise ValueError('Another profiling tool is already active')
+
+    def disable(self):
+        raise AssertionError('never enabled')
+
+
+@pytest.mark.parametrize('process_wide', [False, True])
+def test_calls_run_unprofiled_when_a_profiler_is_active(
+        monkeypatch, tmp_path, process_wide):
+    monkeypatch.setattr(instrument, '_PROCESS_WIDE', process_wide)
+    monkeypatch.setattr(instrument.cProfile, 'Profile', BusyProfile)
+    capture = instrument.ThreadCapture('test', str(tmp_path))
+    results = []
+
+    def work(i):
+        results.append(capture.call(lambda value: value*2, i))
+
+    threads = [threading.Thread(target=work, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    capture.close()
+
+    assert sorted(results) == [2*i for i in range(8)]
+    assert list(tmp_path.iterdir()) == []
+
+@pytest.mark.parametrize('process_wide', [False, True])
+def test_profiled_calls_are_reported(monkeypatch, tmp_path, process_wide):
+    monkeypatch.setattr(instrument, '_PROCESS_WIDE', process_wide)
+    capture = instrument.ThreadCapture('test', str(tmp_path))
+
+    assert [capture.call(sum, range(i)) for i in range(4)] == [0, 0, 1, 3]
+    with pytest.raises(ZeroDivisionError):
+        capture.call(lambda: 1/0)
+    capture.close()
+
+    assert {path.suffix for path in tmp_path.iterdir()} == {'.prof', '.txt'}
@@ -0,0 +1,204 @@
+''' Copyright © 2019 Shakeel Niazi
+
+@author: Shakeel Niazi
+'''
+import threading
+import time
+
+import pytest
+
+from instrument import metrics
+from jobs import RatingJob, SingleFlight
+from network import Cancelled
+
+
+def wait(job, timeout=5):
+    #Waits for a job to finish and returns its results.
+
+    deadline = time.monotonic() + timeout
+    while not job.finished and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert job.finished
+    return job.results()
+
+
+def run(target, *args):
+    #Runs target on a thread of its own and returns the thread.
+
+    thread = threading.Thread(target=target, args=args, daemon=True)
+    thread.start()
+    return thread
+
+
+def until(condition, timeout=5):
+    #Waits for condition() to hold.
+
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert condition()
+
+
+def waiting():
+    #Returns the number of calls that have waited for a call in flight.
+
+    return metrics.snapshot()['counters'].get('flights.shared', 0)
+
+
+def test_one_call_in_flight_per_key_shares_its_result():
+    flights = SingleFlight()
+    release = threading.Event()
+    calls = []
+    results = []
+    def fetch():
+        calls.append(1)
+        release.wait(5)
+        return ['98%', '94%']
+
+    shared = waiting()
+    threads = [run(lambda: results.append(flights.do('alien', fetch)))
+               for _ in range(5)]
+    until(lambda: waiting() == shared + 4)
+    assert flights.do('aliens', lambda: 'other') == 'other'
+    assert flights.in_flight() == 1
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert results == [['98%', '94%']]*5
+    assert flights.in_flight() == 0
+
+def test_errors_are_shared():
+    flights = SingleFlight()
+    release = threading.Event()
+    errors = []
+    def fetch():
+        release.wait(5)
+        raise ValueError('parser broke')
+    def call():
+        try:
+            flights.do('alien', fetch)
+        except ValueError as error:
+            errors.append(error)
+
+    shared = waiting()
+    threads = [run(call) for _ in range(3)]
+    until(lambda: waiting() == shared + 2)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(errors) == 3 and len(set(map(id, errors))) == 1
+
+def test_cancelled_waiters_stop_waiting():
+    flights = SingleFlight()
+    release = threading.Event()
+    leader = run(flights.do, 'alien', lambda: release.wait(5))
+    until(lambda: flights.in_flight() == 1)
+    cancel = threading.Event()
+    cancel.set()
+
+    with pytest.raises(Cancelled):
+        flights.do('alien', lambda: 'never run', cancel)
+    assert flights.in_flight() == 1
+    release.set()
+    leader.join(5)
+
+def test_a_waiter_takes_over_a_cancelled_call():
+    flights = SingleFlight()
+    release = threading.Event()
+    def cancelled():
+        release.wait(5)
+        raise Cancelled()
+    def call():
+        with pytest.raises(Cancelled):
+            flights.do('alien', cancelled)
+
+    leader = run(call)
+    until(lambda: flights.in_flight() == 1)
+    results = []
+    shared = waiting()
+    waiter = run(lambda: results.append(flights.do('alien', lambda: 'own')))
+    until(lambda: waiting() == shared + 1)
+    release.set()
+    leader.join(5)
+    waiter.join(5)
+
+    assert results == ['own']
+
+def test_jobs_share_lookups_of_the_same_movie():
+    flights = SingleFlight()
+    release = threading.Event()
+    calls = []
+    def fetch(key):
+        calls.append(key)
+        release.wait(5)
+        return key.upper()
+    def lookup(item, cancel):
+        row, key = item
+        return row, flights.do(key, lambda: fetch(key), cancel)
+
+    shared = waiting()
+    job = RatingJob(lookup, [(1, 'alien'), (2, 'alien'), (3, 'aliens')],
+                    workers=3).start()
+    until(lambda: len(calls) == 2 and waiting() == shared + 1)
+    release.set()
+
+    assert sorted(wait(job)) == [(1, 'ALIEN'), (2, 'ALIEN'), (3, 'ALIENS')]
+    assert sorted(calls) == ['alien', 'aliens']
+
+def test_cancelled_jobs_stop_and_discard_results():
+    started = []
+    def lookup(item, cancel):
+        started.append(item)
+        if cancel.wait(5):
+            raise Cancelled()
+        return item
+
+    job = RatingJob(lookup, list(range(10)), workers=2).start()
+    until(lambda: len(started) == 2)
+    job.cancel()
+
+    assert wait(job) == []
+    assert job.cancelled and len(started) == 2
+    assert not job.extend([10])
+
+def test_items_are_looked_up_by_rank_which_can_change():
+    ranks = {'a': 3, 'b': 2, 'c': 1, 'd': 0}
+    release = threading.Event()
+    order = []
+    def lookup(item, cancel):
+        order.append(item)
+        if item == 'first':
+            release.wait(5)
+        return item
+
+    job = RatingJob(lookup, ['first'], priority=lambda item:
+                    ranks.get(item, -1)).start()
+    until(lambda: order)
+    assert job.extend(['a', 'b', 'c', 'd'])
+
+    #Selecting 'a' ranks it first.
+    ranks['a'] = -1
+    job.reprioritize()
+    release.set()
+    wait(job)
+
+    assert order == ['first', 'a', 'd', 'c', 'b']
+
+def test_failed_lookups_deliver_the_error_result():
+    def lookup(item, cancel):
+        if item == 'broken':
+            raise RuntimeError('parser broke')
+        return item, 'rated'
+
+    job = RatingJob(lookup, ['alien', 'broken'], workers=2,
+                    on_error=lambda item: (item, 'unavailable')).start()
+
+    assert sorted(wait(job)) == [('alien', 'rated'),
+                                 ('broken', 'unavailable')]
+    assert job.progress()['failures'] == 1
+
+    job = RatingJob(lookup, ['alien', 'broken']).start()
+    assert wait(job) == [('alien', 'rated')]
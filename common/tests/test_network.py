@@ -0,0 +1,144 @@
+''' Copyright © 2019 Shakeel Niazi
+
+@author: Shakeel Niazi
+'''
+import types
+
+import pytest
+
+import network
+from network import AdaptiveLimiter, CircuitBreaker, CircuitOpen
+
+
+class Clock:
+    #A monotonic clock the tests move forward by hand.
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+class Response:
+    #A response of the fake host.
+
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.content = b''
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(network, 'time',
+                        types.SimpleNamespace(monotonic=clock.monotonic))
+    return clock
+
+
+def test_limit_grows_only_while_saturated(clock):
+    limiter = AdaptiveLimiter('test', initial_limit=4)
+    for _ in range(50):
+        limiter.acquire()
+        limiter.release(0.1, 'ok')
+    assert limiter.limit == 4
+
+    for _ in range(4):
+        limiter.acquire()
+    for _ in range(4):
+        limiter.release(0.1, 'ok')
+    assert limiter.limit == 4.25
+
+def test_slow_responses_do_not_grow_the_limit(clock):
+    limiter = AdaptiveLimiter('test', initial_limit=1)
+    limiter.acquire()
+    limiter.release(0.1, 'ok')
+    limiter.acquire()
+    limiter.release(1.0, 'ok')
+
+    assert limiter.limit == 2
+
+def test_limit_halves_once_per_round_trip(clock):
+    limiter = AdaptiveLimiter('test', initial_limit=8)
+    for _ in range(3):
+        limiter.acquire()
+    limiter.release(0.5, 'error')
+    limiter.release(0.5, 'timeout')
+    assert limiter.limit == 4
+
+    clock.now += 1
+    limiter.release(0.5, 'throttled', retry_after=30)
+    assert limiter.limit == 2
+    assert limiter.snapshot()['cooldown'] == 30
+
+    clock.now += 30
+    for _ in range(10):
+        clock.now += 1
+        limiter.acquire()
+        limiter.release(0.5, 'timeout')
+    assert limiter.limit == AdaptiveLimiter.MIN_LIMIT
+
+def test_breaker_opens_probes_and_closes(clock):
+    breaker = CircuitBreaker('test')
+    for _ in range(CircuitBreaker.FAILURE_THRESHOLD):
+        breaker.allow()
+        breaker.record(False)
+    assert breaker.state == 'open'
+    with pytest.raises(CircuitOpen):
+        breaker.allow()
+
+    #A failed probe reopens it for twice as long.
+    clock.now += CircuitBreaker.RESET_TIMEOUT
+    breaker.allow()
+    assert breaker.state == 'half-open'
+    with pytest.raises(CircuitOpen):
+        breaker.allow() #Only one probe at a time
+    breaker.record(False)
+    assert breaker.state == 'open'
+    clock.now += CircuitBreaker.RESET_TIMEOUT
+    assert not breaker.available()
+
+    clock.now += CircuitBreaker.RESET_TIMEOUT
+    breaker.allow()
+    breaker.record(True)
+    assert breaker.state == 'closed' and breaker.failures == 0
+    breaker.allow()
+
+def test_abandoned_probes_let_another_through(clock):
+    breaker = CircuitBreaker('test')
+    for _ in range(CircuitBreaker.FAILURE_THRESHOLD):
+        breaker.record(False)
+    clock.now += CircuitBreaker.RESET_TIMEOUT
+    breaker.allow()
+    breaker.abandon()
+
+    breaker.allow()
+    assert breaker.state == 'half-open'
+
+def test_retried_responses_are_closed(monkeypatch):
+    responses = [Response(503, {'Retry-After': '0'}),
+                 Response(429, {'Retry-After': '0'}), Response(200)]
+    answers = iter(responses)
+    monkeypatch.setattr(network._session, 'get',
+                        lambda url, **kwargs: next(answers))
+
+    response = network.get('https://retry.test/page', stream=True)
+
+    assert response is responses[2] and not response.closed
+    assert responses[0].closed and responses[1].closed
+
+def test_last_failed_response_is_returned_open(monkeypatch):
+    responses = [Response(503, {'Retry-After': '0'}) for _ in range(2)]
+    answers = iter(responses)
+    monkeypatch.setattr(network._session, 'get',
+                        lambda url, **kwargs: next(answers))
+
+    response = network.get('https://failing.test/page', retries=1)
+
+    assert response is responses[1] and not response.closed
+    assert responses[0].closed
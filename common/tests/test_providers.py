@@ -0,0 +1,138 @@
+''' Copyright © 2019 Shakeel Niazi
+
+@author: Shakeel Niazi
+'''
+import hashlib
+import threading
+import time
+
+import pytest
+
+import cache
+import network
+import providers
+from instrument import metrics
+from providers import Provider
+from ratings import rating_key
+
+
+class LocalProvider(Provider):
+    '''LocalProvider makes up a score for every movie from its title
+    and year, without any network access. It behaves like a real
+    provider, with its own cache, a lookup delay and movies it can't
+    find.
+
+    Class Attributes:
+        DELAY: seconds each lookup takes
+        MISS_RATE: share of movies that aren't found
+    '''
+    NAME = 'local'
+    COLUMNS = ['Local Score']
+    FIELDS = ['local']
+    CONCURRENCY = 8
+    NAMESPACE = 'ratings.local' #Cache namespace: rating key -> result
+    TTL = 7*24*60*60
+    DELAY = 0.0
+    MISS_RATE = 0.1
+
+    def fetch(self, title, year, max_age, cancel):
+        key = rating_key(title, year)
+        entry = cache.shared().get_entry(LocalProvider.NAMESPACE, key)
+        max_age = LocalProvider.TTL if max_age is None else max_age
+        if entry is not None and time.time() - entry[1] < max_age:
+            metrics.count('providers.local.cache.hits')
+            return tuple(entry[0])
+
+        if (cancel or threading.Event()).wait(LocalProvider.DELAY):
+            raise network.Cancelled()
+        text = self._page(key)
+        if text is None:
+            return ('N/A', None)
+
+        result = (text.rpartition('score: ')[2].strip(), 'local:' + key)
+        cache.shared().set(LocalProvider.NAMESPACE, key, list(result))
+        return result
+
+    def _page(self, key):
+        #Returns the made up page of a movie, or None if it isn't
+        #found.
+
+        digest = hashlib.sha1(key.encode('utf-8')).digest()
+        if digest[0] < 256*LocalProvider.MISS_RATE:
+            return None
+        return 'title: %s\nscore: %d%%\n' % (key, digest[1]*100//255)
+
+
+class Broken(Provider):
+    NAME = 'broken'
+    FIELDS = ['broken']
+
+    def fetch(self, title, year, max_age, cancel):
+        raise RuntimeError('parser broke')
+
+
+class OtherLocal(LocalProvider):
+    NAME = 'other'
+
+
+@pytest.fixture
+def registry(store, monkeypatch):
+    monkeypatch.setattr(providers, '_instances', {})
+    monkeypatch.setitem(providers.PROVIDERS, LocalProvider.NAME,
+                        LocalProvider)
+    monkeypatch.setitem(providers.PROVIDERS, Broken.NAME, Broken)
+    monkeypatch.setitem(providers.PROVIDERS, OtherLocal.NAME, OtherLocal)
+    return providers.PROVIDERS
+
+
+def test_results_follow_the_order_of_the_names(registry):
+    for names in (['local', 'broken', 'other'], ['other', 'local']):
+        results = providers.lookup_all(names, 'Alien', '1979')
+        assert list(results) == names
+
+def test_a_failing_provider_only_fails_its_own_result(registry):
+    for names in (['broken', 'local'], ['local', 'broken']):
+        results = providers.lookup_all(names, 'Alien', '1979')
+
+        assert results['broken'] == ('Unavailable', None)
+        score, url = results['local']
+        assert score.endswith('%') and url == 'local:alien|1979'
+
+def test_providers_are_asked_at_once(registry, monkeypatch):
+    monkeypatch.setattr(LocalProvider, 'DELAY', 0.3)
+
+    start = time.monotonic()
+    results = providers.lookup_all(['local', 'other'], 'Alien', '1979')
+
+    assert time.monotonic() - start < 0.55
+    assert results['local'] == results['other']
+
+def test_lookups_are_cached(registry, monkeypatch):
+    first = providers.get('local').lookup('Alien', '1979')
+    monkeypatch.setattr(LocalProvider, '_page', None) #Can't fetch again
+
+    assert providers.get('local').lookup('Alien', '1979') == first
+    with pytest.raises(TypeError):
+        providers.get('local').lookup('Alien', '1979', max_age=0)
+
+def test_movies_that_are_not_found(registry, monkeypatch):
+    monkeypatch.setattr(LocalProvider, 'MISS_RATE', 1.0)
+
+    assert providers.get('local').lookup('Alien', '1979') == ('N/A', None)
+
+def test_cancelled_lookups_raise(registry, monkeypatch):
+    monkeypatch.setattr(LocalProvider, 'DELAY', 5.0)
+    cancel = threading.Event()
+    threading.Timer(0.05, cancel.set).start()
+
+    with pytest.raises(network.Cancelled):
+        providers.lookup_all(['local', 'other'], 'Alien', '1979',
+                             cancel=cancel)
+
+def test_enabled_providers(registry, monkeypatch):
+    monkeypatch.setenv(providers.PROVIDERS_ENV, 'local, rt,local')
+
+    assert [p.NAME for p in providers.enabled()] == ['local', 'rt']
+    assert [p.NAME for p in providers.enabled('other')] == ['other']
+    with pytest.raises(ValueError):
+        providers.enabled('imdb')
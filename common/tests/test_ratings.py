@@ -0,0 +1,101 @@
+''' Copyright © 2019 Shakeel Niazi
+
+@author: Shakeel Niazi
+'''
+import json
+
+import pytest
+
+import network
+import ratings
+from ratings import MATCHES, MOVIE_URL, RATINGS, SEARCH_URL, UNAVAILABLE
+
+PAGE = '<score-board tomatometerscore="98" audiencescore="94">'
+
+
+class Response:
+    #A streamed response of the fake site.
+
+    def __init__(self, status_code, text=''):
+        self.status_code = status_code
+        self.text = text
+        self.closed = False
+
+    def iter_content(self, chunk_size):
+        yield self.text.encode('utf-8')
+
+    def json(self):
+        return json.loads(self.text)
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def site(store, monkeypatch):
+    #Maps urls to the (status, text) the site answers them with; other
+    #urls aren't found.
+
+    pages = {}
+    def get(url, cancel=None, **kwargs):
+        return Response(*pages.get(url, (404, '')))
+    monkeypatch.setattr(network, 'get', get)
+    return pages
+
+
+def search(*movies):
+    return 200, json.dumps({'movies': [{'name': name, 'year': year,
+                                        'url': '/m/' + slug}
+                                       for name, year, slug in movies]})
+
+
+def test_pages_found_by_their_title(site, store):
+    site[MOVIE_URL + 'Alien'] = (200, PAGE)
+
+    assert ratings.cached_ratings('Alien', '1979') == ('98%', '94%',
+                                                       MOVIE_URL + 'Alien')
+    assert store.get(RATINGS, 'alien|1979') == ['98%', '94%',
+                                                MOVIE_URL + 'Alien']
+
+def test_movies_that_are_not_found(site, store):
+    site[SEARCH_URL] = search()
+
+    assert ratings.search_ratings('Alien', '1979') == ('N/A', 'N/A', None)
+    assert store.get_entry(MATCHES, 'alien|1979')[0] is None
+
+@pytest.mark.parametrize('status', [429, 500, 503])
+def test_failing_site_is_unavailable_not_missing(site, store, status):
+    site[MOVIE_URL + 'Alien'] = (status, '')
+
+    assert ratings.cached_ratings('Alien', '1979') == UNAVAILABLE
+    assert store.get(RATINGS, 'alien|1979') is None
+    assert store.get(MATCHES, 'alien|1979') is None
+
+@pytest.mark.parametrize('answer', [(503, ''), (200, '{}'),
+                                    (200, 'not json')])
+def test_failing_search_is_unavailable(site, store, answer):
+    site[SEARCH_URL] = answer
+
+    assert ratings.cached_ratings('Alien', '1979') == UNAVAILABLE
+    assert store.get_entry(MATCHES, 'alien|1979') is None
+
+def test_matched_page_failing(site, store):
+    site[SEARCH_URL] = search(('Alien', 1979, 'alien_1979_film'))
+    site[MOVIE_URL + 'alien_1979_film'] = (502, '')
+
+    assert ratings.search_ratings('Alien', '1979') == UNAVAILABLE
+
+def test_best_match_compares_whole_words():
+    candidates = [('Pups', '2009', 'pups'), ('Hitch', '2005', 'hitch')]
+    assert ratings.best_match('Up', '2009', candidates) is None
+    assert ratings.best_match('It', '2005', candidates) is None
+
+    candidates = [('Up', '2009', 'up'), ('Pups', '2009', 'pups')]
+    assert ratings.best_match('Up', '2009', candidates) == 'up'
+
+def test_best_match_containment_needs_the_year():
+    candidates = [('The Thing from Another World', '1951', 'thing_1951')]
+    assert ratings.best_match('The Thing', '1951', candidates) == (
+        'thing_1951')
+    assert ratings.best_match('The Thing', '1982', candidates) is None
+    assert ratings.best_match('The Thing', '', candidates) is None
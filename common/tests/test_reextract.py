@@ -0,0 +1,35 @@
+''' Copyright © 2019 Shakeel Niazi
+
+@author: Shakeel Niazi
+'''
+import archive
+import reextract
+from schedule import SCHEDULES
+
+SCHEDULE_PAGE = '''<table>
+<tr><td><h3>January 2019</h3></td></tr>
+<tr id="2019-01-11"><td>January 11</td><td><a href="/movie/A">A Movie</a></td>
+<td>Fox</td><td>$1,000</td></tr>
+</table>'''
+
+#A month heading followed by a row the parser can't read.
+CORRUPT_PAGE = '''<table>
+<tr><td><h3>January 2019</h3></td></tr>
+<tr id="2019-01-11"></tr>
+</table>'''
+
+
+def test_corrupt_page_is_counted_as_failed(store):
+    pages = archive.Archive(store=store)
+    pages.save('https://example.com/good', SCHEDULE_PAGE, SCHEDULES,
+               '0|2019')
+    pages.save('https://example.com/bad', CORRUPT_PAGE, SCHEDULES,
+               '0|2018')
+
+    counts = reextract.reextract([SCHEDULES], workers=1, store=store,
+                                 report=lambda message: None)
+
+    assert counts['failed'] == 1
+    assert counts['parsed'] == 1
+    assert store.get(SCHEDULES, '0|2018') is None
+    assert store.get(SCHEDULES, '0|2019')[0][1] == 'A Movie'
@@ -0,0 +1,105 @@
+''' Copyright © 2019 Shakeel Niazi
+
+@author: Shakeel Niazi
+'''
+import time
+
+import network
+import ratings
+import refresh
+from instrument import metrics
+from ratings import HISTORY, RATINGS, UNAVAILABLE, rating_key
+
+OLD = ['Alien', '1979', '1979-05-25']
+NEW = ['Aliens', '1986', '1986-07-18']
+
+
+def track(store, *movies):
+    store.set_many(refresh.TRACKED, [(rating_key(title, year),
+                                      [title, year, released])
+                                     for title, year, released in movies])
+
+
+def test_due_lists_expired_movies_most_overdue_first(store):
+    track(store, OLD, NEW, ['Never Rated', '2019', None])
+    now = time.time()
+    store.set(HISTORY, rating_key('Alien', '1979'),
+              {'checks': 0, 'changes': 0, 'checked': now - 200*86400})
+    store.set(HISTORY, rating_key('Aliens', '1986'),
+              {'checks': 0, 'changes': 0, 'checked': now - 100*86400})
+
+    assert refresh.Refresher(store=store).due(now) == [('Alien', '1979'),
+                                                       ('Aliens', '1986')]
+
+def test_failed_lookups_back_off(store, monkeypatch):
+    track(store, OLD)
+    key = rating_key('Alien', '1979')
+    monkeypatch.setattr(ratings, 'search_ratings',
+                        lambda title, year, cancel=None: UNAVAILABLE)
+    refresher = refresh.Refresher(store=store)
+
+    assert ratings.cached_ratings('Alien', '1979') == UNAVAILABLE
+    assert store.get(HISTORY, key)['failures'] == 1
+    failed = store.get(HISTORY, key)['failed']
+    assert refresher.due(failed + refresh.RETRY_DELAY - 1) == []
+    assert refresher.due(failed + refresh.RETRY_DELAY) == [('Alien', '1979')]
+
+    ratings.cached_ratings('Alien', '1979')
+    failed = store.get(HISTORY, key)['failed']
+    assert refresher.due(failed + refresh.RETRY_DELAY) == []
+    assert refresher.due(failed + 2*refresh.RETRY_DELAY) == [('Alien',
+                                                              '1979')]
+    assert refresh.retry_delay(100) == refresh.MIN_TTL
+
+    #A lookup that gets through clears the failures.
+    monkeypatch.setattr(ratings, 'search_ratings',
+                        lambda title, year, cancel=None: ('91%', '80%',
+                                                          'link'))
+    ratings.cached_ratings('Alien', '1979')
+    assert store.get(HISTORY, key)['failures'] == 0
+    assert refresher.due(time.time() + 200*86400) == [('Alien', '1979')]
+
+def test_stale_ratings_are_served_when_a_lookup_fails(store, monkeypatch):
+    key = rating_key('Alien', '1979')
+    store.set(RATINGS, key, ['90%', '80%', 'link'])
+    monkeypatch.setattr(ratings, 'search_ratings',
+                        lambda title, year, cancel=None: UNAVAILABLE)
+
+    assert ratings.cached_ratings('Alien', '1979', max_age=0)[0] == '90%'
+    assert store.get(HISTORY, key)['failures'] == 1
+
+def test_rounds_are_skipped_while_the_site_is_down(store, monkeypatch):
+    track(store, OLD)
+    store.set(HISTORY, rating_key('Alien', '1979'),
+              {'checks': 0, 'changes': 0, 'checked': 0})
+    looked_up = []
+    monkeypatch.setattr(refresh, 'cached_ratings',
+                        lambda *args, **kwargs: looked_up.append(args))
+    monkeypatch.setattr(network, 'available', lambda url: False)
+
+    assert refresh.Refresher(store=store).refresh(10) == 0
+    assert looked_up == []
+
+def test_max_ages_reads_histories_at_once(store):
+    store.set(HISTORY, rating_key('Alien', '1979'),
+              {'checks': 4, 'changes': 0, 'checked': time.time()})
+    movies = [('Alien', '1979', 'May 25, 1979'), ('Aliens', '1986', ''),
+              ('Alien', '1979', 'May 25, 1979')]
+
+    ages = refresh.max_ages(movies)
+
+    assert ages == [refresh.max_age(*movie) for movie in movies]
+    assert ages[0] == 2*ages[1] == refresh.MAX_TTL
+
+def test_stopping_during_a_lookup_is_not_an_error(store, monkeypatch):
+    def refresh_round(self, limit):
+        self.stop()
+        raise network.Cancelled()
+    monkeypatch.setattr(refresh.Refresher, 'refresh', refresh_round)
+    errors = metrics.snapshot()['counters'].get('refresh.errors', 0)
+
+    refresher = refresh.Refresher(budget=3600, store=store, interval=0.01)
+    refresher.start()._thread.join(5)
+
+    assert not refresher._thread.is_alive()
+    assert metrics.snapshot()['counters'].get('refresh.errors', 0) == errors
@@ -0,0 +1,58 @@
+''' Copyright © 2019 Shakeel Niazi
+
+@author: Shakeel Niazi
+'''
+import json
+import threading
+import urllib.error
+import urllib.request
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+import refresh
+import service
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), service._Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield 'http://127.0.0.1:%d/' % httpd.server_address[1]
+    httpd.shutdown()
+    httpd.server_close()
+
+def get(url):
+    try:
+        with urllib.request.urlopen(url, timeout=5) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as error:
+        return error.code, json.loads(error.read())
+
+def fail_with(error):
+    def route(params):
+        raise error
+    return route
+
+
+@pytest.mark.parametrize('error, status', [
+    (service.BadRequest('bad'), 400),
+    (service.UpstreamError('down'), 502),
+    (KeyError('bug'), 500),
+    (IndexError('bug'), 500),
+    (RuntimeError('bug'), 500)])
+def test_errors_map_to_statuses(server, monkeypatch, error, status):
+    monkeypatch.setitem(service._ROUTES, 'stats', fail_with(error))
+
+    assert get(server + 'stats')[0] == status
+
+def test_ratings_use_the_age_aware_ttl(server, store, monkeypatch):
+    calls = []
+    monkeypatch.setattr(service, 'cached_ratings',
+                        lambda title, year, max_age: calls.append(max_age)
+                        or ('90%', '80%', 'link'))
+
+    status, body = get(server + 'ratings?title=Alien&year=1979')
+
+    assert status == 200 and body['tomatometer'] == '90%'
+    assert calls == [refresh.max_age('Alien', '1979')]
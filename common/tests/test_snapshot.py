@@ -0,0 +1,123 @@
+''' Copyright © 2019 Shakeel Niazi
+
+@author: Shakeel Niazi
+'''
+import json
+import os
+import struct
+import zlib
+
+import pytest
+
+import session
+import snapshot
+from schedule import Release
+
+
+def record(title, **fields):
+    record = dict.fromkeys(snapshot.FIELDS)
+    record.update(zip(Release._fields,
+                      ['May 25, 1979', title, title + ' (Fox)', 'Fox',
+                       '$78,900,000', '1979', '/movie/' + title,
+                       'Theatrical', 'May']))
+    record.update(fields)
+    return record
+
+
+def test_snapshot_round_trip(tmp_path):
+    path = str(tmp_path / ('test' + snapshot.EXTENSION))
+    records = [record('Alien', tomatometer='98%', audience='94%',
+                      rt_link='link', budget='$11,000,000'),
+               record('Amélie')]
+
+    snapshot.save(path, records, meta={'search': {'year': '1979'}})
+    meta, loaded = snapshot.load(path)
+
+    assert loaded == records
+    assert meta['search'] == {'year': '1979'}
+    assert meta['count'] == 2
+    assert snapshot.to_release(loaded[0]).title == 'Alien'
+
+def test_version_matches_the_fields():
+    #A change to FIELDS needs a new VERSION and VERSION_FIELDS entry.
+    assert snapshot.VERSION_FIELDS[snapshot.VERSION] == snapshot.FIELDS
+    assert sorted(snapshot.VERSION_FIELDS) == list(
+        range(1, snapshot.VERSION + 1))
+
+def test_layout_does_not_follow_new_fields(tmp_path, monkeypatch):
+    path = str(tmp_path / 'test')
+    records = [record('Alien', budget='$11,000,000')]
+    snapshot.save(path, records)
+    monkeypatch.setattr(snapshot, 'FIELDS', snapshot.FIELDS + ['other'])
+
+    assert snapshot.load(path)[1] == [dict(records[0], other=None)]
+
+def test_files_that_are_not_snapshots(tmp_path):
+    path = tmp_path / 'other'
+    path.write_bytes(b'not a snapshot')
+    with pytest.raises(snapshot.SnapshotError):
+        snapshot.load(str(path))
+
+    path.write_bytes(snapshot.MAGIC + b'\x00\x00\x00\x05{}')
+    with pytest.raises(snapshot.SnapshotError):
+        snapshot.load(str(path))
+
+def write(path, version, columns, count=1):
+    #Writes a snapshot as the given version of CinEval did.
+
+    header = json.dumps({'version': version, 'count': count,
+                         'encoding': 'json'}).encode('utf-8')
+    with open(path, 'wb') as file:
+        file.write(snapshot.MAGIC + struct.pack('>I', len(header)) + header)
+        file.write(zlib.compress(json.dumps(columns).encode('utf-8')))
+
+def test_snapshots_of_older_versions(tmp_path):
+    path = str(tmp_path / 'old')
+    old = record('Alien', tomatometer='98%', audience='94%', rt_link='link')
+    write(path, 1, {field: [old[field]]
+                    for field in snapshot.VERSION_FIELDS[1]})
+
+    assert snapshot.load(path)[1] == [old]
+
+    old['budget'] = '$11,000,000'
+    write(path, 2, {field: [old[field]]
+                    for field in snapshot.VERSION_FIELDS[2]})
+
+    assert snapshot.load(path)[1] == [old]
+
+    #Fields that were dropped since are left out.
+    write(path, 3, {field: [old.get(field, '70%')]
+                    for field in snapshot.VERSION_FIELDS[3]})
+
+    assert snapshot.load(path)[1] == [old]
+
+def test_snapshots_of_unknown_versions(tmp_path):
+    path = str(tmp_path / 'other')
+    columns = {field: ['x'] for field in snapshot.FIELDS}
+    write(path, snapshot.VERSION + 1, columns)
+    with pytest.raises(snapshot.SnapshotError, match='newer'):
+        snapshot.load(path)
+
+    for version in (0, '3', None):
+        write(path, version, columns)
+        with pytest.raises(snapshot.SnapshotError, match='damaged'):
+            snapshot.load(path)
+
+def test_snapshots_missing_a_field_of_their_version(tmp_path):
+    path = str(tmp_path / 'damaged')
+    write(path, 2, {field: ['x'] for field in snapshot.VERSION_FIELDS[1]})
+    with pytest.raises(snapshot.SnapshotError):
+        snapshot.load(path)
+
+def test_session_round_trip(store, tmp_path):
+    state = {'sort': ['Title', True], 'widths': {'Title': 300},
+             'filter': 'fox', 'revalidate': False}
+    records = [record('Alien', tomatometer='98%')]
+
+    assert session.save(records, {'year': '1979'}, state)
+    assert session.load() == (records, {'year': '1979'}, state)
+
+    #Closing with no results starts the next session empty.
+    assert session.save([], {}, state)
+    assert not os.path.exists(session.default_path())
+    assert session.load() is None
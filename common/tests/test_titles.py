@@ -0,0 +1,96 @@
+''' Copyright © 2019 Shakeel Niazi
+
+@author: Shakeel Niazi
+'''
+import datetime
+
+import titles
+from ratings import RATINGS, rating_key
+from schedule import SCHEDULES, Release
+
+
+def release(title, year, distributor='Fox', release_type='Theatrical'):
+    return list(Release('January 1, %s' % year, title,
+                        '%s (%s)' % (title, distributor), distributor,
+                        '$1', str(year), '/movie/' + title, release_type,
+                        'January'))
+
+def open_index(store, tmp_path):
+    return titles.TitleIndex(str(tmp_path / titles.FILE_NAME), store)
+
+
+def test_search_across_years_with_cached_ratings(store, tmp_path):
+    store.set(SCHEDULES, '0|1979', [release('Alien', 1979)])
+    store.set(SCHEDULES, '0|1986', [release('Aliens', 1986),
+                                    release('Top Gun', 1986, 'Paramount')])
+    store.set(RATINGS, rating_key('Alien', '1979'), ['98%', '94%', 'link'])
+    index = open_index(store, tmp_path)
+
+    assert index.sync() == 2
+    records, total = titles.search_records('alien', index=index)
+
+    assert total == 2
+    assert [(record['title'], record['year']) for record in records] == [
+        ('Aliens', '1986'), ('Alien', '1979')]
+    assert records[1]['tomatometer'] == '98%'
+    assert records[0]['tomatometer'] is None
+    assert [r.title for r in index.search('paramount 1986')[0]] == ['Top Gun']
+
+def test_search_matches_prefixes_without_accents(store, tmp_path):
+    store.set(SCHEDULES, '0|2001', [release('Amélie', 2001, 'Miramax')])
+    index = open_index(store, tmp_path)
+    index.sync()
+
+    assert [r.title for r in index.search('AMEL mira')[0]] == ['Amélie']
+    assert index.search('amelie disney') == ([], 0)
+    assert index.search('  ') == ([], 0)
+
+def test_sync_only_indexes_what_changed(store, tmp_path):
+    store.set(SCHEDULES, '0|1979', [release('Alien', 1979)])
+    store.set(SCHEDULES, '0|1986', [release('Aliens', 1986)])
+    index = open_index(store, tmp_path)
+    index.sync()
+
+    assert index.sync() == 0
+    store.set(SCHEDULES, '0|1986', [release('Aliens', 1986)])
+    assert index.sync() == 0 #Stored again unchanged
+    store.set(SCHEDULES, '0|1986', [release('Top Gun', 1986)])
+    assert index.sync() == 1
+    store.delete(SCHEDULES, '0|1979')
+    assert index.sync() == 0
+
+    assert index.search('alien') == ([], 0)
+    assert [r.title for r in index.search('top')[0]] == ['Top Gun']
+    assert len(index) == 1
+
+def test_saved_index_is_reopened(store, tmp_path):
+    store.set(SCHEDULES, '0|1979', [release('Alien', 1979)])
+    index = open_index(store, tmp_path)
+    index.sync()
+    index.save()
+    assert not index.dirty
+
+    reopened = open_index(store, tmp_path)
+    assert len(reopened) == 1
+    assert reopened.sync() == 0
+    assert [r.title for r in reopened.search('alien')[0]] == ['Alien']
+
+def test_indexer_syncs_and_saves_when_stopped(store, tmp_path):
+    store.set(SCHEDULES, '0|1979', [release('Alien', 1979)])
+    index = open_index(store, tmp_path)
+    titles.Indexer(index, interval=0.01).start().stop()
+
+    assert len(open_index(store, tmp_path)) == 1
+
+def test_missing_years(store, tmp_path):
+    this_year = datetime.date.today().year
+    store.set(SCHEDULES, '0|1979', [])
+    store.set(SCHEDULES, '1|1979', [])
+    store.set(SCHEDULES, '0|1980', [])
+    store.set(SCHEDULES, '0|%d' % this_year, [])
+    index = open_index(store, tmp_path)
+    index.sync()
+
+    assert index.missing_years([1979, 1980, 1981], [0, 1]) == [1980, 1981]
+    assert index.missing_years([this_year], [0]) == []
+    assert titles.query_years('alien 1979 or 86') == [1979]
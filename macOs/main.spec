@@ -4,7 +4,7 @@ block_cipher = None
 
 
 a = Analysis(['src/main.py'],
-             pathex=['/Users/shakeel/Documents/macOs'],
+             pathex=['src', '../common/src', '/Users/shakeel/Documents/macOs'],
              binaries=[('/System/Library/Frameworks/Tk.framework/Tk', 'tk'), ('/System/Library/Frameworks/Tcl.framework/Tcl', 'tcl')],
              datas=[],
              hiddenimports=[],